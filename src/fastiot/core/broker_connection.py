@@ -4,7 +4,7 @@ import threading
 from abc import ABC, abstractmethod
 from asyncio import get_running_loop
 from inspect import signature
-from typing import Any, Callable, Coroutine, Optional
+from typing import Any, Callable, Coroutine, Iterable, Optional, Tuple
 
 from nats.aio.client import Client as BrokerClient, Callback as BrokerCallback, ErrorCallback as BrokerErrorCallback
 from nats.aio.msg import Msg as NatsBrokerMsg
@@ -191,6 +191,16 @@ class BrokerConnection(ABC):
         """
         await self._send(subject=subject, msg=msg)
 
+    async def publish_many(self, msgs: Iterable[Tuple[Subject, MsgPub]]):
+        """
+        Publishes several messages, e.g. collected in a batch, in one call. By default this is a convenience wrapper
+        calling :meth:`publish` for each message, connections may override it to send the messages together.
+
+        :param msgs: Pairs of subject and message to publish, in order.
+        """
+        for subject, msg in msgs:
+            await self._send(subject=subject, msg=msg)
+
     async def request(self, subject: ReplySubject, msg: MsgReq,
                       timeout: float = env_broker.default_timeout) -> MsgResp:
         """
@@ -376,6 +386,15 @@ class NatsBrokerConnection(BrokerConnection):
             reply=reply_str
         )
 
+    async def publish_many(self, msgs: Iterable[Tuple[Subject, MsgPub]]):
+        """
+        Writes all messages to the send buffer of the client and flushes it once afterwards, so the batch is sent
+        together with a single round trip to the broker.
+        """
+        for subject, msg in msgs:
+            await self._send(subject=subject, msg=msg)
+        await self._client.flush()
+
     @property
     def is_connected(self):
         return self._client.is_connected
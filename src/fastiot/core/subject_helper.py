@@ -1,4 +1,5 @@
 import re
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
 
 MSG_FORMAT_VERSION = 'v1'
 HIERARCHY = '>'
@@ -44,3 +45,103 @@ def filter_specific_sign(name: str) -> str:
     sub_str = re.sub(r'\ |\*|', '', name)
     sub_str_l = [s for s in sub_str.split('.') if s != '']
     return '.'.join(sub_str_l)
+
+
+T = TypeVar('T')
+
+
+class _SubjectTrieNode:
+    __slots__ = ('children', 'same_level', 'values', 'hierarchy_values')
+
+    def __init__(self):
+        self.children: Dict[str, '_SubjectTrieNode'] = {}
+        self.same_level: Optional['_SubjectTrieNode'] = None
+        self.values: List[Tuple[int, Any]] = []
+        self.hierarchy_values: List[Tuple[int, Any]] = []
+
+
+class SubjectMatcher(Generic[T]):
+    """
+    Matches concrete subject names against a set of subscription patterns as used by the broker, e.g. ``v1.thing.*`` or
+    ``v1.thing.>``. The patterns are compiled into a token trie once, results for concrete subject names are cached.
+    This is much cheaper than building and running a regex per pattern for each received message.
+
+    .. code:: python
+
+        matcher = SubjectMatcher()
+        matcher.add('v1.thing.*', 'all things')
+        matcher.add('v1.thing.my_sensor', 'my sensor')
+        matcher.match('v1.thing.my_sensor')
+        >>> ['all things', 'my sensor']
+
+    :param max_cache_size: Maximum number of subject names to cache the result for. The cache is cleared once it is
+                           exceeded.
+    """
+
+    def __init__(self, max_cache_size: int = 10000):
+        self._root = _SubjectTrieNode()
+        self._num_patterns = 0
+        self._cache: Dict[str, List[T]] = {}
+        self._max_cache_size = max_cache_size
+
+    def add(self, pattern: str, value: T):
+        """
+        Adds a subscription pattern. ``*`` matches exactly one token, ``>`` as last token matches one or more tokens.
+
+        :param pattern: Subject pattern, e.g. ``v1.thing.*``
+        :param value: Value to return for subject names matching the pattern
+        """
+        node = self._root
+        tokens = pattern.split('.')
+        for i, token in enumerate(tokens):
+            if token == HIERARCHY:
+                if i != len(tokens) - 1:
+                    raise ValueError(f"Wildcard `{HIERARCHY}` is only allowed as last token in subject `{pattern}`")
+                node.hierarchy_values.append((self._num_patterns, value))
+                break
+            if token == WILDCARD_SAME_LEVEL:
+                if node.same_level is None:
+                    node.same_level = _SubjectTrieNode()
+                node = node.same_level
+            else:
+                node = node.children.setdefault(token, _SubjectTrieNode())
+        else:
+            node.values.append((self._num_patterns, value))
+        self._num_patterns += 1
+        self._cache.clear()
+
+    def match(self, subject_name: str) -> List[T]:
+        """
+        Returns the values of all patterns matching the subject name in the order they have been added.
+
+        :param subject_name: Concrete subject name like ``v1.thing.my_sensor``
+        """
+        try:
+            return self._cache[subject_name]
+        except KeyError:
+            pass
+
+        matches: List[Tuple[int, T]] = []
+        self._collect(self._root, subject_name.split('.'), 0, matches)
+        result = [value for _, value in sorted(matches, key=lambda match: match[0])]
+
+        if len(self._cache) >= self._max_cache_size:
+            self._cache.clear()
+        self._cache[subject_name] = result
+        return result
+
+    def match_first(self, subject_name: str) -> Optional[T]:
+        """ Returns the value of the first pattern added matching the subject name or ``None`` if none matches. """
+        result = self.match(subject_name)
+        return result[0] if result else None
+
+    def _collect(self, node: _SubjectTrieNode, tokens: List[str], index: int, matches: List[Tuple[int, T]]):
+        if index == len(tokens):
+            matches.extend(node.values)
+            return
+        matches.extend(node.hierarchy_values)
+        child = node.children.get(tokens[index])
+        if child is not None:
+            self._collect(child, tokens, index + 1, matches)
+        if node.same_level is not None:
+            self._collect(node.same_level, tokens, index + 1, matches)
@@ -72,20 +72,50 @@ async def create_async_influxdb_client_from_env():
     raise ServiceError("Could not connect to InfluxDB")
 
 
-async def influx_query(machine, name, start_time, end_time):
-    client = await get_new_async_influx_client_from_env()
-    query = f'from(bucket: "{env_influxdb.bucket}")' \
-            f'|> range(start: {start_time}Z, stop: {end_time}Z)' \
-            f'|> group(columns: ["time"])' \
-            f'|> sort(columns: ["_time"])' \
-            f'|> filter(fn: (r) => r["machine"] == "{machine}")' \
-            f'|> filter(fn: (r) => r["_field"] == "value")' \
-            f'|> filter(fn: (r) => r["_measurement"] == "{name}")'
+async def influx_query(machine, name, start_time, end_time, client=None):
+    """
+    Queries the values of a sensor between start and end time, given as ISO format without timezone in UTC.
+
+    :param client: Client to use, e.g. from :func:`get_async_influxdb_client_from_env`. If not set, a new client is
+                   created and closed afterwards.
+    """
+    close_client = client is None
+    if client is None:
+        client = await get_new_async_influx_client_from_env()
+    query = build_influx_query(machine, name, start_time, end_time)
     result = await client.query_api().query(org=env_influxdb.organisation, query=query)
-    await client.close()
+    if close_client:
+        await client.close()
     return result
 
 
+async def influx_query_stream(machine, name, start_time, end_time, client):
+    """
+    Like :func:`influx_query` but yields the records one by one while they are received instead of loading all of
+    them into memory.
+    """
+    query = build_influx_query(machine, name, start_time, end_time)
+    async for record in await client.query_api().query_stream(org=env_influxdb.organisation, query=query):
+        yield record
+
+
+async def influx_count(machine, name, start_time, end_time, client) -> int:
+    """ Returns the number of values of a sensor between start and end time, see :func:`influx_query` """
+    query = build_influx_query(machine, name, start_time, end_time) + '|> count()'
+    tables = await client.query_api().query(org=env_influxdb.organisation, query=query)
+    return sum(record.get_value() for table in tables for record in table.records)
+
+
+def build_influx_query(machine, name, start_time, end_time) -> str:
+    return f'from(bucket: "{env_influxdb.bucket}")' \
+           f'|> range(start: {start_time}Z, stop: {end_time}Z)' \
+           f'|> group(columns: ["time"])' \
+           f'|> sort(columns: ["_time"])' \
+           f'|> filter(fn: (r) => r["machine"] == "{machine}")' \
+           f'|> filter(fn: (r) => r["_field"] == "value")' \
+           f'|> filter(fn: (r) => r["_measurement"] == "{name}")'
+
+
 def influx_query_wrapper(coro, *args):
     coroutine = coro(*args)
     r = asyncio.run(coroutine)
@@ -0,0 +1,105 @@
+"""
+Encoder for the InfluxDB line protocol to write :class:`fastiot.msg.thing.Thing` without building intermediate
+dictionaries or points for each value. The output matches the one of ``influxdb_client.Point``, so it can be passed to
+``write_api().write(record=lines)`` directly.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastiot.msg.thing import Thing
+
+_ESCAPE_MEASUREMENT = str.maketrans({',': r'\,', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_ESCAPE_KEY = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ', '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+_ESCAPE_STRING = str.maketrans({'"': r'\"', '\\': r'\\'})
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_PRECISION_UNITS = {'s': timedelta(seconds=1), 'ms': timedelta(milliseconds=1), 'us': timedelta(microseconds=1)}
+
+
+def encode_timestamp(timestamp: datetime, precision: str = 'ms') -> int:
+    """
+    Converts the timestamp into an integer of the given precision since epoch, ``s``, ``ms``, ``us`` or ``ns``.
+    Timestamps without timezone are considered as UTC.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    delta = timestamp - _EPOCH
+    if precision == 'ns':
+        return delta // _PRECISION_UNITS['us'] * 1000
+    try:
+        return delta // _PRECISION_UNITS[precision]
+    except KeyError as exception:
+        raise ValueError(f"Invalid precision `{precision}`, must be one of s, ms, us or ns") from exception
+
+
+def encode_field_value(value: Any) -> Optional[str]:
+    """
+    Encodes a field value, returns None for values not written like ``None`` and non-finite floats.
+
+    :raises ValueError: If the type of the value is not supported by InfluxDB
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return f'{value}i'
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        encoded = repr(value)
+        return encoded[:-2] if encoded.endswith('.0') else encoded
+    if isinstance(value, str):
+        return '"' + value.translate(_ESCAPE_STRING) + '"'
+    if value is None:
+        return None
+    raise ValueError(f'Type "{type(value)}" of field value is not supported by InfluxDB')
+
+
+def encode_line(measurement: str, tags: Dict[str, Any], fields: Dict[str, Any], timestamp: datetime,
+                precision: str = 'ms') -> Optional[str]:
+    """
+    Encodes one point as line. Tags with empty values and fields without value are skipped like by
+    ``influxdb_client.Point``, if no field is left None is returned.
+    """
+    encoded_fields = []
+    for key, value in sorted(fields.items()):
+        encoded_value = encode_field_value(value)
+        if encoded_value is not None:
+            encoded_fields.append(str(key).translate(_ESCAPE_KEY) + '=' + encoded_value)
+    if not encoded_fields:
+        return None
+
+    line = str(measurement).translate(_ESCAPE_MEASUREMENT)
+    for key, value in sorted(tags.items()):
+        if value is None:
+            continue
+        encoded_value = str(value).translate(_ESCAPE_KEY)
+        if encoded_value.endswith('\\'):
+            encoded_value += ' '
+        if key != '' and encoded_value != '':
+            line += ',' + str(key).translate(_ESCAPE_KEY) + '=' + encoded_value
+    return line + ' ' + ','.join(encoded_fields) + ' ' + str(encode_timestamp(timestamp, precision))
+
+
+def thing_to_line(thing: Thing, precision: str = 'ms') -> Optional[str]:
+    """
+    Encodes the thing with the sensor name as measurement, ``machine`` and ``unit`` as tags and ``value`` as field, as
+    stored by :mod:`fastiot_core_services.time_series`.
+    """
+    value = encode_field_value(thing.value)
+    if value is None:
+        return None
+    line = str(thing.name).translate(_ESCAPE_MEASUREMENT)
+    # Tags are sorted by key like by ``influxdb_client.Point``
+    for key, tag_value in (('machine', thing.machine), ('unit', thing.unit)):
+        encoded_value = str(tag_value).translate(_ESCAPE_KEY)
+        if encoded_value.endswith('\\'):
+            encoded_value += ' '
+        if encoded_value != '':
+            line += ',' + key + '=' + encoded_value
+    return line + ' value=' + value + ' ' + str(encode_timestamp(thing.timestamp, precision))
+
+
+def things_to_lines(things: Iterable[Thing], precision: str = 'ms') -> List[str]:
+    """ Encodes a batch of things, things without a value to write are skipped. """
+    return [line for line in (thing_to_line(thing, precision) for thing in things) if line is not None]
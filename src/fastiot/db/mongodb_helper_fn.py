@@ -9,7 +9,7 @@ from fastiot.msg.time_series_msg import TimeSeriesData
 
 class MongoClientWrapper:
     def __init__(self, db_host: str, db_port: int, db_user: str = None, db_password: str = None,
-                 db_auth_source: str = None, db_compression: str = None):
+                 db_auth_source: str = None, db_compression: str = None, db_max_pool_size: int = None):
         """
         Constructor for a customer mongo client. Please note, that it will also set the feature compatibility version to
         the current mongodb version which may cause the database to be harder to downgrade.
@@ -39,6 +39,9 @@ class MongoClientWrapper:
         if db_auth_source is not None:
             mongo_client_kwargs["authSource"] = db_auth_source
 
+        if db_max_pool_size is not None:
+            mongo_client_kwargs["maxPoolSize"] = db_max_pool_size
+
         if db_compression is not None:
             mongo_client_kwargs["compressors"] = db_compression
             if db_compression == "zlib":
@@ -70,7 +73,8 @@ def get_mongodb_client_from_env():
     For connecting Mongodb, the environment variables can be set,
     if you want to use your own settings instead of default:
     :envvar:`FASTIOT_MONGO_DB_HOST`, :envvar:`FASTIOT_MONGO_DB_PORT`, :envvar:`FASTIOT_MONGO_DB_USER`,
-    :envvar:`FASTIOT_MONGO_DB_PASSWORD`, :envvar:`FASTIOT_MONGO_DB_AUTH_SOURCE`, :envvar:`FASTIOT_MONGO_DB_NAME`
+    :envvar:`FASTIOT_MONGO_DB_PASSWORD`, :envvar:`FASTIOT_MONGO_DB_AUTH_SOURCE`, :envvar:`FASTIOT_MONGO_DB_NAME`,
+    :envvar:`FASTIOT_MONGO_DB_MAX_POOL_SIZE`
 
     >>> mongo_client = get_mongodb_client_from_env()
     """
@@ -79,7 +83,8 @@ def get_mongodb_client_from_env():
         db_port=env_mongodb.port,
         db_user=env_mongodb.user,
         db_password=env_mongodb.password,
-        db_auth_source=env_mongodb.auth_source
+        db_auth_source=env_mongodb.auth_source,
+        db_max_pool_size=env_mongodb.max_pool_size
     )
     return db_client.get_client()
 
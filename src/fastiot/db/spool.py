@@ -0,0 +1,179 @@
+import logging
+import os
+import struct
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import msgpack
+
+from fastiot.env import env_basic
+
+FSYNC_ALWAYS = 'always'
+FSYNC_SEGMENT = 'segment'
+FSYNC_NEVER = 'never'
+
+_RECORD_HEADER = struct.Struct('>I')
+_SEGMENT_SUFFIX = '.spool'
+
+
+def _pack(record: Any) -> bytes:
+    return msgpack.packb(record, datetime=True)
+
+
+def _unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, timestamp=3)
+
+
+class DiskSpool:
+    """
+    Append-only spool on disk to buffer records, e.g. writes to a database while it is not available, and replay them
+    in batches later on.
+
+    Records are serialized with msgpack by default and appended to segment files in the given directory, each prefixed
+    with its length. A segment is completed once it reaches ``segment_size``. If the spool exceeds ``max_size``, the
+    oldest segments are dropped. Segments left from a previous run are replayed as well, an incomplete record at the
+    end of a segment, e.g. after a power loss, is skipped.
+
+    Replaying is at least once: If the service stops while replaying a segment, the records of this segment already
+    written are replayed again on the next start.
+
+    Example:
+
+    .. code:: python
+
+      spool = DiskSpool(os.path.join(env_basic.spool_dir, 'my_service'))
+      try:
+          await write_to_database([record])
+      except ConnectionError:
+          spool.append(record)
+
+      ...
+      await spool.replay(write_to_database, batch_size=1000)
+
+    :param directory: Directory to store the segment files in, created with the first record
+    :param max_size: Maximum size of all segments in bytes, defaults to :envvar:`FASTIOT_SPOOL_MAX_SIZE`
+    :param segment_size: Size in bytes to complete a segment and start a new one
+    :param fsync: When to sync the data to disk, ``always``, ``segment`` or ``never``, defaults to
+                  :envvar:`FASTIOT_SPOOL_FSYNC`
+    :param serializer: Function to serialize a record to bytes
+    :param deserializer: Function to deserialize bytes to a record
+    """
+
+    def __init__(self, directory: str, max_size: Optional[int] = None, segment_size: int = 16 * 1024 * 1024,
+                 fsync: Optional[str] = None, serializer: Callable[[Any], bytes] = _pack,
+                 deserializer: Callable[[bytes], Any] = _unpack):
+        self._directory = directory
+        self._max_size = max_size if max_size is not None else env_basic.spool_max_size
+        self._segment_size = segment_size
+        self._fsync = fsync or env_basic.spool_fsync
+        if self._fsync not in (FSYNC_ALWAYS, FSYNC_SEGMENT, FSYNC_NEVER):
+            raise ValueError(f"Invalid fsync policy `{self._fsync}`")
+        self._serializer = serializer
+        self._deserializer = deserializer
+
+        self._segments: List[str] = []
+        if os.path.isdir(directory):
+            self._segments = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                                    if name.endswith(_SEGMENT_SUFFIX))
+        self._size = sum(os.path.getsize(segment) for segment in self._segments)
+        self._next_segment_nr = int(os.path.basename(self._segments[-1])[:-len(_SEGMENT_SUFFIX)]) + 1 \
+            if self._segments else 0
+        self._file = None
+        self._file_path = ''
+        self._file_size = 0
+        # Number of records of a segment already replayed if replaying failed in between
+        self._replayed_records: Dict[str, int] = {}
+
+    @property
+    def empty(self) -> bool:
+        """ True if no records are spooled """
+        return not self._segments and self._file_size == 0
+
+    @property
+    def size(self) -> int:
+        """ Size of all segments in bytes """
+        return self._size
+
+    def append(self, record: Any):
+        """ Appends the record to the current segment """
+        data = self._serializer(record)
+        if self._file is None or self._file_size >= self._segment_size:
+            self._complete_segment()
+            os.makedirs(self._directory, exist_ok=True)
+            self._file_path = os.path.join(self._directory, f"{self._next_segment_nr:020d}{_SEGMENT_SUFFIX}")
+            self._next_segment_nr += 1
+            self._file = open(self._file_path, 'ab')  # pylint: disable=consider-using-with
+
+        self._file.write(_RECORD_HEADER.pack(len(data)) + data)
+        self._file_size += _RECORD_HEADER.size + len(data)
+        self._size += _RECORD_HEADER.size + len(data)
+        self._file.flush()
+        if self._fsync == FSYNC_ALWAYS:
+            os.fsync(self._file.fileno())
+
+        while self._size > self._max_size and self._segments:
+            segment = self._segments[0]
+            logging.warning("Spool in %s exceeds %d bytes, dropping oldest segment %s", self._directory,
+                            self._max_size, segment)
+            self._remove_segment(segment)
+
+    async def replay(self, write_fn: Callable[[List[Any]], Awaitable[Any]], batch_size: int = 1000) -> int:
+        """
+        Writes all spooled records in batches using ``write_fn``, oldest first. Records appended while replaying are
+        written as well, so the spool is empty afterwards. If ``write_fn`` raises an exception, it is passed on and the
+        records not written stay spooled for the next call.
+
+        :param write_fn: Coroutine function called with a list of up to ``batch_size`` records
+        :param batch_size: Maximum number of records passed to ``write_fn`` at once
+        :returns: Number of records written
+        """
+        written = 0
+        while True:
+            self._complete_segment()
+            if not self._segments:
+                return written
+            segment = self._segments[0]
+            records = self._read_segment(segment)
+            start = self._replayed_records.get(segment, 0)
+            while start < len(records):
+                batch = records[start:start + batch_size]
+                await write_fn(batch)
+                start += len(batch)
+                written += len(batch)
+                self._replayed_records[segment] = start
+            self._remove_segment(segment)
+
+    def close(self):
+        """ Completes the current segment and closes its file """
+        self._complete_segment()
+
+    def _complete_segment(self):
+        if self._file is None:
+            return
+        if self._fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if self._file_size > 0:
+            self._segments.append(self._file_path)
+        self._file_size = 0
+
+    def _read_segment(self, segment: str) -> List[Any]:
+        with open(segment, 'rb') as file:
+            data = file.read()
+        records = []
+        position = 0
+        while position + _RECORD_HEADER.size <= len(data):
+            length, = _RECORD_HEADER.unpack_from(data, position)
+            position += _RECORD_HEADER.size
+            if position + length > len(data):
+                logging.warning("Skipping incomplete record at the end of spool segment %s", segment)
+                break
+            records.append(self._deserializer(data[position:position + length]))
+            position += length
+        return records
+
+    def _remove_segment(self, segment: str):
+        self._size -= os.path.getsize(segment)
+        os.remove(segment)
+        self._segments.remove(segment)
+        self._replayed_records.pop(segment, None)
@@ -1,5 +1,9 @@
+import asyncio
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
 
 from fastiot import logging
 from fastiot.env.env import env_timescaledb
@@ -28,16 +32,20 @@ def get_timescaledb_client_from_env():
     return db_client
 
 
-def get_timescaledb_client(host: str, port: int, user: str, password: str,
-                           database: str = None):
+def _import_psycopg2():
     try:
-        # pylint: disable=import-outside-toplevel
-        import psycopg2
-        from psycopg2 import OperationalError
+        import psycopg2  # pylint: disable=import-outside-toplevel
     except (ImportError, ModuleNotFoundError):
         logging.error("You have to manually install `fastiot[postgredb]` or `psycopg2>=2.9.3,<3` using your "
                       "`pyproject.toml` to make use of this helper.")
         sys.exit(5)
+    return psycopg2
+
+
+def get_timescaledb_client(host: str, port: int, user: str, password: str,
+                           database: str = None):
+    psycopg2 = _import_psycopg2()
+    from psycopg2 import OperationalError  # pylint: disable=import-outside-toplevel
 
     client_parameters = {"user": user, "password": password, "host": host,
                          "port": port, "database": database}
@@ -54,3 +62,56 @@ def get_timescaledb_client(host: str, port: int, user: str, password: str,
             time.sleep(sleep_time)
         num_tries -= 1
     raise ServiceError("Could not connect to TimeScaleDB")
+
+
+class AsyncTimescaleDBPool:
+    """
+    Pool of TimeScaleDB connections for asyncio services. As psycopg2 is blocking, each call runs in a thread of a pool
+    with as many threads as connections, so neither the event loop nor other calls are blocked.
+
+    >>> pool = get_async_timescaledb_pool_from_env()
+    >>> rows = await pool.run(lambda connection: ...)
+    """
+
+    def __init__(self, max_connections: int, **client_parameters):
+        psycopg2 = _import_psycopg2()
+        from psycopg2.pool import ThreadedConnectionPool  # pylint: disable=import-outside-toplevel
+
+        self._pool = ThreadedConnectionPool(minconn=1, maxconn=max_connections, **client_parameters)
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix='timescaledb')
+        self.unavailable_errors = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        """ Exceptions raised if the database is not available, e.g. to retry later """
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Calls ``fn(connection, *args, **kwargs)`` with a connection of the pool in a separate thread. The transaction
+        is committed if ``fn`` returns and rolled back if it raises an exception.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                partial(self._run, fn, *args, **kwargs))
+
+    def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        connection = self._pool.getconn()
+        try:
+            with connection:  # Commits or rolls back the transaction
+                return fn(connection, *args, **kwargs)
+        finally:
+            self._pool.putconn(connection, close=bool(connection.closed))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._pool.closeall()
+
+
+def get_async_timescaledb_pool_from_env(max_connections: Optional[int] = None) -> AsyncTimescaleDBPool:
+    """
+    Creates a :class:`AsyncTimescaleDBPool` using the same environment variables as
+    :func:`get_timescaledb_client_from_env`. The number of connections defaults to
+    :envvar:`FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE`.
+    """
+    return AsyncTimescaleDBPool(max_connections=max_connections or env_timescaledb.max_pool_size,
+                                host=env_timescaledb.host,
+                                port=env_timescaledb.port,
+                                user=env_timescaledb.user,
+                                password=env_timescaledb.password,
+                                database=env_timescaledb.database)
@@ -2,7 +2,7 @@ import logging
 import os
 
 from fastiot.env.env_constants_basic import FASTIOT_CONFIG_DIR, FASTIOT_LOG_LEVEL, FASTIOT_VOLUME_DIR, \
-    FASTIOT_SERVICE_ID, FASTIOT_USE_INTERNAL_HOSTNAMES
+    FASTIOT_SERVICE_ID, FASTIOT_USE_INTERNAL_HOSTNAMES, FASTIOT_SPOOL_MAX_SIZE, FASTIOT_SPOOL_FSYNC
 from fastiot.env.helpers import parse_bool_flag
 
 
@@ -77,6 +77,29 @@ class BasicEnv:
     def error_logfile(self) -> str:
         return os.path.join(self.log_dir, 'error.log')
 
+    @property
+    def spool_dir(self) -> str:
+        """ Directory for services to spool data on disk, see :class:`fastiot.db.spool.DiskSpool` """
+        return os.path.join(self.volume_dir, 'spool')
+
+    @property
+    def spool_max_size(self) -> int:
+        """ .. envvar:: FASTIOT_SPOOL_MAX_SIZE
+
+        Maximum size in MB of data spooled on disk by a service while its database is not available, defaults to 1024.
+        Once exceeded, the oldest data is dropped. See :class:`fastiot.db.spool.DiskSpool` for details.
+        """
+        return int(os.getenv(FASTIOT_SPOOL_MAX_SIZE, '1024')) * 1024 * 1024
+
+    @property
+    def spool_fsync(self) -> str:
+        """ .. envvar:: FASTIOT_SPOOL_FSYNC
+
+        When to sync spooled data to disk: ``always`` after each record, ``segment`` (default) when a segment file is
+        completed or ``never`` to leave it to the operating system.
+        """
+        return os.getenv(FASTIOT_SPOOL_FSYNC, 'segment')
+
 
 class TestsEnv:
     """
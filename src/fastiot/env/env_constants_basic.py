@@ -3,6 +3,8 @@ FASTIOT_LOG_LEVEL = 'FASTIOT_LOG_LEVEL'
 FASTIOT_VOLUME_DIR = 'FASTIOT_VOLUME_DIR'
 FASTIOT_SERVICE_ID = 'FASTIOT_SERVICE_ID'
 FASTIOT_USE_INTERNAL_HOSTNAMES = 'FASTIOT_USE_INTERNAL_HOSTNAMES'
+FASTIOT_SPOOL_MAX_SIZE = 'FASTIOT_SPOOL_MAX_SIZE'
+FASTIOT_SPOOL_FSYNC = 'FASTIOT_SPOOL_FSYNC'
 FASTIOT_NATS_HOST = 'FASTIOT_NATS_HOST'
 FASTIOT_NATS_PORT = 'FASTIOT_NATS_PORT'
 FASTIOT_NATS_DEFAULT_TIMEOUT = 'FASTIOT_NATS_DEFAULT_TIMEOUT'
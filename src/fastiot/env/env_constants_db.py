@@ -4,6 +4,7 @@ FASTIOT_TIME_SCALE_DB_USER = 'FASTIOT_TIME_SCALE_DB_USER'
 FASTIOT_TIME_SCALE_DB_PASSWORD = 'FASTIOT_TIME_SCALE_DB_PASSWORD'
 FASTIOT_TIME_SCALE_DB_DATABASE = 'FASTIOT_TIME_SCALE_DB_DATABASE'
 FASTIOT_TIME_SCALE_DB_VOLUME = 'FASTIOT_TIME_SCALE_DB_VOLUME'
+FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE = 'FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE'
 FASTIOT_REDIS_HOST = 'FASTIOT_REDIS_HOST'
 FASTIOT_REDIS_PORT = 'FASTIOT_REDIS_PORT'
 FASTIOT_REDIS_PASSWORD = 'FASTIOT_REDIS_PASSWORD'
@@ -17,6 +18,7 @@ FASTIOT_MONGO_DB_NAME = 'FASTIOT_MONGO_DB_NAME'
 FASTIOT_MONGO_DB_VOLUME = 'FASTIOT_MONGO_DB_VOLUME'
 FASTIOT_MONGO_DB_MEM_LIMIT = 'FASTIOT_MONGO_DB_MEM_LIMIT'
 FASTIOT_MONGO_DB_TIME_SERIES_COL = 'FASTIOT_MONGO_DB_TIME_SERIES_COL'
+FASTIOT_MONGO_DB_MAX_POOL_SIZE = 'FASTIOT_MONGO_DB_MAX_POOL_SIZE'
 FASTIOT_MARIA_DB_HOST = 'FASTIOT_MARIA_DB_HOST'
 FASTIOT_MARIA_DB_PORT = 'FASTIOT_MARIA_DB_PORT'
 FASTIOT_MARIA_DB_USER = 'FASTIOT_MARIA_DB_USER'
@@ -4,7 +4,7 @@ from typing import Optional
 from fastiot.cli.common.infrastructure_services import MongoDBService
 from fastiot.env.env_constants_db import FASTIOT_MONGO_DB_HOST, FASTIOT_MONGO_DB_PORT, FASTIOT_MONGO_DB_USER, \
     FASTIOT_MONGO_DB_PASSWORD, FASTIOT_MONGO_DB_AUTH_SOURCE, FASTIOT_MONGO_DB_NAME, FASTIOT_MONGO_DB_MEM_LIMIT, \
-    FASTIOT_MONGO_DB_TIME_SERIES_COL
+    FASTIOT_MONGO_DB_TIME_SERIES_COL, FASTIOT_MONGO_DB_MAX_POOL_SIZE
 
 
 class MongoDBEnv:
@@ -63,6 +63,16 @@ class MongoDBEnv:
         """
         return os.getenv(FASTIOT_MONGO_DB_NAME, "fastiot")
 
+    @property
+    def max_pool_size(self) -> int:
+        """ .. envvar:: FASTIOT_MONGO_DB_MAX_POOL_SIZE
+
+        Use to get/set the maximum number of concurrent connections to the mongodb per client, defaults to 100 like
+        pymongo does. Services accessing the database from a thread pool, like the object storage, also size their pool
+        accordingly.
+        """
+        return int(os.getenv(FASTIOT_MONGO_DB_MAX_POOL_SIZE, 100))
+
     @property
     def mem_limit(self) -> str:
         return os.getenv(FASTIOT_MONGO_DB_MEM_LIMIT, "256m")
@@ -3,7 +3,8 @@ from typing import Optional
 
 from fastiot.cli.common.infrastructure_services import TimeScaleDBService
 from fastiot.env.env_constants_db import FASTIOT_TIME_SCALE_DB_HOST, FASTIOT_TIME_SCALE_DB_PORT, \
-    FASTIOT_TIME_SCALE_DB_USER, FASTIOT_TIME_SCALE_DB_PASSWORD, FASTIOT_TIME_SCALE_DB_DATABASE
+    FASTIOT_TIME_SCALE_DB_USER, FASTIOT_TIME_SCALE_DB_PASSWORD, FASTIOT_TIME_SCALE_DB_DATABASE, \
+    FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE
 
 
 class TimeScaleDBEnv:
@@ -57,4 +58,13 @@ class TimeScaleDBEnv:
         return str(os.getenv(FASTIOT_TIME_SCALE_DB_DATABASE,
                              TimeScaleDBService().get_default_env(FASTIOT_TIME_SCALE_DB_DATABASE)))
 
+    @property
+    def max_pool_size(self) -> int:
+        """ .. envvar:: FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE
+
+        Maximum number of connections opened by :class:`fastiot.db.time_scale_helper_fn.AsyncTimescaleDBPool`,
+        defaults to 10.
+        """
+        return int(os.getenv(FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE, '10'))
+
 
@@ -1,20 +1,37 @@
 """ Messages handling queries to databases with historic data (time series or object storage) """
 from datetime import datetime
-from typing import List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from fastiot.core.data_models import FastIoTResponse, FastIoTRequest
 
+HIST_AGGREGATES = ('mean', 'min', 'max', 'sum', 'count', 'first', 'last')
+""" Functions supported by :attr:`fastiot.msg.hist.HistObjectReq.aggregate` """
+
 
 class HistObjectResp(FastIoTResponse):
     """
     This Class is used to answer the request for historical data.
     """
     error_code: int = 0
-    """ error number """
+    """
+    error number, 1 if no data was found, 2 if the continuation token of the request is invalid, 3 if the aggregate or
+    resolution of the request is invalid
+    """
     error_msg: str = ""
     """ if an error occurred you can get a detailed description """
     values: List[dict]
     """ the results of the request """
+    columns: Optional[Dict[str, List[Any]]]
+    """
+    The results as one list per field, e.g. ``{'timestamp': [...], 'value': [...]}``, if requested with
+    :attr:`fastiot.msg.hist.HistObjectReq.columnar`. ``values`` is empty then. Use
+    :func:`fastiot.util.object_helper.dict_list_from_columns` to convert it back.
+    """
+    continuation_token: Optional[str]
+    """
+    Set if the number of results reached the limit of the request. Send it with the next request as
+    :attr:`fastiot.msg.hist.HistObjectReq.continuation_token` to receive the following results.
+    """
 
 
 class HistObjectReq(FastIoTRequest):
@@ -44,6 +61,15 @@ class HistObjectReq(FastIoTRequest):
 
     >>> ReplySubject(name='v1.hist_object_req.my_data_type', msg_cls=HistObjectReq, reply_cls=HistObjectResp)
 
+    To page through more results than ``limit``, repeat the request with the continuation token of the last response:
+
+    .. code:: python
+
+      reply = await self.broker_connection.request(subject=reply_subject, msg=hist_object_req_msg)
+      while reply.continuation_token:
+          hist_object_req_msg.continuation_token = reply.continuation_token
+          reply = await self.broker_connection.request(subject=reply_subject, msg=hist_object_req_msg)
+
     """
     _reply_cls = HistObjectResp
 
@@ -60,6 +86,32 @@ class HistObjectReq(FastIoTRequest):
     """ is used to return only the value of the given machine """
     sensor: Optional[str]
     """ is used to return only the value of the given sensor """
+    fields: Optional[List[str]]
+    """
+    Only return the given fields of each result to reduce the size of the response, e.g. ``['timestamp', 'value']``.
+    """
+    resolution: Optional[float]
+    """
+    Downsample the results into time buckets of the given width in seconds. One result per bucket and subject
+    (object storage) or sensor (time series) is returned with the timestamp set to the start of the bucket and the field
+    ``value`` aggregated with :attr:`fastiot.msg.hist.HistObjectReq.aggregate`. The limit applies to the buckets.
+    """
+    aggregate: Optional[str]
+    """
+    Function to aggregate the values within a bucket if :attr:`fastiot.msg.hist.HistObjectReq.resolution` is set, one of
+    ``mean`` (default), ``min``, ``max``, ``sum``, ``count``, ``first`` or ``last``.
+    """
+    columnar: bool = False
+    """
+    Return the results as :attr:`fastiot.msg.hist.HistObjectResp.columns` instead of one dictionary per result. This
+    avoids repeating the field names for every result, reducing the size of the response and the time to build it.
+    """
+    continuation_token: Optional[str]
+    """
+    Opaque token taken from :attr:`fastiot.msg.hist.HistObjectResp.continuation_token` of the previous response to
+    continue after its last result. All other fields must be the same as in the previous request. Results are sorted by
+    their timestamp, so paging through large time ranges costs the same for each page.
+    """
     raw_query: Optional[Union[dict, str]]
     """
     is an optional variable, you can also add your own query_dict, besides the default setting, which
@@ -0,0 +1,32 @@
+""" Helpers to create opaque continuation tokens for paging through historic data """
+import base64
+import binascii
+from typing import Dict
+
+import msgpack
+
+
+def encode_continuation_token(position: Dict) -> str:
+    """
+    Encodes the position of the last result returned into an opaque token to be sent with
+    :attr:`fastiot.msg.hist.HistObjectResp.continuation_token`. The position may contain any data serializable by
+    ``msgpack`` including datetimes with timezone.
+
+    >>> token = encode_continuation_token({'timestamp': last_timestamp, 'id': str(last_id)})
+    """
+    return base64.urlsafe_b64encode(msgpack.packb(position, datetime=True)).decode('ascii')
+
+
+def decode_continuation_token(token: str) -> Dict:
+    """
+    Decodes a token created with :func:`fastiot.util.continuation_token.encode_continuation_token`.
+
+    :raises ValueError: If the token is malformed
+    """
+    try:
+        position = msgpack.unpackb(base64.urlsafe_b64decode(token.encode('ascii')), timestamp=3)
+    except (binascii.Error, UnicodeEncodeError, ValueError, msgpack.UnpackException) as exception:
+        raise ValueError(f"Invalid continuation token `{token}`") from exception
+    if not isinstance(position, dict):
+        raise ValueError(f"Invalid continuation token `{token}`")
+    return position
@@ -1,4 +1,4 @@
-from typing import Dict, Type, Union, List
+from typing import Any, Dict, Type, Union, List
 
 from pydantic import BaseModel
 
@@ -44,3 +44,26 @@ def parse_object_list(dict_list: List[Dict], data_model: Type[Union[FastIoTData,
 
     data_model_list = [parse_object(dict_data, data_model) for dict_data in dict_list]
     return data_model_list
+
+
+def columns_from_dict_list(dict_list: List[Dict]) -> Dict[str, List[Any]]:
+    """
+    This function converts a list of dictionaries to a dictionary of columns with one list per key. Missing keys are
+    filled with ``None``.
+
+    .. code:: python
+
+        columns_from_dict_list([{'name': 'test_dict_1', 'value': 123}, {'name': 'test_dict_2'}])
+        >>> {'name': ['test_dict_1', 'test_dict_2'], 'value': [123, None]}
+
+    """
+    keys = list(dict.fromkeys(key for dict_data in dict_list for key in dict_data))
+    return {key: [dict_data.get(key) for dict_data in dict_list] for key in keys}
+
+
+def dict_list_from_columns(columns: Dict[str, List[Any]]) -> List[Dict]:
+    """
+    This function converts a dictionary of columns, e.g. :attr:`fastiot.msg.hist.HistObjectResp.columns`, back to a
+    list of dictionaries to use it with :func:`parse_object_list`.
+    """
+    return [dict(zip(columns.keys(), row)) for row in zip(*columns.values())]
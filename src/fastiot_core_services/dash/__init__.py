@@ -17,6 +17,25 @@ The start and end date of the first call of setup_historic_sensors Must be defin
 When you change the date  for historic sensors in the Web interface the time will be set to 00:00 of the given date.
 (You have to take this into account when requesting data)
 
+Historic graphs are downsampled before being sent to the browser, so long time ranges stay responsive. Per dashboard
+``max_points`` sets the number of points per trace, 2000 by default, and ``downsampling`` the method, ``lttb``
+(Largest-Triangle-Three-Buckets, default) to keep the shape, ``min_max`` to keep the minimum and maximum per bucket or
+``none``. The Excel download always contains all values.
+
+Live graphs are updated incrementally: On each refresh only the values received since the previous refresh of the
+browser are sent and appended to the graph. Values older than ``time_shown`` are dropped from the graph, keeping at
+most ``max_points`` per trace.
+
+Historic data of all sensors is fetched concurrently, at most :envvar:`FASTIOT_DASH_MAX_CONCURRENT_QUERIES` queries at a
+time. Fetched time ranges are cached per sensor, see :envvar:`FASTIOT_DASH_CACHE_SIZE`, so showing a time range within
+one shown before or downloading it as Excel file does not query the database again.
+
+Besides the Excel file the data can be downloaded as CSV or Parquet file with the columns ``machine``, ``name``,
+``timestamp`` and ``value``. These files are streamed: Values are read from the database in chunks of
+:envvar:`FASTIOT_DASH_EXPORT_CHUNK_SIZE` while the download is running, so even weeks of data do not have to fit into
+memory. As Excel files are built in memory, downloads with more than :envvar:`FASTIOT_DASH_XLSX_MAX_ROWS` values are
+sent as CSV file instead.
+
 If not data is shown make sure that all environmental variables are set correctly.
 This concerns manly the connection data, like Ip address, port, the name of the Db or the collection name.
 
@@ -36,6 +55,8 @@ necessary yaml file
                                        #True -> data is shown in live data format and taken from nats-subscriptions
         refresh_time: 1000             #how fast data gets updated in ms, used only in live_data
         time_shown: 120                #for live data the maximum interval shown
+        live_buffer_size: 10000        #optional, maximum number of live values kept per sensor
+        max_points: 10000              #optional, maximum number of points kept per trace in the browser
         customer: a_customer           #customer to identify the sensor
         db: mongodb                    #write here what type of db your data is written in [mongoDB, influxDB] supported
         sensors:                       #list of sensors, to add another sensor to be shown in this graph add to the list
@@ -49,6 +70,8 @@ necessary yaml file
         live_data: False
         refresh_time: 1000000
         time_shown: 120
+        max_points: 2000               #optional, number of points per trace for historic data
+        downsampling: lttb             #optional, lttb, min_max or none
         customer: a_customer
         db_type: influx
         sensors:
@@ -1,28 +1,38 @@
+import asyncio
 import io
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, date
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import dash
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from dash import dcc, html
-from flask import send_file
+from flask import Response, send_file
 from pymongo.errors import ServerSelectionTimeoutError
 
 from fastiot.core import FastIoTService, Subject
 from fastiot.core.subject_helper import sanitize_pub_subject_name
-from fastiot.db.influxdb_helper_fn import influx_query_wrapper, influx_query
+from fastiot.db.influxdb_helper_fn import influx_query, influx_query_stream, influx_count, \
+    get_async_influxdb_client_from_env
 from fastiot.db.mongodb_helper_fn import get_mongodb_client_from_env
 from fastiot.env import env_mongodb
 from fastiot.exceptions import ServiceError
 from fastiot.msg.thing import Thing
 from fastiot.util.config_helper import read_config
+from fastiot_core_services.dash.downsampling import downsample, DEFAULT_MAX_POINTS, DOWNSAMPLING_LTTB
 from fastiot_core_services.dash.env import env_dash
+from fastiot_core_services.dash.export import ExportChunk, export_chunks, read_chunk, EXPORT_CSV, EXPORT_PARQUET, \
+    EXPORT_MIMETYPES
+from fastiot_core_services.dash.historic_cache import HistoricDataCache
 from fastiot_core_services.dash.model.historic_sensor import HistoricSensor
-from fastiot_core_services.dash.model.live_sensor import LiveSensor
-from fastiot_core_services.dash.utils import ServerThread, thing_series_from_mongodb_data_set, \
-    thing_series_from_influxdb_data_set
+from fastiot_core_services.dash.model.live_sensor import LiveSensor, DEFAULT_LIVE_BUFFER_SIZE
+from fastiot_core_services.dash.utils import ServerThread, thing_series_from_mongodb_cursor, \
+    thing_series_from_influxdb_tables, thing_series_from_influxdb_records
 
 
 class DashModule(FastIoTService):
@@ -30,7 +40,9 @@ class DashModule(FastIoTService):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.config = read_config(self)
-        self.live_sensor_list = []
+        # Live sensors by machine and name, shared by all dashboards showing the sensor
+        self.live_sensors: Dict[Tuple[str, str], LiveSensor] = {}
+        self._live_time_shown: Dict[Tuple[str, str], float] = {}
         self.historic_sensor_list = []
         self.app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], prevent_initial_callbacks=True)
         self.server = ServerThread(self.app.server)
@@ -38,6 +50,11 @@ class DashModule(FastIoTService):
         self.start_datetime = None
         self.end_datetime = None
         self._mongo_collection = None
+        self._influx_client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._historic_cache = HistoricDataCache(max_entries=env_dash.cache_size, open_range_ttl=env_dash.cache_ttl)
+        self._query_executor = ThreadPoolExecutor(max_workers=env_dash.max_concurrent_queries,
+                                                  thread_name_prefix='dash_query')
         self.subject = Subject(name=sanitize_pub_subject_name(self.config['subject_name']), msg_cls=Thing)
 
     async def _start(self):
@@ -47,9 +64,12 @@ class DashModule(FastIoTService):
         self.initial_start_date = self.initial_date(self.config.get("initial_start_date"))
         self.initial_end_date = self.initial_date(self.config.get("initial_end_date"))
         self._setup_dash()
+        self._loop = asyncio.get_running_loop()
         try:
             await self._setup_mongodb()
-            self.setup_historic_sensors(self.initial_start_date, self.initial_end_date)
+            await self._setup_influxdb()
+            await self._loop.run_in_executor(None, self.setup_historic_sensors,
+                                             self.initial_start_date, self.initial_end_date)
         except ServiceError as service_error:
             self._logger.error(f'MongoDB Service is not available ! {service_error}')
         except ServerSelectionTimeoutError as server_selection_timeout:
@@ -64,9 +84,17 @@ class DashModule(FastIoTService):
             mongodb = client_mongodb.get_database(env_mongodb.name)
             self._mongo_collection = mongodb.get_collection(self.config.get("collection"))
 
+    async def _setup_influxdb(self):
+        configured_databases = [d.get('db') for d in self.config['dashboards']]
+        if "influxdb" in configured_databases:
+            self._influx_client = await get_async_influxdb_client_from_env()
+
     async def _stop(self):
         """ Methods to call on module shutdown """
         self.server.shutdown()
+        self._query_executor.shutdown(wait=False)
+        if self._influx_client is not None:
+            await self._influx_client.close()
 
     def initial_date(self, date_in):
         if isinstance(date_in, str):
@@ -85,12 +113,17 @@ class DashModule(FastIoTService):
         for dashboard in self.config.get("dashboards"):
             if dashboard.get("live_data"):
                 for sensor in dashboard.get("sensors"):
-                    live_sensor = LiveSensor(sensor.get("name"),
-                                             sensor.get("machine"),
-                                             dashboard.get("customer"),
-                                             sensor.get("service")
-                                             )
-                    self.live_sensor_list.append(live_sensor)
+                    key = (sensor.get("machine"), sensor.get("name"))
+                    capacity = dashboard.get("live_buffer_size", DEFAULT_LIVE_BUFFER_SIZE)
+                    live_sensor = self.live_sensors.get(key)
+                    if live_sensor is None or live_sensor.capacity < capacity:
+                        self.live_sensors[key] = LiveSensor(sensor.get("name"),
+                                                            sensor.get("machine"),
+                                                            dashboard.get("customer"),
+                                                            sensor.get("service"),
+                                                            capacity=capacity)
+                    # Values are kept as long as shown by any dashboard
+                    self._live_time_shown[key] = max(self._live_time_shown.get(key, 0), dashboard.get("time_shown"))
 
     def _setup_dash(self):
         self.app.title = "Data Dashboard"
@@ -102,9 +135,11 @@ class DashModule(FastIoTService):
         for i_dashboard, dashboard in enumerate(self.config.get("dashboards")):
             if dashboard.get("live_data"):
                 self.app.callback(
-                    dash.dependencies.Output(str(i_dashboard), 'figure'),
+                    [dash.dependencies.Output(str(i_dashboard), 'extendData'),
+                     dash.dependencies.Output(str(i_dashboard) + "cursors", 'data')],
                     [dash.dependencies.Input('refreshing' + str(i_dashboard), 'value'),
-                     dash.dependencies.Input(str(i_dashboard) + "interval", 'n_intervals')]
+                     dash.dependencies.Input(str(i_dashboard) + "interval", 'n_intervals')],
+                    [dash.dependencies.State(str(i_dashboard) + "cursors", 'data')]
                 )(GraphCallbacks(module=self, dashboard=dashboard).update_graph)
             else:
 
@@ -117,25 +152,30 @@ class DashModule(FastIoTService):
 
                 self.app.server.route(
                     "/download_excel/")(self.download_excel)
-
-    def update_graph(self, dashboard, *args, **kwargs):
-        traces = []
-        for sensor in dashboard.get("sensors"):
-            values = []
-            timestamp = []
-            for live_sensor in self.live_sensor_list:
-                if live_sensor.name == sensor.get("name"):
-                    for sensor_list in live_sensor.live_sensors:
-                        values.append(sensor_list.value)
-                        timestamp.append(sensor_list.timestamp)
-            trace1 = go.Scatter(
-                x=timestamp,
-                y=values,
-                name=sensor.get("name"),
-
-            )
-            traces.append(trace1)
-        return traces
+                self.app.server.route(
+                    "/download/<export_format>/")(self.download)
+
+    def update_graph(self, dashboard, cursors: Optional[List[int]], *args, **kwargs):
+        """
+        Returns the values of the live sensors of the dashboard appended since the cursors of the client as data for
+        ``extendData`` of the graph together with the new cursors. Without cursors, e.g. for a new client, all values
+        shown are returned.
+
+        Additionally, the number of values within ``time_shown`` is returned per sensor. The client holds the same
+        values as the buffer, so keeping only this number of values per trace drops the values which left the window.
+        """
+        sensors = dashboard.get("sensors")
+        if cursors is None or len(cursors) != len(sensors):
+            cursors = [None] * len(sensors)
+        x_data, y_data, new_cursors, points_shown = [], [], [], []
+        for sensor, cursor in zip(sensors, cursors):
+            live_sensor = self.live_sensors[(sensor.get("machine"), sensor.get("name"))]
+            new_cursors.append(live_sensor.appended)
+            timestamps, values = live_sensor.since(cursor, dashboard.get("time_shown"))
+            x_data.append(timestamps)
+            y_data.append(values)
+            points_shown.append(len(live_sensor.window(dashboard.get("time_shown"))[0]))
+        return {'x': x_data, 'y': y_data}, new_cursors, points_shown
 
     def setup_html(self, start_date, end_date):
         html_cards = []
@@ -160,7 +200,9 @@ class DashModule(FastIoTService):
                         labelStyle={'display': 'inline-block'}
                     )])
                 html_card_elements.extend([
-                    dcc.Graph(id=str(i_dashboard)),
+                    dcc.Graph(id=str(i_dashboard), figure=self.live_figure(dashboard)),
+                    # Cursors per sensor into the live buffers, stored by each client to only receive new values
+                    dcc.Store(id=str(i_dashboard) + "cursors", storage_type='memory'),
                     dcc.Interval(
                         id=str(i_dashboard) + "interval",
                         interval=dashboard.get("refresh_time"),
@@ -186,7 +228,9 @@ class DashModule(FastIoTService):
                         end_date=end_date)
                 ])
                 html_card_elements.extend([
-                    html.A("download excel", href="/download_excel/")])
+                    html.A("download excel", href="/download_excel/"), " ",
+                    html.A("download csv", href=f"/download/{EXPORT_CSV}/"), " ",
+                    html.A("download parquet", href=f"/download/{EXPORT_PARQUET}/")])
             card = dbc.Card([
                 dbc.CardHeader(dashboard.get("name")),
                 dbc.CardBody(html_card_elements),
@@ -220,54 +264,174 @@ class DashModule(FastIoTService):
         html_elements.extend(html_cards)
         return html_elements
 
+    @staticmethod
+    def live_figure(dashboard):
+        """ Initial figure of a live dashboard with an empty trace per sensor, filled using ``extendData`` """
+        return {
+            'data': [go.Scatter(x=[], y=[], name=sensor.get("name")) for sensor in dashboard.get("sensors")],
+            'layout':
+                go.Layout(
+                    title='Live Data',
+                    barmode='stack')
+        }
+
     def setup_historic_sensors(self, start_time: datetime, end_time: datetime):
-        self.historic_sensor_list.clear()
+        """
+        Loads the historic data of all sensors of historic dashboards. Sensors are queried concurrently and their data
+        is cached, see :class:`fastiot_core_services.dash.historic_cache.HistoricDataCache`. Must not be called from the
+        event loop of the service.
+        """
+        historic_sensors = []
         for dashboard in self.config.get("dashboards"):
             if not dashboard.get("live_data"):
                 for sensor in dashboard.get("sensors"):
-                    historic_sensor = HistoricSensor(sensor.get("name"),
-                                                     sensor.get("machine"),
-                                                     dashboard.get("customer"),
-                                                     sensor.get("service")
-                                                     )
-                    if "mongodb" in dashboard.get("db"):
-                        try:
-                            result = self._mongo_collection.find({
-                                "name": historic_sensor.name,
-                                "machine": historic_sensor.machine,
-                                'timestamp': {'$gte': start_time, '$lte': end_time}
-                            })
-                            r = list(result)
-                            self._logger.info(f'got {len(r)} results from mongodb')
-                            historic_sensor.historic_sensor_data = thing_series_from_mongodb_data_set(r)
-                            historic_sensor.historic_sensor_data.remove_until(start_time)
-                            historic_sensor.historic_sensor_data.remove_from(end_time)
-                        except AttributeError as e:
-                            self._logger.info(
-                                f'MongoDB Server cannot be connected, thus _mongo_collection is still None. {e}')
-                    elif "influxdb" in dashboard.get("db"):
-                        query_results = influx_query_wrapper(
-                            influx_query,
-                            sensor.get("machine"),
-                            sensor.get("name"),
-                            start_time.isoformat(),
-                            end_time.isoformat())
-                        historic_sensor.historic_sensor_data = \
-                            thing_series_from_influxdb_data_set(query_results.to_json())
-                    self.historic_sensor_list.append(historic_sensor)
+                    historic_sensors.append((HistoricSensor(sensor.get("name"),
+                                                            sensor.get("machine"),
+                                                            dashboard.get("customer"),
+                                                            sensor.get("service")
+                                                            ), dashboard.get("db")))
+
+        futures = [self._query_executor.submit(self._load_historic_sensor, historic_sensor, db, start_time, end_time)
+                   for historic_sensor, db in historic_sensors]
+        for future in futures:
+            future.result()
+        self.historic_sensor_list = [historic_sensor for historic_sensor, _ in historic_sensors]
+
+    def _load_historic_sensor(self, historic_sensor: HistoricSensor, db: str, start_time: datetime,
+                              end_time: datetime):
+        cache_key = (db, historic_sensor.machine, historic_sensor.name)
+        historic_sensor.historic_sensor_data = self._historic_cache.get(cache_key, start_time, end_time)
+        if historic_sensor.historic_sensor_data is not None:
+            return
+
+        if "mongodb" in db:
+            try:
+                result = self._mongo_collection.find(
+                    self._mongodb_filter(historic_sensor.machine, historic_sensor.name, start_time, end_time),
+                    {'_id': 0, 'timestamp': 1, 'value': 1}).sort('timestamp', 1)
+                thing_series = thing_series_from_mongodb_cursor(result, machine=historic_sensor.machine,
+                                                                name=historic_sensor.name)
+                self._logger.info(f'got {len(thing_series)} results from mongodb')
+            except AttributeError as e:
+                self._logger.info(f'MongoDB Server cannot be connected, thus _mongo_collection is still None. {e}')
+                return
+        elif "influxdb" in db:
+            # All queries share the client of the service running on its event loop
+            query_results = asyncio.run_coroutine_threadsafe(
+                influx_query(historic_sensor.machine, historic_sensor.name, start_time.isoformat(),
+                             end_time.isoformat(), client=self._influx_client),
+                self._loop).result()
+            thing_series = thing_series_from_influxdb_tables(query_results, machine=historic_sensor.machine,
+                                                             name=historic_sensor.name)
+        else:
+            return
+
+        self._historic_cache.put(cache_key, start_time, end_time, thing_series)
+        # The cached series must not be changed, a view on its data is used instead
+        historic_sensor.historic_sensor_data = thing_series.slice(start_time, end_time)
+
+    @staticmethod
+    def _mongodb_filter(machine: str, name: str, start_time: datetime, end_time: datetime) -> dict:
+        return {"name": name, "machine": machine, 'timestamp': {'$gte': start_time, '$lte': end_time}}
+
+    def _historic_sensor_keys(self) -> List[Tuple[str, str, str]]:
+        """ Returns database, machine and name of each sensor shown by historic dashboards once """
+        keys = [(dashboard.get("db"), sensor.get("machine"), sensor.get("name"))
+                for dashboard in self.config.get("dashboards") if not dashboard.get("live_data")
+                for sensor in dashboard.get("sensors")]
+        return list(dict.fromkeys(keys))
+
+    def _count_historic_values(self, start_time: datetime, end_time: datetime) -> int:
+        num_values = 0
+        for db, machine, name in self._historic_sensor_keys():
+            cached = self._historic_cache.get((db, machine, name), start_time, end_time)
+            if cached is not None:
+                num_values += len(cached)
+            elif "mongodb" in db:
+                if self._mongo_collection is None:
+                    self._logger.info('MongoDB Server cannot be connected, thus _mongo_collection is still None. '
+                                      f'Values of {machine} {name} are not counted.')
+                    continue
+                num_values += self._mongo_collection.count_documents(
+                    self._mongodb_filter(machine, name, start_time, end_time))
+            elif "influxdb" in db:
+                num_values += asyncio.run_coroutine_threadsafe(
+                    influx_count(machine, name, start_time.isoformat(), end_time.isoformat(),
+                                 client=self._influx_client),
+                    self._loop).result()
+        return num_values
+
+    def _iter_export_chunks(self, start_time: datetime, end_time: datetime) -> Iterator[ExportChunk]:
+        """
+        Yields the historic values of all sensors in chunks of :envvar:`FASTIOT_DASH_EXPORT_CHUNK_SIZE` values, read
+        from the database only when needed. Cached data is used if available.
+        """
+        chunk_size = env_dash.export_chunk_size
+        for db, machine, name in self._historic_sensor_keys():
+            cached = self._historic_cache.get((db, machine, name), start_time, end_time)
+            if cached is not None:
+                for start in range(0, len(cached), chunk_size):
+                    yield ExportChunk(machine, name, cached.timestamps[start:start + chunk_size],
+                                      cached.values[start:start + chunk_size])
+            elif "mongodb" in db:
+                cursor = self._mongo_collection.find(
+                    self._mongodb_filter(machine, name, start_time, end_time),
+                    {'_id': 0, 'timestamp': 1, 'value': 1}).sort('timestamp', 1).batch_size(chunk_size)
+                with cursor:
+                    while True:
+                        thing_series = thing_series_from_mongodb_cursor(itertools.islice(cursor, chunk_size),
+                                                                        machine=machine, name=name)
+                        if len(thing_series) == 0:
+                            break
+                        yield ExportChunk(machine, name, thing_series.timestamps, thing_series.values)
+            elif "influxdb" in db:
+                records = influx_query_stream(machine, name, start_time.isoformat(), end_time.isoformat(),
+                                              client=self._influx_client)
+                try:
+                    while True:
+                        chunk = asyncio.run_coroutine_threadsafe(read_chunk(records, chunk_size), self._loop).result()
+                        if not chunk:
+                            break
+                        thing_series = thing_series_from_influxdb_records(chunk, machine=machine, name=name)
+                        yield ExportChunk(machine, name, thing_series.timestamps, thing_series.values)
+                finally:
+                    asyncio.run_coroutine_threadsafe(records.aclose(), self._loop).result()
+
+    def download(self, export_format: str, *args, **kwargs):
+        """
+        Streams the historic data of the time range selected as CSV or Parquet file. Values are read from the database
+        chunk by chunk while the response is sent, so the size of the download is not limited by memory.
+        """
+        if export_format not in (EXPORT_CSV, EXPORT_PARQUET):
+            return f'Invalid export format `{export_format}`, use {EXPORT_CSV} or {EXPORT_PARQUET}', 404
+        if not (self.start_datetime and self.end_datetime):
+            self._logger.warning('Please set the start_datetime and end_datetime in DatePicker first '
+                                 'to download the %s file', export_format)
+            return 'Please select a time range first', 400
+
+        self._logger.info("Download %s file from %s to %s", export_format, str(self.start_datetime),
+                          str(self.end_datetime))
+        chunks = self._iter_export_chunks(self.start_datetime, self.end_datetime)
+        return Response(export_chunks(chunks, export_format), mimetype=EXPORT_MIMETYPES[export_format],
+                        headers={'Content-Disposition': f'attachment; filename="{self.start_datetime}-'
+                                                        f'{self.end_datetime} Data.{export_format}"'})
 
     def download_excel(self, *args, **kwargs):
         if self.start_datetime and self.end_datetime and self.historic_sensor_list:
+            num_values = self._count_historic_values(self.start_datetime, self.end_datetime)
+            if num_values > env_dash.xlsx_max_rows:
+                self._logger.info("%d values exceed the maximum of %d for Excel files, streaming a CSV file instead",
+                                  num_values, env_dash.xlsx_max_rows)
+                return self.download(EXPORT_CSV)
+
             self._logger.info("Download excel file from %s to %s", str(self.start_datetime), str(self.end_datetime))
             self.setup_historic_sensors(self.start_datetime, self.end_datetime)
             df = HistoricSensor.to_df(historic_sensor_list=self.historic_sensor_list)
 
             # Convert DF
             str_io = io.BytesIO()
-            excel_writer = pd.ExcelWriter(str_io, engine='xlsxwriter')
-            df.to_excel(excel_writer, sheet_name='labor')
-            excel_writer.save()
-            excel_data = str_io.getvalue()
+            with pd.ExcelWriter(str_io, engine='xlsxwriter') as excel_writer:
+                df.to_excel(excel_writer, sheet_name='labor')
             str_io.seek(0)
             return send_file(str_io, as_attachment=True,
                              download_name=f'{self.start_datetime}-{self.end_datetime} Data.xlsx')
@@ -284,18 +448,21 @@ class DashModule(FastIoTService):
         traces = []
 
         for sensor in dashboard.get("sensors"):
-            values = []
-            timestamps = []
-            for historic_sensor in self.historic_sensor_list:
-                if historic_sensor.name == sensor.get("name") and \
-                        historic_sensor.machine == sensor.get("machine") and \
-                        dashboard.get("customer") == historic_sensor.customer and \
-                        sensor.get("service") == historic_sensor.service:
-                    if historic_sensor.historic_sensor_data.thing_list:
-                        for thing in historic_sensor.historic_sensor_data.thing_list:
-                            timestamps.append(thing.timestamp)
-                            values.append(thing.value)
-
+            series = [historic_sensor.historic_sensor_data for historic_sensor in self.historic_sensor_list
+                      if historic_sensor.name == sensor.get("name") and
+                      historic_sensor.machine == sensor.get("machine") and
+                      dashboard.get("customer") == historic_sensor.customer and
+                      sensor.get("service") == historic_sensor.service and
+                      historic_sensor.historic_sensor_data is not None]
+            timestamps = np.concatenate([data.timestamps for data in series] or [np.empty(0, 'datetime64[us]')])
+            values = np.concatenate([data.values for data in series] or [np.empty(0)])
+
+            # Only as many points as visually distinguishable are sent to the browser
+            timestamps, values = downsample(
+                timestamps,
+                values,
+                max_points=dashboard.get("max_points", DEFAULT_MAX_POINTS),
+                method=dashboard.get("downsampling", DOWNSAMPLING_LTTB))
             trace1 = go.Scatter(
                 x=timestamps,
                 y=values,
@@ -306,14 +473,12 @@ class DashModule(FastIoTService):
         return traces
 
     async def _cb_received_data(self, subject: str, msg: Thing):
-        self._logger.debug("Received message from sensor %s: %s", msg.name, str(msg))
-        for dashboard in self.config.get("dashboards"):
-            for sensor in dashboard.get("sensors"):
-                if sensor.get("name") == msg.name:
-                    for live_sensor in self.live_sensor_list:
-                        if sensor.get("name") == live_sensor.name:
-                            live_sensor.live_sensors.append(msg)
-                        live_sensor.clean_until(msg.timestamp, dashboard.get("time_shown"))
+        key = (msg.machine, msg.name)
+        live_sensor = self.live_sensors.get(key)
+        if live_sensor is None:
+            return
+        live_sensor.append(msg.timestamp, msg.value)
+        live_sensor.clean_until(msg.timestamp, self._live_time_shown[key])
 
 
 @dataclass
@@ -331,18 +496,17 @@ class GraphCallbacks:
                     barmode='stack')
         }
 
-    def update_graph(self, refresh, *args, **kwargs):
+    def update_graph(self, refresh, _n_intervals, cursors, *args, **kwargs):
         if refresh == 'stop':
-            return dash.no_update
-
-        traces = self.module.update_graph(self.dashboard, *args, **kwargs)
-        return {
-            'data': traces,
-            'layout':
-                go.Layout(
-                    title='Live Data',
-                    barmode='stack')
-        }
+            return dash.no_update, dash.no_update
+
+        extend_data, cursors, points_shown = self.module.update_graph(self.dashboard, cursors, *args, **kwargs)
+        if not any(len(x) for x in extend_data['x']):
+            return dash.no_update, cursors
+        # Plotly keeps the newest points per trace, at least one as zero would disable the limit
+        limit = self.dashboard.get("max_points", self.dashboard.get("live_buffer_size", DEFAULT_LIVE_BUFFER_SIZE))
+        max_points = [max(min(points, limit), 1) for points in points_shown]
+        return [extend_data, list(range(len(extend_data['x']))), {'x': max_points, 'y': max_points}], cursors
 
 
 if __name__ == '__main__':
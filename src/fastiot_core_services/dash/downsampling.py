@@ -0,0 +1,99 @@
+""" Visual downsampling of traces to limit the number of points sent to and drawn by the browser """
+from typing import Tuple
+
+import numpy as np
+
+DOWNSAMPLING_LTTB = 'lttb'
+DOWNSAMPLING_MIN_MAX = 'min_max'
+DOWNSAMPLING_NONE = 'none'
+DEFAULT_MAX_POINTS = 2000
+""" Default number of points per historic trace, see ``max_points`` of a dashboard """
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Selects ``threshold`` points using Largest-Triangle-Three-Buckets, which keeps the visual shape of the trace. The
+    first and last point are always kept, each bucket in between contributes the point forming the largest triangle with
+    the point selected before and the average of the next bucket.
+
+    :param x: Numeric x values in ascending order, e.g. timestamps as floats
+    :param y: Numeric y values without NaN
+    :param threshold: Number of points to select
+    :returns: Indices of the selected points in ascending order
+    """
+    length = len(y)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:length - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:length - 1], edges[:-1]) / counts
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, length - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 1 < threshold - 2:
+            next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def min_max(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Splits the points into ``threshold / 2`` buckets of equal size and selects the minimum and maximum of each, keeping
+    all peaks of the trace.
+
+    :returns: Indices of the selected points in ascending order
+    """
+    length = len(y)
+    num_buckets = max(threshold // 2, 1)
+    if threshold >= length:
+        return np.arange(length)
+    buckets = np.arange(length) * num_buckets // length
+    starts = np.searchsorted(buckets, np.arange(num_buckets))
+    selected = []
+    for extreme in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        # First index of each bucket holding its extreme value
+        candidates = np.flatnonzero(y == extreme[buckets])
+        _, first = np.unique(buckets[candidates], return_index=True)
+        selected.append(candidates[first])
+    return np.unique(np.concatenate(selected))
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, max_points: int,
+               method: str = DOWNSAMPLING_LTTB) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces the trace to at most ``max_points`` points with the given method, ``lttb``, ``min_max`` or ``none``. Values
+    which are not numeric are not downsampled, NaN values are skipped.
+
+    :param timestamps: Timestamps as ``datetime64`` in ascending order
+    :param values: Values of the trace
+    :param max_points: Maximum number of points to return
+    :param method: Downsampling method
+    """
+    if method == DOWNSAMPLING_NONE or len(values) <= max_points:
+        return timestamps, values
+    try:
+        numeric_values = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return timestamps, values
+    finite = np.isfinite(numeric_values)
+    if not finite.all():
+        timestamps, numeric_values = timestamps[finite], numeric_values[finite]
+
+    if method == DOWNSAMPLING_LTTB:
+        indices = lttb(timestamps.astype('datetime64[us]').astype(np.float64), numeric_values, max_points)
+    elif method == DOWNSAMPLING_MIN_MAX:
+        indices = min_max(numeric_values, max_points)
+    else:
+        raise ValueError(f"Invalid downsampling method `{method}`, must be one of {DOWNSAMPLING_LTTB}, "
+                         f"{DOWNSAMPLING_MIN_MAX} or {DOWNSAMPLING_NONE}")
+    return timestamps[indices], numeric_values[indices]
@@ -2,6 +2,11 @@ import os
 
 FASTIOT_HOST_PORT = 'FASTIOT_HOST_PORT'
 FASTIOT_DASH_PORT = 'FASTIOT_DASH_PORT'
+FASTIOT_DASH_CACHE_SIZE = 'FASTIOT_DASH_CACHE_SIZE'
+FASTIOT_DASH_CACHE_TTL = 'FASTIOT_DASH_CACHE_TTL'
+FASTIOT_DASH_MAX_CONCURRENT_QUERIES = 'FASTIOT_DASH_MAX_CONCURRENT_QUERIES'
+FASTIOT_DASH_EXPORT_CHUNK_SIZE = 'FASTIOT_DASH_EXPORT_CHUNK_SIZE'
+FASTIOT_DASH_XLSX_MAX_ROWS = 'FASTIOT_DASH_XLSX_MAX_ROWS'
 
 
 class DashModuleConstants:
@@ -14,5 +19,52 @@ class DashModuleConstants:
     def dash_port(self) -> int:
         return int(os.environ.get(FASTIOT_DASH_PORT, 5802))
 
+    @property
+    def cache_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_DASH_CACHE_SIZE
+
+        Maximum number of historic time ranges cached over all sensors, defaults to 64. Set to 0 to disable the cache.
+        """
+        return int(os.environ.get(FASTIOT_DASH_CACHE_SIZE, 64))
+
+    @property
+    def cache_ttl(self) -> float:
+        """
+        .. envvar:: FASTIOT_DASH_CACHE_TTL
+
+        Seconds to use cached historic data of a time range not yet completed, e.g. ending now, defaults to 60.
+        """
+        return float(os.environ.get(FASTIOT_DASH_CACHE_TTL, 60))
+
+    @property
+    def max_concurrent_queries(self) -> int:
+        """
+        .. envvar:: FASTIOT_DASH_MAX_CONCURRENT_QUERIES
+
+        Maximum number of sensors queried concurrently for historic data, defaults to 8.
+        """
+        return int(os.environ.get(FASTIOT_DASH_MAX_CONCURRENT_QUERIES, 8))
+
+    @property
+    def export_chunk_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_DASH_EXPORT_CHUNK_SIZE
+
+        Number of values read from the database and sent at once for streamed CSV and Parquet downloads, defaults to
+        10000.
+        """
+        return int(os.environ.get(FASTIOT_DASH_EXPORT_CHUNK_SIZE, 10000))
+
+    @property
+    def xlsx_max_rows(self) -> int:
+        """
+        .. envvar:: FASTIOT_DASH_XLSX_MAX_ROWS
+
+        Maximum number of values over all sensors to download as Excel file, defaults to 100000. Larger downloads are
+        streamed as CSV file instead, as the Excel file has to be built in memory.
+        """
+        return int(os.environ.get(FASTIOT_DASH_XLSX_MAX_ROWS, 100000))
+
 
 env_dash = DashModuleConstants()
@@ -0,0 +1,107 @@
+""" Streamed export of historic data as CSV or Parquet, generated chunk by chunk while the response is sent """
+import io
+from typing import AsyncIterator, Iterable, Iterator, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+EXPORT_CSV = 'csv'
+EXPORT_PARQUET = 'parquet'
+EXPORT_XLSX = 'xlsx'
+EXPORT_MIMETYPES = {
+    EXPORT_CSV: 'text/csv',
+    EXPORT_PARQUET: 'application/vnd.apache.parquet',
+    EXPORT_XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+class ExportChunk(NamedTuple):
+    """ Consecutive values of one sensor, timestamps as naive UTC ``datetime64`` """
+    machine: str
+    name: str
+    timestamps: np.ndarray
+    values: np.ndarray
+
+
+def _chunk_to_df(chunk: ExportChunk) -> pd.DataFrame:
+    return pd.DataFrame({'machine': chunk.machine, 'name': chunk.name,
+                         'timestamp': chunk.timestamps, 'value': chunk.values})
+
+
+def csv_chunks(chunks: Iterable[ExportChunk]) -> Iterator[bytes]:
+    """ Yields a CSV file with the columns ``machine``, ``name``, ``timestamp`` and ``value``, one part per chunk """
+    yield b'machine,name,timestamp,value\n'
+    for chunk in chunks:
+        if len(chunk.timestamps):
+            yield _chunk_to_df(chunk).to_csv(index=False, header=False, date_format='%Y-%m-%dT%H:%M:%S.%fZ').encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """ Writable file collecting the bytes written since the last call of :meth:`pop` """
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._position
+
+    def pop(self) -> bytes:
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def parquet_chunks(chunks: Iterable[ExportChunk]) -> Iterator[bytes]:
+    """
+    Yields a Parquet file with the same columns as :func:`csv_chunks`, one row group per chunk. Values are stored as
+    floats, values which cannot be converted are stored as null.
+    """
+    try:
+        # pylint: disable=import-outside-toplevel
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except (ImportError, ModuleNotFoundError) as exception:
+        raise RuntimeError("You have to manually install `fastiot[dash]` or `pyarrow` to export Parquet files."
+                           ) from exception
+
+    schema = pa.schema([('machine', pa.string()), ('name', pa.string()),
+                        ('timestamp', pa.timestamp('us', tz='UTC')), ('value', pa.float64())])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in chunks:
+            if len(chunk.timestamps):
+                values = pd.to_numeric(pd.Series(chunk.values), errors='coerce')
+                writer.write_table(pa.Table.from_pandas(
+                    _chunk_to_df(chunk._replace(values=values.to_numpy(dtype=np.float64))), schema=schema,
+                    preserve_index=False))
+                yield sink.pop()
+    yield sink.pop()
+
+
+def export_chunks(chunks: Iterable[ExportChunk], export_format: str) -> Iterator[bytes]:
+    """ Yields the chunks encoded in the export format, either ``csv`` or ``parquet`` """
+    if export_format == EXPORT_CSV:
+        return csv_chunks(chunks)
+    if export_format == EXPORT_PARQUET:
+        return parquet_chunks(chunks)
+    raise ValueError(f"Invalid export format `{export_format}`, must be {EXPORT_CSV} or {EXPORT_PARQUET}")
+
+
+async def read_chunk(records: AsyncIterator, size: int) -> list:
+    """ Returns the next ``size`` items of the asynchronous iterator, less if it is exhausted """
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            break
+    return chunk
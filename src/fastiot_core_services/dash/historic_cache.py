@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Hashable, Optional, Tuple
+
+from fastiot.core.time import ensure_tzinfo
+from fastiot_core_services.dash.model.historic_sensor import ThingSeries
+
+
+class HistoricDataCache:
+    """
+    Least recently used cache of historic data per sensor and time range, shared by the graphs and the Excel download.
+
+    A request is served from any cached entry of the same sensor covering its time range, so zooming into a range shown
+    before or downloading it does not query the database again. Entries with a time range reaching beyond the time they
+    were fetched at may still change and are only used for ``open_range_ttl`` seconds.
+
+    The cache is thread safe as the Dash callbacks run in the threads of the web server.
+
+    :param max_entries: Maximum number of time ranges cached over all sensors
+    :param open_range_ttl: Seconds to use entries with an open time range
+    """
+
+    def __init__(self, max_entries: int, open_range_ttl: float):
+        self._max_entries = max_entries
+        self._open_range_ttl = open_range_ttl
+        # (sensor, start, end) -> (series, time of expiry or None)
+        self._entries: OrderedDict[Tuple[Hashable, datetime, datetime], Tuple[ThingSeries, Optional[float]]] = \
+            OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, sensor: Hashable, start: datetime, end: datetime) -> Optional[ThingSeries]:
+        """ Returns the data of the sensor between start and end if covered by a cached entry, otherwise None """
+        start, end = ensure_tzinfo(start), ensure_tzinfo(end)
+        now = time.monotonic()
+        with self._lock:
+            for key, (series, expiry) in list(self._entries.items()):
+                if expiry is not None and expiry < now:
+                    del self._entries[key]
+                    continue
+                entry_sensor, entry_start, entry_end = key
+                if entry_sensor == sensor and entry_start <= start and end <= entry_end:
+                    self._entries.move_to_end(key)
+                    return series.slice(start, end)
+        return None
+
+    def put(self, sensor: Hashable, start: datetime, end: datetime, series: ThingSeries):
+        """ Caches the data of the sensor fetched for the time range between start and end """
+        start, end = ensure_tzinfo(start), ensure_tzinfo(end)
+        expiry = None
+        if end > ensure_tzinfo(datetime.utcnow()):
+            expiry = time.monotonic() + self._open_range_ttl
+        with self._lock:
+            self._entries[(sensor, start, end)] = (series, expiry)
+            self._entries.move_to_end((sensor, start, end))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
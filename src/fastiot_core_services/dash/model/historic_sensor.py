@@ -1,28 +1,62 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, List
 
 import numpy as np
 import pandas as pd
-from pydantic import BaseModel
 
-from fastiot.core.time import ensure_tzinfo
 from fastiot.msg import Thing
+from fastiot_core_services.dash.model.live_sensor import to_datetime64
 
 
-class ThingSeries(BaseModel):
+class ThingSeries:
     """
-    This class is used to store a list of Things with the same machine and name
+    This class is used to store a series of Things with the same machine and name.
+
+    The data is stored column by column as NumPy arrays, :attr:`timestamps` as naive UTC ``datetime64`` in ascending
+    order and :attr:`values`, which can be passed to plotting and pandas without copying. A series may also be created
+    from a list of Things, :attr:`thing_list` is only built on access if the series was created from columns.
     """
-    dt_start: Optional[datetime]
-    dt_end: Optional[datetime]
-    thing_list: List[Thing] = []
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        if self.thing_list:
-            kwargs["dt_start"] = kwargs["thing_list"][0].timestamp
-            kwargs["dt_end"] = kwargs["thing_list"][-1].timestamp
-            super().__init__(**kwargs)
+    def __init__(self, dt_start: Optional[datetime] = None, dt_end: Optional[datetime] = None,
+                 thing_list: Optional[List[Thing]] = None, timestamps: Optional[np.ndarray] = None,
+                 values: Optional[np.ndarray] = None, machine: Optional[str] = None, name: Optional[str] = None,
+                 unit: str = ""):
+        self._thing_list = thing_list or None
+        if self._thing_list is not None:
+            timestamps = np.array([to_datetime64(thing.timestamp) for thing in self._thing_list],
+                                  dtype='datetime64[us]')
+            values = np.array([thing.value for thing in self._thing_list])
+            machine, name, unit = self._thing_list[0].machine, self._thing_list[0].name, self._thing_list[0].unit
+        self.timestamps: np.ndarray = timestamps if timestamps is not None else np.empty(0, dtype='datetime64[us]')
+        self.values: np.ndarray = values if values is not None else np.empty(0)
+        self.machine = machine
+        self.name = name
+        self.unit = unit
+        self._dt_start = dt_start
+        self._dt_end = dt_end
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def dt_start(self) -> Optional[datetime]:
+        if len(self.timestamps) == 0:
+            return self._dt_start
+        return self.timestamps[0].astype(datetime).replace(tzinfo=timezone.utc)
+
+    @property
+    def dt_end(self) -> Optional[datetime]:
+        if len(self.timestamps) == 0:
+            return self._dt_end
+        return self.timestamps[-1].astype(datetime).replace(tzinfo=timezone.utc)
+
+    @property
+    def thing_list(self) -> List[Thing]:
+        if self._thing_list is None:
+            self._thing_list = [Thing(machine=self.machine, name=self.name, unit=self.unit, value=value,
+                                      timestamp=timestamp.replace(tzinfo=timezone.utc))
+                                for timestamp, value in zip(self.timestamps.astype(datetime), self.values.tolist())]
+        return self._thing_list
 
     def remove_until(self, timestamp: datetime):
         """
@@ -34,25 +68,27 @@ class ThingSeries(BaseModel):
 
         :param timestamp: Timestamp used for removal.
         """
-
-        timestamp = ensure_tzinfo(timestamp)
-        if self.thing_list:
-            while len(self.thing_list) > 1:
-                if self.thing_list[0].timestamp <= timestamp:
-                    self.thing_list.pop(0)
-                else:
-                    break
-            self.dt_start = self.thing_list[0].timestamp
+        if len(self.timestamps) > 1:
+            start = int(np.searchsorted(self.timestamps, to_datetime64(timestamp), side='right'))
+            self._slice(min(start, len(self.timestamps) - 1), len(self.timestamps))
 
     def remove_from(self, timestamp: datetime):
-        timestamp = ensure_tzinfo(timestamp)
-        if self.thing_list:
-            while len(self.thing_list) > 1:
-                if self.thing_list[-1].timestamp >= timestamp:
-                    self.thing_list.pop()
-                else:
-                    break
-            self.dt_end = self.thing_list[-1].timestamp
+        if len(self.timestamps) > 1:
+            end = int(np.searchsorted(self.timestamps, to_datetime64(timestamp), side='left'))
+            self._slice(0, max(end, 1))
+
+    def slice(self, dt_start: datetime, dt_end: datetime) -> 'ThingSeries':
+        """ Returns a series with the values between dt_start and dt_end including both, sharing the arrays """
+        start = int(np.searchsorted(self.timestamps, to_datetime64(dt_start), side='left'))
+        end = int(np.searchsorted(self.timestamps, to_datetime64(dt_end), side='right'))
+        return ThingSeries(dt_start=dt_start, dt_end=dt_end, timestamps=self.timestamps[start:end],
+                           values=self.values[start:end], machine=self.machine, name=self.name, unit=self.unit)
+
+    def _slice(self, start: int, end: int):
+        self.timestamps = self.timestamps[start:end]
+        self.values = self.values[start:end]
+        if self._thing_list is not None:
+            self._thing_list = self._thing_list[start:end]
 
 
 class HistoricSensor:
@@ -95,10 +131,9 @@ class HistoricSensor:
     @staticmethod
     def to_df(historic_sensor_list: List['HistoricSensor']):
         historic_sensor_df_list = [
-            pd.DataFrame(
-                [(thing.timestamp, thing.value) for thing in historic_sensor.historic_sensor_data.thing_list],
-                columns=['datetime', historic_sensor.name])
-            for counter, historic_sensor in enumerate(historic_sensor_list)]
+            pd.DataFrame({'datetime': historic_sensor.historic_sensor_data.timestamps,
+                          historic_sensor.name: historic_sensor.historic_sensor_data.values})
+            for historic_sensor in historic_sensor_list]
 
         historic_sensors_df = pd.concat(historic_sensor_df_list, axis=0)
         _, i = np.unique(historic_sensors_df.columns, return_index=True)
@@ -1,17 +1,99 @@
 import datetime
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from fastiot.core.time import ensure_tzinfo
+
+DEFAULT_LIVE_BUFFER_SIZE = 10000
+""" Default number of values kept per live sensor, see ``live_buffer_size`` of a dashboard """
+
+
+def to_datetime64(timestamp: datetime.datetime) -> np.datetime64:
+    """ Converts the timestamp to a naive UTC ``numpy.datetime64`` in microseconds as stored by :class:`LiveSensor` """
+    return np.datetime64(ensure_tzinfo(timestamp).replace(tzinfo=None), 'us')
 
 
 class LiveSensor:
-    def __init__(self, name, machine, customer, module):
-        self.live_sensors = []
+    """
+    Ring buffer with the live values of one sensor, identified by machine and name.
+
+    Timestamps and values are stored in preallocated NumPy arrays, so appending a value takes constant time and
+    :attr:`timestamps` and :attr:`values` are views which can be handed to Plotly without copying. Each value is written
+    twice, at its position and ``capacity`` behind it, thus the values currently buffered are always contiguous in
+    memory. If the buffer is full, the oldest value is overwritten.
+
+    :attr:`appended` counts all values ever appended and serves as cursor to fetch only the values appended since, see
+    :meth:`since`.
+
+    Values are stored as floats, values which cannot be converted are stored as NaN.
+    """
+
+    def __init__(self, name, machine, customer, module, capacity: int = DEFAULT_LIVE_BUFFER_SIZE):
         self.name = name
         self.machine = machine
         self.customer = customer
         self.module = module
+        self.capacity = capacity
+        self._timestamps = np.empty(2 * capacity, dtype='datetime64[us]')
+        self._values = np.empty(2 * capacity, dtype=np.float64)
+        self._start = 0
+        self._length = 0
+        self.appended = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """ View on the buffered timestamps as naive UTC ``datetime64``, oldest first """
+        return self._timestamps[self._start:self._start + self._length]
+
+    @property
+    def values(self) -> np.ndarray:
+        """ View on the buffered values, oldest first """
+        return self._values[self._start:self._start + self._length]
 
-    def clean_until(self, current_time, max_delta):
+    def append(self, timestamp: datetime.datetime, value: Any):
         try:
-            while self.live_sensors[0].timestamp < current_time - datetime.timedelta(0, max_delta):
-                self.live_sensors.pop(0)
-        except IndexError:
-            pass
+            value = float(value)
+        except (TypeError, ValueError):
+            value = np.nan
+        timestamp = to_datetime64(timestamp)
+
+        if self._length == self.capacity:
+            self._start = (self._start + 1) % self.capacity
+            self._length -= 1
+        position = (self._start + self._length) % self.capacity
+        self._timestamps[position] = self._timestamps[position + self.capacity] = timestamp
+        self._values[position] = self._values[position + self.capacity] = value
+        self._length += 1
+        self.appended += 1
+
+    def clean_until(self, current_time: datetime.datetime, max_delta: float):
+        """ Removes all values older than ``max_delta`` seconds before ``current_time`` """
+        cutoff = to_datetime64(current_time - datetime.timedelta(seconds=max_delta))
+        expired = int(np.searchsorted(self.timestamps, cutoff, side='left'))
+        if expired:
+            self._start = (self._start + expired) % self.capacity
+            self._length -= expired
+
+    def window(self, max_delta: float) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns views on the timestamps and values of the last ``max_delta`` seconds before the newest value """
+        timestamps = self.timestamps
+        if len(timestamps) == 0:
+            return timestamps, self.values
+        start = int(np.searchsorted(timestamps, timestamps[-1] - np.timedelta64(int(max_delta * 1e6), 'us')))
+        return timestamps[start:], self.values[start:]
+
+    def since(self, cursor: Optional[int], max_delta: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns views on the timestamps and values appended after the cursor, a previous value of :attr:`appended`.
+        Values already evicted are skipped. Without a valid cursor the values of :meth:`window` are returned.
+        """
+        if cursor is None or cursor > self.appended:
+            return self.window(max_delta)
+        new_values = min(self.appended - cursor, self._length)
+        if new_values <= 0:
+            return self.timestamps[:0], self.values[:0]
+        return self.timestamps[-new_values:], self.values[-new_values:]
@@ -4,7 +4,9 @@ As of know it seems to be working but it is only lightly tested. Please use with
 """
 import json
 import threading
-from typing import Dict, List, Union
+from typing import Dict, Iterable, List, Union
+
+import numpy as np
 
 from werkzeug.serving import make_server
 
@@ -13,6 +15,7 @@ from fastiot.msg.custom_db_data_type_conversion import to_mongo_data
 from fastiot.util.object_helper import parse_object_list
 from fastiot_core_services.dash.env import env_dash
 from fastiot_core_services.dash.model.historic_sensor import ThingSeries
+from fastiot_core_services.dash.model.live_sensor import to_datetime64
 
 
 class ServerThread(threading.Thread):
@@ -39,11 +42,40 @@ def thing_series_from_mongodb_data_set(data_set_list: List[Dict]) -> ThingSeries
     return ThingSeries()
 
 
+def thing_series_from_mongodb_cursor(cursor: Iterable[Dict], machine: str, name: str) -> ThingSeries:
+    """
+    Builds a columnar :class:`ThingSeries` directly from the documents of a cursor sorted by timestamp without
+    creating a Thing per document. Query with a projection like ``{'_id': 0, 'timestamp': 1, 'value': 1}``.
+    """
+    timestamps, values = [], []
+    for document in cursor:
+        timestamps.append(to_datetime64(document['timestamp']))
+        values.append(document['value'])
+    return ThingSeries(timestamps=np.array(timestamps, dtype='datetime64[us]'), values=np.array(values),
+                       machine=machine, name=name)
+
+
 def thing_series_to_mongodb_data_set(thing_series: ThingSeries) -> List[Dict]:
     return [to_mongo_data(timestamp=thing.timestamp, subject_name=thing.get_subject(thing.name).name,
                           msg=thing.dict()) for thing in thing_series.thing_list]
 
 
+def thing_series_from_influxdb_tables(tables, machine: str, name: str) -> ThingSeries:
+    """ Builds a columnar :class:`ThingSeries` directly from the tables returned by an InfluxDB query """
+    return thing_series_from_influxdb_records((record for table in tables for record in table.records),
+                                              machine=machine, name=name)
+
+
+def thing_series_from_influxdb_records(records: Iterable, machine: str, name: str) -> ThingSeries:
+    """ Builds a columnar :class:`ThingSeries` from InfluxDB records, e.g. streamed by a query """
+    timestamps, values = [], []
+    for record in records:
+        timestamps.append(to_datetime64(record.values['_time']))
+        values.append(record.values['_value'])
+    return ThingSeries(timestamps=np.array(timestamps, dtype='datetime64[us]'), values=np.array(values),
+                       machine=machine, name=name)
+
+
 def thing_series_from_influxdb_data_set(json_str: Union[List, str]) -> ThingSeries:
     if json_str != '[]':
         results = json.loads(json_str)
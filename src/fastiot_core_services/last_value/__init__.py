@@ -0,0 +1,29 @@
+"""
+Module caching the last value of things
+=======================================
+
+This service subscribes to :class:`fastiot.msg.thing.Thing` and keeps the last value of each thing per machine and
+name in memory, see :envvar:`FASTIOT_LAST_VALUE_SUBSCRIBE_SUBJECT`. Things with an older timestamp than the cached one
+are ignored. Consumers only interested in the current state, e.g. HMI panels, can request a snapshot instead of querying
+the historic data of :mod:`fastiot_core_services.object_storage` or :mod:`fastiot_core_services.time_series`.
+
+You can request the snapshot with an :class:`fastiot.msg.hist.HistObjectReq` with topic ``last_values``, see
+:envvar:`FASTIOT_LAST_VALUE_REQUEST_SUBJECT`. :attr:`fastiot.msg.hist.HistObjectReq.machine` and
+:attr:`fastiot.msg.hist.HistObjectReq.sensor` may be wildcard patterns like ``press_*``, all things are returned if
+not set. The things are returned sorted by machine and name in a single response:
+
+.. code:: python
+
+  from fastiot.util.object_helper import parse_object_list
+
+  request = HistObjectReq(machine='my_machine', limit=None)
+  response: HistObjectResp = await self.broker_connection.request(
+      subject=HistObjectReq.get_reply_subject(name='last_values'), msg=request)
+  things = parse_object_list(response.values, Thing)
+
+With :attr:`fastiot.msg.hist.HistObjectReq.dt_start` things not updated since then are skipped. If the number of things
+reaches the limit, the response contains a continuation token to request the following things. If no thing matches, the
+error code is 1.
+
+The cache is kept in memory only, so it is empty after a restart until the things are received again.
+"""
@@ -0,0 +1,30 @@
+import os
+
+FASTIOT_LAST_VALUE_SUBSCRIBE_SUBJECT = "FASTIOT_LAST_VALUE_SUBSCRIBE_SUBJECT"
+FASTIOT_LAST_VALUE_REQUEST_SUBJECT = "FASTIOT_LAST_VALUE_REQUEST_SUBJECT"
+
+
+class LastValueConstants:
+
+    @property
+    def subscribe_subject(self) -> str:
+        """
+        .. envvar:: FASTIOT_LAST_VALUE_SUBSCRIBE_SUBJECT
+
+        Subject below ``Thing`` to cache the last values of, defaults to ``>`` meaning all things. See
+        :envvar:`FASTIOT_TIME_SERIES_SUBSCRIBE_SUBJECT` for details.
+        """
+        return os.environ.get(FASTIOT_LAST_VALUE_SUBSCRIBE_SUBJECT, ">")
+
+    @property
+    def request_subject(self) -> str:
+        """
+        .. envvar:: FASTIOT_LAST_VALUE_REQUEST_SUBJECT
+
+        Sets the subject the service will listen on for requests with :class:`fastiot.msg.hist.HistObjectReq`. It
+        defaults to ``last_values``.
+        """
+        return os.environ.get(FASTIOT_LAST_VALUE_REQUEST_SUBJECT, "last_values")
+
+
+last_value_env = LastValueConstants()
@@ -0,0 +1,83 @@
+from datetime import datetime
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastiot.core.time import ensure_tzinfo
+from fastiot.msg.thing import Thing
+
+_WILDCARDS = ('*', '?', '[')
+
+LastValue = Tuple[Any, datetime, str, str]
+""" Value, timestamp, unit and measurement id of a thing """
+
+
+def is_pattern(name: Optional[str]) -> bool:
+    """ True if the name is a wildcard pattern like ``sensor_*`` matching several names """
+    return name is not None and any(wildcard in name for wildcard in _WILDCARDS)
+
+
+class LastValueCache:
+    """
+    Keeps the last value of each thing indexed by machine and name. Only value, timestamp, unit and measurement id are
+    stored per thing, updating and looking up a single thing takes constant time.
+    """
+
+    def __init__(self):
+        self._machines: Dict[str, Dict[str, LastValue]] = {}
+
+    def __len__(self):
+        return sum(len(things) for things in self._machines.values())
+
+    def update(self, thing: Thing) -> bool:
+        """
+        Stores the thing unless a thing with a newer timestamp is cached already.
+
+        :returns: True if the thing has been stored
+        """
+        timestamp = ensure_tzinfo(thing.timestamp)
+        things = self._machines.get(thing.machine)
+        if things is None:
+            things = self._machines[thing.machine] = {}
+        last_value = things.get(thing.name)
+        if last_value is not None and last_value[1] > timestamp:
+            return False
+        things[thing.name] = (thing.value, timestamp, thing.unit, thing.measurement_id)
+        return True
+
+    def get(self, machine: str, name: str) -> Optional[Thing]:
+        last_value = self._machines.get(machine, {}).get(name)
+        if last_value is None:
+            return None
+        value, timestamp, unit, measurement_id = last_value
+        return Thing(machine=machine, name=name, value=value, timestamp=timestamp, unit=unit,
+                     measurement_id=measurement_id)
+
+    def snapshot(self, machine: Optional[str] = None, name: Optional[str] = None,
+                 after: Optional[Tuple[str, str]] = None) -> Iterator[Dict]:
+        """
+        Yields the last values of all things matching machine and name as dictionaries with the fields of
+        :class:`fastiot.msg.thing.Thing`, sorted by machine and name.
+
+        :param machine: Machine or wildcard pattern like ``press_*``, all machines if None
+        :param name: Name or wildcard pattern, all things of the matching machines if None
+        :param after: Only yield things sorted after this (machine, name) pair, e.g. to continue a previous snapshot
+        """
+        if machine is None or is_pattern(machine):
+            machines = sorted(key for key in self._machines if machine is None or fnmatchcase(key, machine))
+        else:
+            machines = [machine] if machine in self._machines else []
+
+        for machine_name in machines:
+            if after is not None and machine_name < after[0]:
+                continue
+            things = self._machines[machine_name]
+            if name is None or is_pattern(name):
+                names: List[str] = sorted(key for key in things if name is None or fnmatchcase(key, name))
+            else:
+                names = [name] if name in things else []
+            for thing_name in names:
+                if after is not None and (machine_name, thing_name) <= after:
+                    continue
+                value, timestamp, unit, measurement_id = things[thing_name]
+                yield {'machine': machine_name, 'name': thing_name, 'measurement_id': measurement_id,
+                       'value': value, 'timestamp': timestamp, 'unit': unit}
@@ -0,0 +1,58 @@
+from itertools import islice
+
+from fastiot.core import FastIoTService, reply, subscribe
+from fastiot.core.time import ensure_tzinfo
+from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.msg.thing import Thing
+from fastiot.util.continuation_token import decode_continuation_token, encode_continuation_token
+from fastiot.util.object_helper import columns_from_dict_list
+from fastiot_core_services.last_value.env import last_value_env as env
+from fastiot_core_services.last_value.last_value_cache import LastValueCache
+
+
+class LastValueService(FastIoTService):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._cache = LastValueCache()
+
+    @subscribe(subject=Thing.get_subject(env.subscribe_subject))
+    async def consume(self, msg: Thing):
+        self._cache.update(msg)
+
+    @reply(HistObjectReq.get_reply_subject(name=env.request_subject))
+    async def reply(self, request: HistObjectReq):
+        after = None
+        if request.continuation_token is not None:
+            try:
+                position = decode_continuation_token(request.continuation_token)
+                after = (str(position['machine']), str(position['name']))
+            except (ValueError, KeyError):
+                return HistObjectResp(values=[], error_msg=f"Invalid continuation token `{request.continuation_token}`",
+                                      error_code=2)
+
+        values = self._cache.snapshot(machine=request.machine, name=request.sensor, after=after)
+        if request.dt_start is not None:
+            dt_start = ensure_tzinfo(request.dt_start)
+            values = (value for value in values if value['timestamp'] >= dt_start)
+        if request.dt_end is not None:
+            dt_end = ensure_tzinfo(request.dt_end)
+            values = (value for value in values if value['timestamp'] < dt_end)
+        values = list(islice(values, request.limit or None))
+        if not values:
+            return HistObjectResp(values=[], error_msg="no data found", error_code=1)
+
+        continuation_token = None
+        if request.limit and len(values) >= request.limit:
+            continuation_token = encode_continuation_token({'machine': values[-1]['machine'],
+                                                            'name': values[-1]['name']})
+        if request.fields:
+            values = [{field: value[field] for field in request.fields if field in value} for value in values]
+        if request.columnar:
+            return HistObjectResp(values=[], columns=columns_from_dict_list(values),
+                                  continuation_token=continuation_token)
+        return HistObjectResp(values=values, continuation_token=continuation_token)
+
+
+if __name__ == '__main__':
+    LastValueService.main()
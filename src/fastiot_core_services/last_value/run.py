@@ -0,0 +1,4 @@
+from fastiot_core_services.last_value.last_value_service import LastValueService
+
+if __name__ == '__main__':
+    LastValueService.main()
@@ -8,6 +8,10 @@ This Service is intended for saving "Object" inheriting the :class:`fastiot.core
 and requesting of historical object data. This Service is also designed to save one data type, for demanding saving
 multiple data types, you can instance multiple Services, using config file.
 
+Writing and querying the database is done in separate thread pools by
+:class:`fastiot_core_services.object_storage.mongodb_handler.MongoDBHandler`, thus long running history requests do not
+stall the ingestion of new objects. Use :envvar:`FASTIOT_MONGO_DB_MAX_POOL_SIZE` to limit the number of connections.
+
 Your Object will be saved in Dictionary in such format, 'yyy' stands for the unpacked Attributes of Object:
 
 .. code:: python
@@ -44,8 +48,12 @@ The following example should provide you with a working configuration:
 Remarks:
 * ``search_index`` defines the MongoDB index to speed up the query.
   ``_subject`` and ``_timestamp`` are defined as compound index in the above example.
+  Per default compound indices for ``_subject``, ``_timestamp``, ``_id`` and ``machine``, ``name``, ``_timestamp``,
+  ``_id`` are created for all collections, set ``create_default_index: false`` to disable this.
 * ``subject_name`` is the subject, where you send your data.
-* ``enable_overwriting`` is a boolean flag for object overwriting
+* ``enable_overwriting`` is a boolean flag for object overwriting. Overwrites are collected and written as bulk
+  upserts, multiple updates of the same object within one bulk are merged. Use
+  :envvar:`FASTIOT_OBJECT_STORAGE_BULK_SIZE` to limit the size of a bulk.
 * ``identify_object_with`` defines object fields, which define the whole object with its uniqueness
   The other fields will be overwritten respectively.
   Needed only if ``enable_overwriting`` set on ``true``
@@ -84,6 +92,37 @@ The code will look like:
   subject = hist_req_msg.get_reply_subject(name='my_set_reply_subject_name')
 
 **CAUTION!** This subject_name should be the same as, which you have defined in ObjectStorageService.yaml.
-This request will reply to you a list of dictionaries.
+This request will reply to you a list of dictionaries sorted by their timestamp. If more objects than ``limit`` are
+available, the response contains a continuation token to request the next page, see
+:attr:`fastiot.msg.hist.HistObjectReq.continuation_token`.
 Then you can convert it to your own data type using :func:`fastiot.util.object_helper.parse_object_list`.
+To reduce the size of the response you may request only some ``fields`` or let MongoDB downsample the data with an
+aggregation pipeline by setting a ``resolution`` and an ``aggregate`` for the field ``value``.
+
+Large amounts of measurements are stored more efficiently in time series collections configured with
+:attr:`fastiot_core_services.object_storage.config_model.ObjectStorageConfig.time_series_collections`. By default, a
+native MongoDB time series collection is created. For MongoDB versions before 5.0 set ``bucket_size`` to group several
+documents into one bucket document instead, the requests stay the same.
+
+.. code:: yaml
+
+  time_series_collections:
+    things:
+      meta_field: machine
+      granularity: seconds
+
+To limit the storage used, configure a retention per collection with
+:attr:`fastiot_core_services.object_storage.config_model.ObjectStorageConfig.retention`. Old documents are either
+removed by MongoDB with a TTL index or periodically by the service, which may downsample them into another collection
+before. The number of deleted documents is logged.
+
+If MongoDB is not available, received data is spooled on disk in :envvar:`FASTIOT_VOLUME_DIR` using
+:class:`fastiot.db.spool.DiskSpool` and written in bulks once MongoDB is back, see :envvar:`FASTIOT_SPOOL_MAX_SIZE`.
+
+.. code:: yaml
+
+  retention:
+    things:
+      max_age: P30D
+      downsample_resolution: 3600
 """
@@ -1,4 +1,5 @@
-from typing import Dict, List, Union
+from datetime import timedelta
+from typing import Dict, List, Optional, Union
 
 from pydantic import BaseModel
 
@@ -20,6 +21,51 @@ class SubscriptionConfig(BaseModel):
     """
 
 
+class TimeSeriesCollectionConfig(BaseModel):
+    """ Configuration for a collection optimized for storing time series like :class:`fastiot.msg.thing.Thing` """
+    meta_field: Optional[str] = None
+    """
+    Field identifying the series, e.g. ``machine`` or ``name``. Documents with the same value and subject are stored
+    together. Using the field most queries filter for gives the best results.
+    """
+    granularity: Optional[str] = None
+    """
+    Granularity of a native time series collection, one of ``seconds``, ``minutes`` or ``hours``. MongoDB uses
+    ``seconds`` if not set, choose the value closest to the interval data arrives in.
+    """
+    bucket_size: int = 0
+    """
+    Set this to store up to this many documents in one bucket document (bucket pattern) instead of using a native time
+    series collection, which is only available with MongoDB 5.0 or newer. Keep 0 to create a native time series
+    collection.
+    """
+
+
+class RetentionConfig(BaseModel):
+    """ Configuration how long data is kept in a collection """
+    max_age: timedelta
+    """
+    Documents with a ``_timestamp`` older than this are deleted, e.g. ``P30D``, ``30 days, 00:00:00`` or the number of
+    seconds.
+    """
+    use_ttl_index: bool = False
+    """
+    Let MongoDB delete old documents using a TTL index on ``_timestamp`` (``_timestamp_max`` for bucket documents)
+    respectively ``expireAfterSeconds`` for native time series collections. Otherwise, the service deletes old documents
+    periodically, see :envvar:`FASTIOT_OBJECT_STORAGE_RETENTION_INTERVAL`, which allows to downsample them first.
+    """
+    downsample_resolution: Optional[timedelta] = None
+    """
+    Downsample documents into buckets of this width before deleting them, only used without TTL index. The results are
+    stored in :attr:`fastiot_core_services.object_storage.config_model.RetentionConfig.downsample_collection` like the
+    responses for requests with :attr:`fastiot.msg.hist.HistObjectReq.resolution`.
+    """
+    downsample_aggregate: str = 'mean'
+    """ Function to aggregate the field ``value``, see :attr:`fastiot.msg.hist.HistObjectReq.aggregate` """
+    downsample_collection: Optional[str] = None
+    """ Collection to store the downsampled documents in, defaults to the collection name with ``_downsampled`` """
+
+
 class ObjectStorageConfig(FastIoTConfigModel):
     """ Base configuration for an object storage service """
     search_index: Dict[str, List[Union[str, List[str]]]] = {}
@@ -29,6 +75,24 @@ class ObjectStorageConfig(FastIoTConfigModel):
     You may provide a single entry (string type) to create a single index. 
     To create a multi-index simply provide a list of strings with the corresponding fields in the MongoDB here. 
     """
+    create_default_index: bool = True
+    """
+    Create compound indices matching the queries built from :class:`fastiot.msg.hist.HistObjectReq` for each collection
+    configured in the subscriptions: ``_subject``, ``_timestamp``, ``_id`` and, for documents containing a ``machine``
+    like :class:`fastiot.msg.thing.Thing`, ``machine``, ``name``, ``_timestamp``, ``_id``.
+    """
+    time_series_collections: Dict[str, TimeSeriesCollectionConfig] = {}
+    """
+    Store the data of the collections given as keys as time series using a native time series collection with
+    ``_timestamp`` as time field or bucket documents. This reduces the storage size and speeds up queries for large
+    amounts of measurements. Time series collections cannot be used for subscriptions with ``enable_overwriting``.
+    Existing collections are not converted.
+    """
+    retention: Dict[str, RetentionConfig] = {}
+    """
+    Configure how long data is kept for the collections given as keys. Collections without retention keep their data
+    forever.
+    """
     subscriptions: Dict[str, SubscriptionConfig] = {}
     """
     Add subscriptions here, the key is the subscription like ``thing.*``. 
@@ -1,6 +1,8 @@
 import os
 
 FASTIOT_OBJECT_STORAGE_SUBJECT = 'FASTIOT_OBJECT_STORAGE_SUBJECT'
+FASTIOT_OBJECT_STORAGE_BULK_SIZE = 'FASTIOT_OBJECT_STORAGE_BULK_SIZE'
+FASTIOT_OBJECT_STORAGE_RETENTION_INTERVAL = 'FASTIOT_OBJECT_STORAGE_RETENTION_INTERVAL'
 
 
 class ObjectStorageConstants:
@@ -9,5 +11,24 @@ class ObjectStorageConstants:
     def subject(self):
         return os.environ.get(FASTIOT_OBJECT_STORAGE_SUBJECT, 'v1.>')
 
+    @property
+    def bulk_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_OBJECT_STORAGE_BULK_SIZE
+
+        Maximum number of upserts collected for one ``bulk_write`` if overwriting is enabled for a subscription.
+        Pending upserts are written as soon as the service is idle or this limit is reached, defaults to 1000.
+        """
+        return int(os.environ.get(FASTIOT_OBJECT_STORAGE_BULK_SIZE, 1000))
+
+    @property
+    def retention_interval(self) -> float:
+        """
+        .. envvar:: FASTIOT_OBJECT_STORAGE_RETENTION_INTERVAL
+
+        Interval in seconds to delete and downsample documents exceeding the configured retention, defaults to 3600.
+        """
+        return float(os.environ.get(FASTIOT_OBJECT_STORAGE_RETENTION_INTERVAL, 3600))
+
 
 env_object_storage = ObjectStorageConstants()
@@ -1,16 +1,35 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timezone
-from typing import List, Tuple, Union, Any
+from functools import partial
+from typing import List, Tuple, Union, Any, Callable, Dict, Optional
 
+import pymongo
 from bson.binary import UUID_SUBTYPE
 from bson.codec_options import CodecOptions
 from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.results import BulkWriteResult, DeleteResult, InsertOneResult
 
 from fastiot.db.mongodb_helper_fn import get_mongodb_client_from_env
+from fastiot.env import env_mongodb
 
 
 class MongoDBHandler:
+    """
+    Handler for the MongoDB used by the object storage.
+
+    Besides the synchronous helpers it provides async methods for writing and querying. Those run the blocking pymongo
+    calls in separate thread pools, so neither blocks the event loop nor writes and queries block each other. Writes are
+    executed by a single thread to keep their order, queries are using the remaining connections of the pool configured
+    with :envvar:`FASTIOT_MONGO_DB_MAX_POOL_SIZE`.
+    """
+
     def __init__(self):
         self._db_client = get_mongodb_client_from_env()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mongodb_write')
+        self._query_executor = ThreadPoolExecutor(max_workers=max(1, env_mongodb.max_pool_size - 1),
+                                                  thread_name_prefix='mongodb_query')
 
     def health_check(self) -> bool:
         connected_nodes = self._db_client.nodes
@@ -34,7 +53,32 @@ class MongoDBHandler:
         self._db_client.admin.command('fsync', lock=True)
 
     @staticmethod
-    def create_index(collection: Collection, index: List[Tuple[str, Union[int, Any]]], index_name: str) -> bool:
+    def create_time_series_collection(database: Database, name: str, meta_field: Optional[str] = None,
+                                      granularity: Optional[str] = None) -> bool:
+        """
+        Creates a native time series collection using ``_timestamp`` as time field if the collection does not exist.
+        Requires MongoDB 5.0 or newer.
+
+        :param database: Database (instance, not name) to create the collection in
+        :param name: Name of the collection
+        :param meta_field: Optional field identifying the series
+        :param granularity: Optional granularity, ``seconds``, ``minutes`` or ``hours``
+        :returns: True if the collection has been created, False if it exists already
+        """
+        if name in database.list_collection_names():
+            return False
+
+        time_series = {'timeField': '_timestamp'}
+        if meta_field is not None:
+            time_series['metaField'] = meta_field
+        if granularity is not None:
+            time_series['granularity'] = granularity
+        database.create_collection(name, timeseries=time_series)
+        return True
+
+    @staticmethod
+    def create_index(collection: Collection, index: List[Tuple[str, Union[int, Any]]], index_name: str,
+                     **kwargs) -> bool:
         """
         Creates the defined index in the defined collection if the index does not exist.
         Otherwise, no changes will be done to the database to save time-consuming rebuilding of the index
@@ -43,16 +87,89 @@ class MongoDBHandler:
         :param index: Define index as wanted by pymongo create_index, eg. [(column_name, pymongo.ASCENDING)]
                       Instead of pymongo.ASCENDING you can also write 1, DESCENDING is -1
         :param index_name: Define a unique name for the index. This name will be used to check if index has already been
-                           created
+                           created. An index with the same keys but another name is also considered as created.
+        :param kwargs: Further options passed to pymongo create_index, e.g. ``partialFilterExpression``
         :returns: True if index has been created, False if index has been created already
 
         """
-        all_indices = [index['name'] for index in collection.list_indexes()]
-        if index_name not in all_indices:
-            collection.create_index(index, name=index_name)
-            return True
+        all_indices = collection.index_information()
+        if index_name in all_indices:
+            return False
+        if any(list(existing_index['key']) == list(index) for existing_index in all_indices.values()):
+            return False
+
+        collection.create_index(index, name=index_name, **kwargs)
+        return True
 
+    @staticmethod
+    def create_ttl_index(collection: Collection, field: str, expire_after_seconds: int, index_name: str) -> bool:
+        """
+        Creates a TTL index to let MongoDB delete documents once the date in ``field`` is older than
+        ``expire_after_seconds``. An existing index with the same name is updated if the expiry changed.
+
+        :returns: True if the index has been created or updated, False if it exists already
+        """
+        index_info = collection.index_information().get(index_name)
+        if index_info is None:
+            collection.create_index([(field, pymongo.DESCENDING)], name=index_name,
+                                    expireAfterSeconds=expire_after_seconds)
+            return True
+        if index_info.get('expireAfterSeconds') != expire_after_seconds:
+            collection.database.command('collMod', collection.name,
+                                        index={'name': index_name, 'expireAfterSeconds': expire_after_seconds})
+            return True
         return False
 
+    @staticmethod
+    def set_collection_expiry(database: Database, name: str, expire_after_seconds: int):
+        """ Lets MongoDB delete documents of a native time series collection older than ``expire_after_seconds`` """
+        database.command('collMod', name, expireAfterSeconds=expire_after_seconds)
+
+    async def insert_one(self, collection: Collection, document: Dict) -> InsertOneResult:
+        """ Inserts the document without blocking the event loop. """
+        return await self._run_write(collection.insert_one, document)
+
+    async def delete_many(self, collection: Collection, query: Dict) -> DeleteResult:
+        """ Deletes all documents matching the query without blocking the event loop. """
+        return await self._run_write(collection.delete_many, query)
+
+    async def bulk_write(self, collection: Collection, requests: List) -> BulkWriteResult:
+        """ Executes the bulk write operations in order without blocking the event loop. """
+        return await self._run_write(collection.bulk_write, requests)
+
+    async def find(self, collection: Collection, query: Dict, limit: int = 0,
+                   sort: Optional[List[Tuple[str, int]]] = None,
+                   projection: Optional[Dict[str, int]] = None) -> List[Dict]:
+        """
+        Runs the query and fetches all results without blocking the event loop.
+
+        :param collection: Collection (instance, not name) to search in
+        :param query: Query dict as used by pymongo
+        :param limit: Maximum number of results, 0 or None for no limit
+        :param sort: Optional sort order as list of (key, direction) pairs
+        :param projection: Optional projection to only fetch some fields, e.g. ``{'value': 1}``
+        """
+        return await self._run_query(self._find, collection, query, limit, sort, projection)
+
+    async def aggregate(self, collection: Collection, pipeline: List[Dict]) -> List[Dict]:
+        """ Runs the aggregation pipeline and fetches all results without blocking the event loop. """
+        return await self._run_query(lambda: list(collection.aggregate(pipeline)))
+
+    @staticmethod
+    def _find(collection: Collection, query: Dict, limit: Optional[int],
+              sort: Optional[List[Tuple[str, int]]], projection: Optional[Dict[str, int]]) -> List[Dict]:
+        cursor = collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.limit(limit or 0))
+
+    async def _run_write(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._write_executor, partial(fn, *args, **kwargs))
+
+    async def _run_query(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._query_executor, partial(fn, *args, **kwargs))
+
     def close(self):
+        self._write_executor.shutdown(wait=True)
+        self._query_executor.shutdown(wait=True)
         self._db_client.close()
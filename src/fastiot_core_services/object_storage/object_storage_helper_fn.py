@@ -1,17 +1,35 @@
 import re
-from typing import Dict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Optional, Tuple, Union
 
-from fastiot.msg.hist import HistObjectReq
+import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from fastiot.core.subject_helper import WILDCARD_SAME_LEVEL, HIERARCHY
+from fastiot.msg.hist import HistObjectReq, HIST_AGGREGATES
+from fastiot_core_services.object_storage.config_model import RetentionConfig
+from fastiot.util.continuation_token import encode_continuation_token, decode_continuation_token
+
+QUERY_SORT = [('_timestamp', pymongo.ASCENDING), ('_id', pymongo.ASCENDING)]
+""" Sort order of query results, the ``_id`` makes the order unique for continuation tokens. """
 
 
 def build_query_dict(hist_object_req: HistObjectReq) -> Dict:
     """
-    This function parses the HistObjectReq instance, and build the query dict to search data in database
+    This function parses the HistObjectReq instance, and build the query dict to search data in database.
+
+    The subject name is translated into an exact match or an anchored regex and ``machine`` and ``sensor`` are mapped
+    to the fields ``machine`` and ``name`` of :class:`fastiot.msg.thing.Thing`, so the query can use the default
+    indices created by the object storage.
     """
     query_dict = {}
     if hist_object_req.subject_name is not None:
-        subject_substr = re.sub(r"\ |\*|", '', hist_object_req.subject_name).split('..')[0]
-        query_dict = query_dict | {"_subject": {'$regex': subject_substr}}
+        query_dict = query_dict | {"_subject": build_subject_filter(hist_object_req.subject_name)}
+    if hist_object_req.machine is not None:
+        query_dict = query_dict | {"machine": hist_object_req.machine}
+    if hist_object_req.sensor is not None:
+        query_dict = query_dict | {"name": hist_object_req.sensor}
     if hist_object_req.dt_start is not None and hist_object_req.dt_end is None:
         query_dict = query_dict | {"_timestamp": {'$gte': hist_object_req.dt_start}}
     if hist_object_req.dt_end is not None and hist_object_req.dt_start is None:
@@ -20,5 +38,266 @@ def build_query_dict(hist_object_req: HistObjectReq) -> Dict:
         query_dict = query_dict | {"_timestamp": {'$gte': hist_object_req.dt_start, '$lte': hist_object_req.dt_end}}
     if hist_object_req.raw_query is not None:
         query_dict = query_dict | hist_object_req.raw_query
+    if hist_object_req.continuation_token is not None and hist_object_req.resolution is None:
+        # Downsampled requests continue after the last bucket, see :func:`build_aggregation_pipeline`
+        query_dict = {'$and': [query_dict, build_continuation_filter(hist_object_req.continuation_token)]}
 
     return query_dict
+
+
+def build_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    """
+    This function builds the projection to only fetch the requested fields. The internal fields ``_id``, ``_subject``
+    and ``_timestamp`` are always included to convert the results and create continuation tokens.
+    """
+    if not fields:
+        return None
+    return {field: 1 for field in fields} | {'_subject': 1, '_timestamp': 1}
+
+
+def build_aggregation_operator(hist_object_req: HistObjectReq) -> Dict:
+    """
+    This function translates the aggregate of a request into the accumulator of a MongoDB ``$group`` stage for the field
+    ``value``.
+
+    :raises ValueError: If the resolution or the aggregate is invalid
+    """
+    if hist_object_req.resolution is None or hist_object_req.resolution * 1000 < 1:
+        raise ValueError(f"Invalid resolution `{hist_object_req.resolution}`, must be at least one millisecond")
+    aggregate = hist_object_req.aggregate or 'mean'
+    if aggregate not in HIST_AGGREGATES:
+        raise ValueError(f"Invalid aggregate `{aggregate}`, must be one of {', '.join(HIST_AGGREGATES)}")
+    if aggregate == 'count':
+        return {'$sum': 1}
+    operator = {'mean': '$avg'}.get(aggregate, '$' + aggregate)
+    return {operator: '$value'}
+
+
+def build_aggregation_pipeline(hist_object_req: HistObjectReq, query_dict: Dict) -> List[Dict]:
+    """
+    This function builds the aggregation pipeline to downsample the results matching the query dict into buckets of
+    :attr:`fastiot.msg.hist.HistObjectReq.resolution`, one result per subject and bucket. Each result equals the first
+    document of its bucket with the field ``value`` aggregated and the timestamps set to the start of the bucket.
+
+    :raises ValueError: If the resolution, the aggregate or the continuation token is invalid
+    """
+    operator = build_aggregation_operator(hist_object_req)
+    timestamp_ms = {'$toLong': '$_timestamp'}
+    resolution_ms = int(hist_object_req.resolution * 1000)
+    bucket = {'$toDate': {'$subtract': [timestamp_ms, {'$mod': [timestamp_ms, resolution_ms]}]}}
+
+    bucket_filter = None
+    if hist_object_req.continuation_token is not None:
+        bucket_filter = build_bucket_continuation_filter(hist_object_req.continuation_token)
+        query_dict = {'$and': [query_dict, {'_timestamp': {'$gte': bucket_filter['$or'][1]['_id.bucket']}}]}
+
+    pipeline = [{'$match': query_dict},
+                {'$sort': dict(QUERY_SORT)},
+                {'$group': {'_id': {'bucket': bucket, 'subject': '$_subject'},
+                            'first': {'$first': '$$ROOT'},
+                            'value': operator}}]
+    if bucket_filter is not None:
+        pipeline.append({'$match': bucket_filter})
+    pipeline.append({'$sort': {'_id.bucket': pymongo.ASCENDING, '_id.subject': pymongo.ASCENDING}})
+    if hist_object_req.limit:
+        pipeline.append({'$limit': hist_object_req.limit})
+    pipeline.append({'$replaceRoot': {'newRoot': {'$mergeObjects': [
+        '$first',
+        {'value': '$value', '_timestamp': '$_id.bucket'},
+        {'$cond': [{'$eq': [{'$type': '$first.timestamp'}, 'missing']}, {}, {'timestamp': '$_id.bucket'}]}
+    ]}}})
+    projection = build_projection(hist_object_req.fields)
+    if projection is not None:
+        pipeline.append({'$project': projection})
+    return pipeline
+
+
+def build_continuation_filter(continuation_token: str) -> Dict:
+    """
+    This function builds the filter for all documents following the position stored in the continuation token using the
+    sort order :attr:`QUERY_SORT`.
+
+    :raises ValueError: If the continuation token is invalid
+    """
+    position = decode_continuation_token(continuation_token)
+    try:
+        timestamp = position['timestamp']
+        object_id = ObjectId(position['id'])
+    except (KeyError, TypeError, InvalidId) as exception:
+        raise ValueError(f"Invalid continuation token `{continuation_token}`") from exception
+    return {'$or': [{'_timestamp': {'$gt': timestamp}},
+                    {'_timestamp': timestamp, '_id': {'$gt': object_id}}]}
+
+
+def build_continuation_token(mongo_data: Dict) -> str:
+    """
+    This function creates a continuation token pointing behind the given document, which must be the last one returned.
+    """
+    return encode_continuation_token({'timestamp': mongo_data['_timestamp'], 'id': str(mongo_data['_id'])})
+
+
+def build_bucket_update(mongo_data: Dict, meta_field: Optional[str], bucket_size: int) -> Tuple[Dict, Dict]:
+    """
+    This function builds the filter and update to append a document to a bucket document of its subject and meta field
+    using the bucket pattern. A new bucket is upserted once all buckets contain ``bucket_size`` documents.
+
+    The bucket documents contain the subject, the meta field, the number of documents ``_count``, the time range
+    ``_timestamp_min`` and ``_timestamp_max`` as well as the documents in ``samples``.
+    """
+    mongo_data.setdefault('_id', ObjectId())
+    query = {'_subject': mongo_data['_subject'], '_count': {'$lt': bucket_size}}
+    if meta_field is not None:
+        query[meta_field] = mongo_data.get(meta_field)
+    update = {'$push': {'samples': mongo_data},
+              '$inc': {'_count': 1},
+              '$min': {'_timestamp_min': mongo_data['_timestamp']},
+              '$max': {'_timestamp_max': mongo_data['_timestamp']}}
+    return query, update
+
+
+def build_bucket_query_pipeline(hist_object_req: HistObjectReq, query_dict: Dict,
+                                meta_field: Optional[str]) -> List[Dict]:
+    """
+    This function builds the aggregation pipeline to query documents stored in bucket documents, see
+    :func:`build_bucket_update`. Buckets are preselected by subject, meta field and time range of the request before
+    unwinding the documents, which are then queried like documents of a regular collection. With a continuation token
+    the time range starts at its position, so each page only unwinds the buckets from there.
+
+    :raises ValueError: If the resolution, the aggregate or the continuation token is invalid
+    """
+    range_start = hist_object_req.dt_start
+    if hist_object_req.continuation_token is not None:
+        # The position is never before dt_start, buckets ending earlier only hold documents of previous pages
+        if hist_object_req.resolution is None:
+            range_start = build_continuation_filter(hist_object_req.continuation_token)['$or'][1]['_timestamp']
+        else:
+            range_start = build_bucket_continuation_filter(hist_object_req.continuation_token)['$or'][1]['_id.bucket']
+
+    bucket_filter = {}
+    if hist_object_req.subject_name is not None:
+        bucket_filter['_subject'] = build_subject_filter(hist_object_req.subject_name)
+    if meta_field == 'machine' and hist_object_req.machine is not None:
+        bucket_filter['machine'] = hist_object_req.machine
+    if meta_field == 'name' and hist_object_req.sensor is not None:
+        bucket_filter['name'] = hist_object_req.sensor
+    if range_start is not None:
+        bucket_filter['_timestamp_max'] = {'$gte': range_start}
+    if hist_object_req.dt_end is not None:
+        bucket_filter['_timestamp_min'] = {'$lte': hist_object_req.dt_end}
+
+    pipeline = [{'$match': bucket_filter},
+                {'$unwind': '$samples'},
+                {'$replaceRoot': {'newRoot': '$samples'}}]
+    if hist_object_req.resolution is not None:
+        return pipeline + build_aggregation_pipeline(hist_object_req, query_dict)
+
+    pipeline += [{'$match': query_dict}, {'$sort': dict(QUERY_SORT)}]
+    if hist_object_req.limit:
+        pipeline.append({'$limit': hist_object_req.limit})
+    projection = build_projection(hist_object_req.fields)
+    if projection is not None:
+        pipeline.append({'$project': projection})
+    return pipeline
+
+
+def retention_cutoff(now: datetime, retention_config: RetentionConfig) -> datetime:
+    """
+    This function calculates the timestamp documents older than are removed. If the documents are downsampled, the
+    timestamp is aligned to the start of a bucket, so only complete buckets are downsampled.
+    """
+    cutoff = now - retention_config.max_age
+    if retention_config.downsample_resolution is None:
+        return cutoff
+    resolution_ms = int(retention_config.downsample_resolution.total_seconds() * 1000)
+    cutoff_ms = int(cutoff.timestamp() * 1000)
+    return datetime.fromtimestamp((cutoff_ms - cutoff_ms % resolution_ms) / 1000, tz=timezone.utc)
+
+
+def build_downsample_pipeline(retention_config: RetentionConfig, cutoff: datetime, target_collection: str,
+                              bucket_documents: bool = False) -> List[Dict]:
+    """
+    This function builds the aggregation pipeline to downsample all documents older than the cutoff like a request
+    with :attr:`fastiot.msg.hist.HistObjectReq.resolution` and merge the results into the target collection. Running
+    the pipeline again replaces the results, as each result keeps the ``_id`` of the first document of its bucket.
+
+    :raises ValueError: If the resolution or the aggregate is invalid
+    """
+    hist_object_req = HistObjectReq(resolution=retention_config.downsample_resolution.total_seconds(),
+                                    aggregate=retention_config.downsample_aggregate, limit=None)
+    pipeline = []
+    if bucket_documents:
+        pipeline = [{'$match': {'_timestamp_min': {'$lt': cutoff}}},
+                    {'$unwind': '$samples'},
+                    {'$replaceRoot': {'newRoot': '$samples'}}]
+    pipeline += build_aggregation_pipeline(hist_object_req, {'_timestamp': {'$lt': cutoff}})
+    pipeline.append({'$merge': {'into': target_collection, 'on': '_id',
+                                'whenMatched': 'replace', 'whenNotMatched': 'insert'}})
+    return pipeline
+
+
+def build_bucket_continuation_filter(continuation_token: str) -> Dict:
+    """
+    This function builds the filter for all buckets of an aggregation pipeline following the position stored in the
+    continuation token.
+
+    :raises ValueError: If the continuation token is invalid
+    """
+    position = decode_continuation_token(continuation_token)
+    try:
+        timestamp = position['timestamp']
+        subject = position['subject']
+    except (KeyError, TypeError) as exception:
+        raise ValueError(f"Invalid continuation token `{continuation_token}`") from exception
+    return {'$or': [{'_id.bucket': {'$gt': timestamp}},
+                    {'_id.bucket': timestamp, '_id.subject': {'$gt': subject}}]}
+
+
+def build_bucket_continuation_token(mongo_data: Dict) -> str:
+    """
+    This function creates a continuation token pointing behind the given bucket, which must be the last one returned.
+    """
+    return encode_continuation_token({'timestamp': mongo_data['_timestamp'], 'subject': mongo_data['_subject']})
+
+
+def build_subject_filter(subject_name: str) -> Union[str, Dict]:
+    """
+    This function converts a subject name, possibly containing wildcards like ``v1.thing.*`` or ``v1.thing.>``, into a
+    filter for the field ``_subject``. Subjects without wildcards result in an exact match, otherwise a regex anchored
+    at the beginning is returned, so MongoDB only has to scan the index range of the prefix.
+    """
+    tokens = [token for token in subject_name.replace(' ', '').split('.') if token != '']
+    if WILDCARD_SAME_LEVEL not in tokens and HIERARCHY not in tokens:
+        return '.'.join(tokens)
+
+    regex_tokens = []
+    for token in tokens:
+        if token == WILDCARD_SAME_LEVEL:
+            regex_tokens.append(r'[^.]+')
+        elif token == HIERARCHY:
+            regex_tokens.append(r'.+')
+            break
+        else:
+            regex_tokens.append(re.escape(token))
+    return {'$regex': '^' + r'\.'.join(regex_tokens) + '$'}
+
+
+def build_upsert(mongo_data: Dict, identify_object_with: List[str]) -> Tuple[Dict, Dict]:
+    """
+    This function splits a mongo data set into the filter identifying the object and the fields to be set by an upsert
+    """
+    query = {key_name: mongo_data[key_name] for key_name in identify_object_with}
+    update_fields = {field: value for field, value in mongo_data.items() if field not in identify_object_with}
+    return query, update_fields
+
+
+def upsert_key(query: Dict) -> Hashable:
+    """
+    This function returns a key to identify upserts for the same object. Values which cannot be hashed are compared by
+    their representation.
+    """
+    try:
+        key = tuple(query.items())
+        hash(key)
+    except TypeError:
+        key = repr(query)
+    return key
@@ -1,20 +1,38 @@
+import asyncio
+import itertools
 import logging
-import re
+import os
 import time
-from typing import List, Dict
+from datetime import timezone
+from functools import partial
+from typing import List, Dict, Hashable, Optional, Tuple
 
+import bson
 import pymongo
+from bson.binary import UUID_SUBTYPE
+from bson.codec_options import CodecOptions
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
 
 from fastiot.core import FastIoTService, Subject
-from fastiot.core.subject_helper import sanitize_pub_subject_name, filter_specific_sign, MSG_FORMAT_VERSION, \
-    WILDCARD_SAME_LEVEL, HIERARCHY
+from fastiot.core.subject_helper import sanitize_pub_subject_name, filter_specific_sign, SubjectMatcher
 from fastiot.core.time import get_time_now
+from fastiot.db.spool import DiskSpool
 from fastiot.env import env_basic, env_mongodb
 from fastiot.msg.custom_db_data_type_conversion import to_mongo_data, from_mongo_data
 from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.util.object_helper import columns_from_dict_list
 from fastiot_core_services.object_storage.config_model import ObjectStorageConfig, SubscriptionConfig
+from fastiot_core_services.object_storage.env import env_object_storage
 from fastiot_core_services.object_storage.mongodb_handler import MongoDBHandler
-from fastiot_core_services.object_storage.object_storage_helper_fn import build_query_dict
+from fastiot_core_services.object_storage.object_storage_helper_fn import build_query_dict, build_upsert, \
+    upsert_key, build_continuation_token, QUERY_SORT, build_projection, build_aggregation_operator, \
+    build_aggregation_pipeline, build_bucket_continuation_token, build_bucket_update, build_bucket_query_pipeline, \
+    build_downsample_pipeline, retention_cutoff
+
+SPOOL_RETRY_INTERVAL = 5.0
+""" Seconds to wait before replaying spooled data again if MongoDB is still not available """
+DUPLICATE_KEY_ERROR = 11000
 
 
 class ObjectStorageService(FastIoTService):
@@ -29,7 +47,51 @@ class ObjectStorageService(FastIoTService):
             time.sleep(10)
             raise RuntimeError
 
+        # Upserts waiting to be written per collection. Upserts for the same object are merged into one entry.
+        self._pending_upserts: Dict[str, Dict[Hashable, Tuple[Dict, Dict]]] = {}
+        self._num_pending_upserts = 0
+        self._upsert_flush_task: Optional[asyncio.Task] = None
+        self._upsert_flush_lock = asyncio.Lock()
+
+        # Routing of received messages and requests to their configuration, compiled once on start
+        self._subscription_matcher: SubjectMatcher[SubscriptionConfig] = SubjectMatcher()
+        self._reply_subject_configs: Dict[str, SubscriptionConfig] = {}
+
+        # Number of documents deleted per collection due to the configured retention
+        self._retention_deleted_documents: Dict[str, int] = {}
+
+        # Writes are spooled on disk while MongoDB is not available and replayed in order afterwards
+        codec_options = CodecOptions(uuid_representation=UUID_SUBTYPE, tz_aware=True, tzinfo=timezone.utc)
+        spool_name = f'object_storage_{self.service_id}' if self.service_id else 'object_storage'
+        self._spool = DiskSpool(os.path.join(env_basic.spool_dir, spool_name),
+                                serializer=partial(bson.encode, codec_options=codec_options),
+                                deserializer=partial(bson.decode, codec_options=codec_options))
+        self._spool_replay_task: Optional[asyncio.Task] = None
+
+        self._create_time_series_collections()
         self._create_index()
+        self._create_retention_indices()
+
+    def _create_time_series_collections(self):
+
+        for subscription_config in self.service_config.subscriptions.values():
+            if subscription_config.enable_overwriting and \
+                    subscription_config.collection in self.service_config.time_series_collections:
+                self._logger.error('Overwriting is not supported for time series collection `%s`. Aborting.',
+                                   subscription_config.collection)
+                raise RuntimeError
+
+        for collection, time_series_config in self.service_config.time_series_collections.items():
+            if time_series_config.bucket_size > 0:
+                index = [('_subject', pymongo.ASCENDING), ('_count', pymongo.ASCENDING)]
+                if time_series_config.meta_field is not None:
+                    index.insert(1, (time_series_config.meta_field, pymongo.ASCENDING))
+                self._mongodb_handler.create_index(collection=self.database[collection], index=index,
+                                                   index_name="fastiot_bucket")
+            elif self._mongodb_handler.create_time_series_collection(database=self.database, name=collection,
+                                                                     meta_field=time_series_config.meta_field,
+                                                                     granularity=time_series_config.granularity):
+                self._logger.info("Created time series collection `%s`", collection)
 
     def _create_index(self):
 
@@ -56,11 +118,51 @@ class ObjectStorageService(FastIoTService):
                 self._mongodb_handler.create_index(collection=self.database[collection],
                                                    index=index, index_name=f"index_{index_nr}")
 
+        if self.service_config.create_default_index:
+            # Time series collections are indexed by MongoDB respectively by the bucket index
+            collections = {c.collection for c in self.service_config.subscriptions.values()
+                           if c.collection not in self.service_config.time_series_collections}
+            for collection in sorted(collections):
+                self._mongodb_handler.create_index(collection=self.database[collection],
+                                                   index=[('_subject', pymongo.ASCENDING),
+                                                          ('_timestamp', pymongo.DESCENDING),
+                                                          ('_id', pymongo.DESCENDING)],
+                                                   index_name="fastiot_subject_timestamp_id")
+                self._mongodb_handler.create_index(collection=self.database[collection],
+                                                   index=[('machine', pymongo.ASCENDING),
+                                                          ('name', pymongo.ASCENDING),
+                                                          ('_timestamp', pymongo.DESCENDING),
+                                                          ('_id', pymongo.DESCENDING)],
+                                                   index_name="fastiot_machine_name_timestamp_id",
+                                                   partialFilterExpression={'machine': {'$exists': True}})
+
+    def _create_retention_indices(self):
+
+        for collection, retention_config in self.service_config.retention.items():
+            if not retention_config.use_ttl_index:
+                continue
+            expire_after_seconds = int(retention_config.max_age.total_seconds())
+            time_series_config = self.service_config.time_series_collections.get(collection)
+            if time_series_config is not None and time_series_config.bucket_size == 0:
+                self._mongodb_handler.set_collection_expiry(self.database, collection, expire_after_seconds)
+            else:
+                # Buckets are removed once their newest document expired
+                field = '_timestamp' if time_series_config is None else '_timestamp_max'
+                self._mongodb_handler.create_ttl_index(self.database[collection], field=field,
+                                                       expire_after_seconds=expire_after_seconds,
+                                                       index_name="fastiot_retention")
+
     async def _start(self):
 
+        if any(not c.use_ttl_index for c in self.service_config.retention.values()):
+            self.run_task(self._retention_task())
+        if not self._spool.empty:
+            self._start_spool_replay()
+
         for subject_name, subscription_config in self.service_config.subscriptions.items():
             subject = Subject(name=sanitize_pub_subject_name(subject_name), msg_cls=dict)
-            await self.broker_connection.subscribe(subject=subject, cb=self._cb_receive_data)
+            self._subscription_matcher.add(subject.name, subscription_config)
+            self._subs.append(await self.broker_connection.subscribe(subject=subject, cb=self._cb_receive_data))
 
             if not subscription_config.reply_subject_name:
                 self._logger.warning("Please set `reply_subject_name` in your configuration.\n"
@@ -69,7 +171,50 @@ class ObjectStorageService(FastIoTService):
 
             subscription_config.reply_subject_name = filter_specific_sign(subscription_config.reply_subject_name)
             reply_subject = HistObjectReq.get_reply_subject(name=subscription_config.reply_subject_name)
-            await self.broker_connection.subscribe_reply_cb(subject=reply_subject, cb=self._cb_reply_hist_object)
+            self._reply_subject_configs.setdefault(reply_subject.name, subscription_config)
+            self._subs.append(await self.broker_connection.subscribe_reply_cb(subject=reply_subject,
+                                                                              cb=self._cb_reply_hist_object))
+
+    async def _stop(self):
+        await self._flush_upserts()
+        if self._spool_replay_task is not None:
+            self._spool_replay_task.cancel()
+            await asyncio.gather(self._spool_replay_task, return_exceptions=True)
+        self._spool.close()
+        self._mongodb_handler.close()
+
+    async def _retention_task(self):
+        while True:
+            try:
+                await self._apply_retention()
+            except ConnectionFailure as exception:
+                self._logger.warning("Applying the retention failed, MongoDB is not available: %s", exception)
+            if await self.wait_for_shutdown(env_object_storage.retention_interval):
+                break
+
+    async def _apply_retention(self):
+
+        for collection_name, retention_config in self.service_config.retention.items():
+            if retention_config.use_ttl_index:
+                continue
+            collection = self.database[collection_name]
+            time_series_config = self.service_config.time_series_collections.get(collection_name)
+            bucket_documents = time_series_config is not None and time_series_config.bucket_size > 0
+            cutoff = retention_cutoff(get_time_now(), retention_config)
+
+            if retention_config.downsample_resolution is not None:
+                target_collection = retention_config.downsample_collection or f"{collection_name}_downsampled"
+                await self._mongodb_handler.aggregate(collection, build_downsample_pipeline(
+                    retention_config, cutoff, target_collection=target_collection, bucket_documents=bucket_documents))
+
+            if bucket_documents:
+                result = await self._mongodb_handler.delete_many(collection, {'_timestamp_max': {'$lt': cutoff}})
+            else:
+                result = await self._mongodb_handler.delete_many(collection, {'_timestamp': {'$lt': cutoff}})
+            deleted_total = self._retention_deleted_documents.get(collection_name, 0) + result.deleted_count
+            self._retention_deleted_documents[collection_name] = deleted_total
+            self._logger.info("Retention deleted %d documents older than %s from collection %s, %d in total",
+                              result.deleted_count, cutoff.isoformat(), collection_name, deleted_total)
 
     async def _cb_receive_data(self, subject_name: str, msg: dict):
 
@@ -84,69 +229,174 @@ class ObjectStorageService(FastIoTService):
         mongo_data = to_mongo_data(timestamp=timestamp, subject_name=subject_name, msg=msg)
         self._logger.debug("Converted Mongo data is %s", mongo_data)
 
-        if not subscription_config.enable_overwriting:
-            self.database[subscription_config.collection].insert_one(mongo_data)
+        time_series_config = self.service_config.time_series_collections.get(subscription_config.collection)
+        if time_series_config is not None and time_series_config.bucket_size > 0:
+            query, update = build_bucket_update(mongo_data, meta_field=time_series_config.meta_field,
+                                                bucket_size=time_series_config.bucket_size)
+            await self._write([{'collection': subscription_config.collection, 'query': query, 'update': update}])
+        elif not subscription_config.enable_overwriting:
+            await self._write([{'collection': subscription_config.collection, 'document': mongo_data}])
         else:
-            # the last overwriting data should be saved (overwriting has to be asynchron)
-            self._overwrite_data(mongo_data, subscription_config)
+            # the last overwriting data should be saved, thus upserts are collected and written in order
+            await self._overwrite_data(mongo_data, subscription_config)
 
     def _find_matching_subject(self, subject_name: str) -> SubscriptionConfig:
-        if len(self.service_config.subscriptions) == 1:  # Quick fix for most tasks
-            return list(self.service_config.subscriptions.values())[0]
-
-        for subscription_name in self.service_config.subscriptions:
-            regex = MSG_FORMAT_VERSION + r'\.'
-            regex += subscription_name.replace('.', r'\.'). \
-                         replace(WILDCARD_SAME_LEVEL, r"[^\.]*"). \
-                         replace(HIERARCHY, r".*") + '$'
-            if re.findall(regex, subject_name):
-                return self.service_config.subscriptions[subscription_name]
+        subscription_config = self._subscription_matcher.match_first(subject_name)
+        if subscription_config is not None:
+            return subscription_config
 
         raise RuntimeError(f"Could not find any configured subject to match the message received via subject "
                            f"`{subject_name}`")
 
-    def _overwrite_data(self, mongo_data, subscription_config: SubscriptionConfig):
+    async def _overwrite_data(self, mongo_data, subscription_config: SubscriptionConfig):
 
-        primary_keys = subscription_config.identify_object_with
-        collection = self.database[subscription_config.collection]
-
-        # generate upsert query
-        query = {}
-        for key_name in primary_keys:
-            query[key_name] = mongo_data[key_name]
-        # generate an update
-        update_fields = [field for field in list(mongo_data.keys()) if field not in primary_keys]
-        update = {'$set': {}}
-        for field in update_fields:
-            update['$set'][field] = mongo_data[field]
-        if env_basic.log_level <= 10:
-            self._logger.debug("Index used by MongoDB: %s", collection.find(query).explain())
-            self._logger.debug('found a document to update' if collection.count_documents(query) > 0
-                               else 'inserting the document')
-
-        collection.update_one(filter=query, update=update, upsert=True)
+        query, update_fields = build_upsert(mongo_data, subscription_config.identify_object_with)
+        pending = self._pending_upserts.setdefault(subscription_config.collection, {})
+        key = upsert_key(query)
+        if key in pending:
+            # Merging the fields is equivalent to applying both updates one after another
+            pending[key][1].update(update_fields)
+        else:
+            pending[key] = (query, update_fields)
+            self._num_pending_upserts += 1
+
+        if self._num_pending_upserts >= env_object_storage.bulk_size:
+            await self._flush_upserts()
+        elif self._upsert_flush_task is None or self._upsert_flush_task.done():
+            # Messages already received are handled before the task runs, so they end up in the same bulk
+            self._upsert_flush_task = asyncio.create_task(self._flush_upserts_task())
+
+    async def _flush_upserts_task(self):
+        try:
+            # Upserts received while writing are not covered by another task, so keep going till nothing is pending
+            while self._num_pending_upserts > 0:
+                await self._flush_upserts()
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            await self.request_shutdown("Writing upserts to MongoDB failed", exception=exception)
+
+    async def _flush_upserts(self):
+        async with self._upsert_flush_lock:
+            pending_upserts = self._pending_upserts
+            self._pending_upserts = {}
+            self._num_pending_upserts = 0
+
+            records = [{'collection': collection_name, 'query': query, 'update': {'$set': update_fields}}
+                       for collection_name, upserts in pending_upserts.items()
+                       for query, update_fields in upserts.values()]
+            if records:
+                await self._write(records)
+
+    async def _write(self, records: List[Dict]):
+        """
+        Writes the records, each either a ``document`` to insert or a ``query`` and ``update`` to upsert into a
+        ``collection``. While MongoDB is not available or older records are not yet replayed, the records are spooled.
+        """
+        if self._spool.empty:
+            try:
+                await self._write_records(records)
+                return
+            except ConnectionFailure as exception:
+                self._logger.warning("Writing to MongoDB failed, spooling data on disk: %s", exception)
+        for record in records:
+            self._spool.append(record)
+        self._start_spool_replay()
+
+    async def _write_records(self, records: List[Dict], replay: bool = False):
+        """
+        Writes consecutive records of a collection with one ordered bulk write. When replaying spooled records, inserts
+        already written before the connection was lost are skipped, otherwise a duplicate key fails the write.
+        """
+        for collection_name, collection_records in itertools.groupby(records, key=lambda r: r['collection']):
+            requests = [InsertOne(record['document']) if 'document' in record else
+                        UpdateOne(filter=record['query'], update=record['update'], upsert=True)
+                        for record in collection_records]
+            while requests:
+                try:
+                    result = await self._mongodb_handler.bulk_write(self.database[collection_name], requests)
+                except BulkWriteError as exception:
+                    error = exception.details['writeErrors'][0]
+                    if not replay or error['code'] != DUPLICATE_KEY_ERROR:
+                        raise
+                    self._logger.warning("Skipped replaying record to collection %s, it was already written: %s",
+                                         collection_name, error.get('errmsg'))
+                    requests = requests[error['index'] + 1:]
+                    continue
+                if env_basic.log_level <= 10:
+                    self._logger.debug("Bulk write to collection %s: %d inserted, %d upserted, %d updated",
+                                       collection_name, result.inserted_count, result.upserted_count,
+                                       result.modified_count)
+                break
+
+    def _start_spool_replay(self):
+        if self._spool_replay_task is None or self._spool_replay_task.done():
+            self._spool_replay_task = asyncio.create_task(self._replay_spool_task())
+
+    async def _replay_spool_task(self):
+        while True:
+            try:
+                replayed = await self._spool.replay(partial(self._write_records, replay=True),
+                                                   batch_size=env_object_storage.bulk_size)
+                self._logger.info("Replayed %d spooled records to MongoDB", replayed)
+                return
+            except ConnectionFailure as exception:
+                self._logger.warning("Replaying spooled data failed, MongoDB is not available: %s", exception)
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                await self.request_shutdown("Replaying spooled data to MongoDB failed", exception=exception)
+                return
+            if await self.wait_for_shutdown(SPOOL_RETRY_INTERVAL):
+                return
 
     async def _cb_reply_hist_object(self, subject: str, hist_object_req: HistObjectReq) -> HistObjectResp:
 
-        sub_config = [c for c in self.service_config.subscriptions.values() if
-                      HistObjectReq.get_reply_subject(c.reply_subject_name).name == subject][0]
+        sub_config = self._reply_subject_configs[subject]
 
         self._logger.debug("Received request on subject %s with message %s", subject, hist_object_req)
-        query_dict = build_query_dict(hist_object_req=hist_object_req)
-        query_results = self._query_db(subscription_config=sub_config,
-                                       query_dict=query_dict, limit_nr=hist_object_req.limit)
+        if hist_object_req.resolution is not None:
+            try:
+                build_aggregation_operator(hist_object_req)
+            except ValueError as exception:
+                return HistObjectResp(error_code=3, error_msg=str(exception), values=[])
+        time_series_config = self.service_config.time_series_collections.get(sub_config.collection)
+        try:
+            query_dict = build_query_dict(hist_object_req=hist_object_req)
+            pipeline = None
+            if time_series_config is not None and time_series_config.bucket_size > 0:
+                pipeline = build_bucket_query_pipeline(hist_object_req, query_dict, time_series_config.meta_field)
+            elif hist_object_req.resolution is not None:
+                pipeline = build_aggregation_pipeline(hist_object_req, query_dict)
+        except ValueError as exception:
+            return HistObjectResp(error_code=2, error_msg=str(exception), values=[])
+
+        collection = self.database[sub_config.collection]
+        if pipeline is not None:
+            query_results = await self._mongodb_handler.aggregate(collection, pipeline)
+        else:
+            query_results = await self._query_db(subscription_config=sub_config, query_dict=query_dict,
+                                                 limit_nr=hist_object_req.limit,
+                                                 projection=build_projection(hist_object_req.fields))
+        continuation_token = None
+        if query_results and hist_object_req.limit and len(query_results) >= hist_object_req.limit:
+            if hist_object_req.resolution is not None:
+                continuation_token = build_bucket_continuation_token(query_results[-1])
+            else:
+                continuation_token = build_continuation_token(query_results[-1])
         values = [from_mongo_data(result) for result in query_results]
-        if values:
-            hist_object_resp = HistObjectResp(values=values)
+        if values and hist_object_req.columnar:
+            hist_object_resp = HistObjectResp(values=[], columns=columns_from_dict_list(values),
+                                              continuation_token=continuation_token)
+        elif values:
+            hist_object_resp = HistObjectResp(values=values, continuation_token=continuation_token)
         else:
             hist_object_resp = HistObjectResp(
                 error_msg='No query results from Mongodb, please check Connection or query',
                 values=values)
         return hist_object_resp
 
-    def _query_db(self, subscription_config: SubscriptionConfig, query_dict: Dict, limit_nr: int) -> List:
+    async def _query_db(self, subscription_config: SubscriptionConfig, query_dict: Dict, limit_nr: int,
+                        projection: Optional[Dict[str, int]] = None) -> List:
         collection = self.database[subscription_config.collection]
-        return list(collection.find(query_dict).limit(limit_nr))
+        return await self._mongodb_handler.find(collection, query_dict, limit=limit_nr, sort=QUERY_SORT,
+                                                projection=projection)
 
 
 if __name__ == '__main__':
@@ -11,7 +11,10 @@ Features included:
  * Running multiple instances with different configurations
  * Different modes (polling & subscriptions)
  * A variety of connection params, e.g. security strings
- * Error handling of opcua connections
+ * Error handling of opcua connections and reconnects, see :envvar:`FASTIOT_OPCUA_RECONNECT_DELAY`
+ * Batched reads in polling mode, see :envvar:`FASTIOT_OPCUA_POLLING_BATCH_SIZE`
+ * Batched publishing of value changes, see :envvar:`FASTIOT_OPCUA_PUBLISH_BATCH_SIZE` and
+   :envvar:`FASTIOT_OPCUA_PUBLISH_LATENCY`
 
 Known limitations:
  * No "auto"-detection of opc-ua nodes supported
@@ -33,7 +36,22 @@ Example CSV, to be stored as :file:`opc_ua_reader_things.csv` in a directory def
    nodeid,thing_name,machine
    ns=2;i=5,a_sensor,sim_machine
 
+The optional columns ``unit``, ``sampling_interval``, ``deadband_type``, ``deadband_value`` and ``queue_size`` configure
+each node, see :class:`fastiot_core_services.opc_ua_reader.extract_thing_metadata.NodeMonitoringSettings`. The deadband
+type is one of ``none``, ``absolute`` or ``percent`` of the EURange of the node. Empty cells use the defaults.
+
+In subscription mode nodes with equal settings share a subscription publishing at their sampling interval, the server
+samples the nodes and applies the deadband. In polling mode absolute deadbands are applied by the reader, the other
+settings are ignored. In polling_always mode every polled value is published and deadbands are ignored. Deadbands a
+mode does not support are logged as a warning.
+
+.. code-block::
+
+   nodeid,thing_name,machine,unit,sampling_interval,deadband_type,deadband_value,queue_size
+   ns=2;i=5,a_sensor,sim_machine,bar,100,absolute,0.5,10
+   ns=2;i=6,b_sensor,sim_machine,,1000,percent,2,
+
 """
 import logging
 
-logging.getLogger('opcua').setLevel(level=logging.ERROR)
+logging.getLogger('asyncua').setLevel(level=logging.ERROR)
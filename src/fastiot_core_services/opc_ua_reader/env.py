@@ -11,6 +11,10 @@ FASTIOT_OPCUA_APPLICATION_URI = 'FASTIOT_OPCUA_APPLICATION_URI'
 FASTIOT_OPCUA_MAX_ALLOWED_DATA_DELAY = 'FASTIOT_OPCUA_MAX_ALLOWED_DATA_DELAY'
 FASTIOT_OPCUA_RETRIEVAL_MODE = 'FASTIOT_OPCUA_RETRIEVAL_MODE'
 FASTIOT_OPCUA_POLLING_DELAY = 'FASTIOT_OPCUA_POLLING_DELAY'
+FASTIOT_OPCUA_POLLING_BATCH_SIZE = 'FASTIOT_OPCUA_POLLING_BATCH_SIZE'
+FASTIOT_OPCUA_RECONNECT_DELAY = 'FASTIOT_OPCUA_RECONNECT_DELAY'
+FASTIOT_OPCUA_PUBLISH_BATCH_SIZE = 'FASTIOT_OPCUA_PUBLISH_BATCH_SIZE'
+FASTIOT_OPCUA_PUBLISH_LATENCY = 'FASTIOT_OPCUA_PUBLISH_LATENCY'
 FASTIOT_OPC_UA_CONFIG_NAME = 'FASTIOT_OPC_UA_CONFIG_NAME'
 FASTIOT_OPC_UA_ERROR_LOGFILE = 'FASTIOT_OPC_UA_ERROR_LOGFILE'
 
@@ -102,6 +106,65 @@ class OPCUAEnv:
             )
         return value
 
+    @property
+    def polling_batch_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_OPCUA_POLLING_BATCH_SIZE
+
+        Number of opcua nodes read with a single read request in polling mode, defaults to 500. Must be positive. Some
+        servers limit the number of nodes per read request, use a smaller value for those.
+        """
+        value = int(os.getenv(FASTIOT_OPCUA_POLLING_BATCH_SIZE, "500"))
+        if value < 1:
+            raise ValueError(
+                'Environment variable "FASTIOT_OPCUA_POLLING_BATCH_SIZE" must be positive.'
+            )
+        return value
+
+    @property
+    def reconnect_delay(self) -> float:
+        """
+        .. envvar:: FASTIOT_OPCUA_RECONNECT_DELAY
+
+        Interval in seconds to check the connection to the OPC-UA Server and to reconnect if it is lost, defaults to
+        5.0. Must be positive.
+        """
+        value = float(os.getenv(FASTIOT_OPCUA_RECONNECT_DELAY, "5.0"))
+        if value <= 0.0:
+            raise ValueError(
+                'Environment variable "FASTIOT_OPCUA_RECONNECT_DELAY" must be positive.'
+            )
+        return value
+
+    @property
+    def publish_batch_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_OPCUA_PUBLISH_BATCH_SIZE
+
+        Maximum number of value changes published to the broker at once, defaults to 1000. Must be positive.
+        """
+        value = int(os.getenv(FASTIOT_OPCUA_PUBLISH_BATCH_SIZE, "1000"))
+        if value < 1:
+            raise ValueError(
+                'Environment variable "FASTIOT_OPCUA_PUBLISH_BATCH_SIZE" must be positive.'
+            )
+        return value
+
+    @property
+    def publish_latency(self) -> float:
+        """
+        .. envvar:: FASTIOT_OPCUA_PUBLISH_LATENCY
+
+        Maximum time in seconds to collect value changes before publishing them, if the batch is not full before,
+        defaults to 0.05. A value of zero publishes all changes collected at once without waiting for more.
+        """
+        value = float(os.getenv(FASTIOT_OPCUA_PUBLISH_LATENCY, "0.05"))
+        if value < 0.0:
+            raise ValueError(
+                'Environment variable "FASTIOT_OPCUA_PUBLISH_LATENCY" is negative which is invalid.'
+            )
+        return value
+
     @property
     def retrieval_mode(self) -> OPCUARetrievalMode:
         """ .. envvar:: FASTIOT_OPCUA_RETRIEVAL_MODE
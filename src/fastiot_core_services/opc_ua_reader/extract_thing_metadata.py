@@ -1,16 +1,62 @@
 from datetime import datetime
-from typing import Dict
+from enum import Enum
+from typing import Dict, NamedTuple, Optional
 
 from fastiot.msg.thing import Thing
 from fastiot.util.csv_reader import CSVReader
 
 
+class DeadbandType(str, Enum):
+    none = 'none'
+    absolute = 'absolute'
+    percent = 'percent'
+
+
+class NodeMonitoringSettings(NamedTuple):
+    """ Settings how a node is monitored, nodes with equal settings share a subscription """
+    sampling_interval: float = 0.0
+    """ Sampling interval in milliseconds, 0 for the fastest rate the server supports """
+    deadband_type: DeadbandType = DeadbandType.none
+    deadband_value: float = 0.0
+    """ Minimum change to publish a value, absolute or in percent of the EURange of the node """
+    queue_size: int = 0
+    """ Number of values queued by the server between publishing, 0 or 1 to only keep the newest """
+
+
+_REQUIRED_FIELDS = ['nodeid', 'machine', 'thing_name']
+_OPTIONAL_FIELDS = ['unit', 'sampling_interval', 'deadband_type', 'deadband_value', 'queue_size']
+
+
+def _is_empty_or_number(cell: str) -> bool:
+    try:
+        return cell == '' or float(cell) >= 0.0
+    except ValueError:
+        return False
+
+
+def _is_empty_or_int(cell: str) -> bool:
+    return cell == '' or cell.isdigit()
+
+
+def _is_empty_or_deadband_type(cell: str) -> bool:
+    return cell == '' or cell in DeadbandType.__members__
+
+
+_CHECKS = {
+    'sampling_interval': _is_empty_or_number,
+    'deadband_type': _is_empty_or_deadband_type,
+    'deadband_value': _is_empty_or_number,
+    'queue_size': _is_empty_or_int
+}
+
+
+def _open_things_csv(file: str) -> CSVReader:
+    return CSVReader(file, required_fields=_REQUIRED_FIELDS, optional_fields=_OPTIONAL_FIELDS, checks=_CHECKS)
+
+
 def extract_thing_metadata_from_csv(file: str) -> Dict[str, Thing]:
     result: Dict[str, Thing] = {}
-    with CSVReader(file,
-                   required_fields=['nodeid', 'machine', 'thing_name'],
-                   optional_fields=['unit']
-                   ) as reader:
+    with _open_things_csv(file) as reader:
         for row in reader:
             thing = Thing(
                 machine=str(row['machine']),
@@ -21,3 +67,26 @@ def extract_thing_metadata_from_csv(file: str) -> Dict[str, Thing]:
             )
             result[row['nodeid']] = thing
     return result
+
+
+def extract_node_settings_from_csv(file: str) -> Dict[str, NodeMonitoringSettings]:
+    """
+    Returns the monitoring settings by node id from the optional columns ``sampling_interval``, ``deadband_type``,
+    ``deadband_value`` and ``queue_size`` of the same file as :func:`extract_thing_metadata_from_csv`. Empty or missing
+    cells use the defaults of :class:`NodeMonitoringSettings`.
+    """
+    result: Dict[str, NodeMonitoringSettings] = {}
+    defaults = NodeMonitoringSettings()
+    with _open_things_csv(file) as reader:
+        for row in reader:
+            result[row['nodeid']] = NodeMonitoringSettings(
+                sampling_interval=_float_or_default(row.get('sampling_interval'), defaults.sampling_interval),
+                deadband_type=DeadbandType(row.get('deadband_type') or defaults.deadband_type),
+                deadband_value=_float_or_default(row.get('deadband_value'), defaults.deadband_value),
+                queue_size=int(row.get('queue_size') or defaults.queue_size)
+            )
+    return result
+
+
+def _float_or_default(cell: Optional[str], default: float) -> float:
+    return float(cell) if cell else default
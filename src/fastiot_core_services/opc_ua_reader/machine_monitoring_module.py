@@ -1,25 +1,55 @@
 import asyncio
 import os
-from typing import Any, Dict
+from datetime import datetime
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
 
-from opcua import Client
+from asyncua import Client, Node, ua
+from asyncua.common.subscription import Subscription
 
-from fastiot.core import FastIoTService, loop
+from fastiot.core import FastIoTService, Subject, loop
 from fastiot.core.time import get_time_now
 from fastiot.msg.thing import Thing
 from fastiot_core_services.opc_ua_reader.env import env_opcua, OPCUARetrievalMode
-from fastiot_core_services.opc_ua_reader.extract_thing_metadata import extract_thing_metadata_from_csv
+from fastiot_core_services.opc_ua_reader.extract_thing_metadata import extract_thing_metadata_from_csv, \
+    extract_node_settings_from_csv, DeadbandType, NodeMonitoringSettings
+
+
+class _ThingChange(NamedTuple):
+    """ Value change of a node, published as copy of the thing configured for the node with value and timestamp """
+    nodeid: str
+    value: Any
+    timestamp: datetime
+
+
+def _is_within_deadband(last_val, new_val, deadband: float) -> bool:
+    try:
+        return abs(new_val - last_val) <= deadband
+    except TypeError:
+        return False
 
 
 class OPCUAReader(FastIoTService):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self._loop = asyncio.get_event_loop()
-        self._thing_queue = asyncio.Queue()
-        self._mainloop_wait_condition = asyncio.Condition()
+        # Changes not published yet, see _mainloop_cb
+        self._changes: List[_ThingChange] = []
+        self._changes_pending_event = asyncio.Event()
+        self._batch_full_event = asyncio.Event()
         self._data_received_event_for_max_allowed_data_delay = asyncio.Event()
+        # Things by node id as in the config, only used as metadata and never changed
         self._things: Dict[str, Thing] = {}
+        self._subjects: Dict[str, Subject] = {}
+        self._last_values: Dict[str, Any] = {}
+        self._publish_batch_size = env_opcua.publish_batch_size
+        self._publish_changes_only = env_opcua.retrieval_mode == OPCUARetrievalMode.polling
+        # Node ids as in the config by node ids received in data change notifications, filled when subscribing
+        self._nodeids: Dict[ua.NodeId, str] = {}
+        self._node_settings: Dict[str, NodeMonitoringSettings] = {}
+        # Absolute deadbands applied by the reader itself when polling, in subscription mode the server applies them
+        self._polling_deadbands: Dict[str, float] = {}
+        self._opcua_client_subscriptions: List[Subscription] = []
         self._load_config()
 
     def _load_config(self):
@@ -35,6 +65,8 @@ class OPCUAReader(FastIoTService):
                                              f'already included')
                     else:
                         self._things[nodeid] = thing
+                        self._subjects[nodeid] = thing.default_subject
+                self._load_node_settings(things_filename)
                 self._logger.info(f'File "{things_filename}" successfully imported.')
             else:
                 self._logger.info(f'File "{things_filename}" does not exist. Skipping import of sensors.')
@@ -42,27 +74,44 @@ class OPCUAReader(FastIoTService):
         else:
             self._logger.warning(f'Config dir "{config_dir}" does not exist')
 
+    def _load_node_settings(self, things_filename: str):
+        for nodeid, settings in extract_node_settings_from_csv(things_filename).items():
+            if nodeid in self._node_settings:
+                continue
+            self._node_settings[nodeid] = settings
+            if self._publish_changes_only and settings.deadband_type is DeadbandType.absolute:
+                self._polling_deadbands[nodeid] = settings.deadband_value
+            elif env_opcua.retrieval_mode is OPCUARetrievalMode.subscription:
+                continue
+            elif settings.deadband_type is DeadbandType.percent:
+                self._logger.warning(f'Percent deadband of nodeid "{nodeid}" is only supported in subscription mode '
+                                     f'and ignored')
+            elif settings.deadband_type is DeadbandType.absolute:
+                self._logger.warning(f'Absolute deadband of nodeid "{nodeid}" is only supported in subscription and '
+                                     f'polling mode and ignored')
+
     async def _start(self):
         if env_opcua.max_allowed_data_delay > 0.0:
             self._logger.info("Opcua max allowed data delay is set.")
         else:
             self._logger.info("Opcua max allowed data delay is not set.")
 
-        self._setup_opcua_client()
+        await self._setup_opcua_client()
 
         if len(self._things) > 0:
             if env_opcua.retrieval_mode is OPCUARetrievalMode.subscription:
-                self._setup_monitoring_subscriptions()
+                await self._setup_monitoring_subscriptions()
             elif env_opcua.retrieval_mode in [OPCUARetrievalMode.polling, OPCUARetrievalMode.polling_always]:
                 self.run_task(self._poll_monitored_node_values())
             else:
                 raise NotImplementedError()
+        self.run_task(self._watch_connection())
 
-    def _setup_opcua_client(self):
+    async def _setup_opcua_client(self):
         self._opcua_client = Client(url=env_opcua.endpoint_url)
 
         if env_opcua.security_string:
-            self._opcua_client.set_security_string(env_opcua.security_string)
+            await self._opcua_client.set_security_string(env_opcua.security_string)
 
         if env_opcua.user:
             self._opcua_client.set_user(env_opcua.user)
@@ -73,51 +122,123 @@ class OPCUAReader(FastIoTService):
         if env_opcua.application_uri:
             self._opcua_client.application_uri = env_opcua.application_uri
 
-        self._opcua_client.connect()
-        self._opcua_client_subscription = None
+        await self._opcua_client.connect()
 
-    def _setup_monitoring_subscriptions(self):
-        opcua_nodes = []
+    async def _setup_monitoring_subscriptions(self):
+        # Nodes with equal settings share a subscription publishing at their sampling interval
+        opcua_nodes_by_settings: Dict[NodeMonitoringSettings, List[Node]] = defaultdict(list)
         for nodeid in self._things.keys():
             opcua_node = self._opcua_client.get_node(nodeid)
-            opcua_nodes.append(opcua_node)
-
-        self._opcua_client_subscription = self._opcua_client.create_subscription(0, self)
-        self._opcua_client_subscription.subscribe_data_change(opcua_nodes)
-
-    def datachange_notification(self, node, val, _):
-        thing = self._things[node.nodeid.to_string()]
-        self._apply_changes_to_thing(thing, val)
+            self._nodeids[opcua_node.nodeid] = nodeid
+            settings = self._node_settings.get(nodeid, NodeMonitoringSettings())
+            opcua_nodes_by_settings[settings].append(opcua_node)
+
+        self._opcua_client_subscriptions = []
+        for settings, opcua_nodes in opcua_nodes_by_settings.items():
+            subscription = await self._opcua_client.create_subscription(settings.sampling_interval, self)
+            self._opcua_client_subscriptions.append(subscription)
+            # pylint: disable=protected-access
+            # Only the private method allows to set the deadband filter and the sampling interval together
+            await subscription._subscribe(opcua_nodes,
+                                          mfilter=self._create_data_change_filter(settings),
+                                          queuesize=settings.queue_size,
+                                          sampling_interval=settings.sampling_interval)
+
+    @staticmethod
+    def _create_data_change_filter(settings: NodeMonitoringSettings) -> Optional[ua.DataChangeFilter]:
+        if settings.deadband_type is DeadbandType.none:
+            return None
+        data_change_filter = ua.DataChangeFilter()
+        data_change_filter.Trigger = ua.DataChangeTrigger.StatusValue
+        data_change_filter.DeadbandType = 1 if settings.deadband_type is DeadbandType.absolute else 2
+        data_change_filter.DeadbandValue = settings.deadband_value
+        return data_change_filter
+
+    def datachange_notification(self, node: Node, val, _):
+        """ Called by the subscription on the event loop of the service """
+        self._apply_change(self._nodeids[node.nodeid], val)
+
+    async def _watch_connection(self):
+        """ Checks the connection to the OPC UA server regularly and reconnects if it is lost """
+        while await self.wait_for_shutdown(env_opcua.reconnect_delay) is False:
+            try:
+                await self._opcua_client.check_connection()
+            except (OSError, asyncio.TimeoutError, ua.UaError) as exception:
+                self._logger.warning('Lost connection to OPC UA server: %s. Reconnecting.', exception)
+                await self._reconnect()
+
+    async def _reconnect(self):
+        try:
+            await self._opcua_client.disconnect()
+        except (OSError, asyncio.TimeoutError, ua.UaError):
+            pass
+        try:
+            await self._opcua_client.connect()
+            if self._opcua_client_subscriptions:
+                await self._setup_monitoring_subscriptions()
+            self._logger.info('Reconnected to OPC UA server.')
+        except (OSError, asyncio.TimeoutError, ua.UaError) as exception:
+            self._logger.warning('Reconnecting to OPC UA server failed: %s', exception)
 
     async def _poll_monitored_node_values(self):
+        # Node handles are resolved once, values are read in batches with one read request each
+        nodeids = list(self._things.keys())
+        nodes = [self._opcua_client.get_node(nodeid) for nodeid in nodeids]
+        batch_size = env_opcua.polling_batch_size
         while env_opcua.polling_delay == 0.0 or await self.wait_for_shutdown(env_opcua.polling_delay) is False:
-            for nodeid, thing in self._things.items():
-                opc_node = self._opcua_client.get_node(nodeid)
-                val = opc_node.get_value()
-                self._apply_changes_to_thing(thing, val)
+            for start in range(0, len(nodes), batch_size):
+                batch = nodes[start:start + batch_size]
+                try:
+                    results = await self._opcua_client.read_attributes(batch, ua.AttributeIds.Value)
+                except (OSError, asyncio.TimeoutError, ua.UaError) as exception:
+                    # Connection errors are handled by _watch_connection, polling is resumed with the next cycle
+                    self._logger.warning('Reading nodes failed: %s', exception)
+                    break
+                for nodeid, result in zip(nodeids[start:start + batch_size], results):
+                    if result.StatusCode.is_good():
+                        self._apply_change(nodeid, result.Value.Value)
+                    else:
+                        self._logger.warning('Reading node "%s" failed: %s', nodeid, result.StatusCode)
 
                 if self._shutdown_event.is_set() is True:
                     # if a large amount of sensors is polled; evaluating shutdown
-                    # after each poll ensures responsiveness in case of shutdown request
+                    # after each batch ensures responsiveness in case of shutdown request
                     break
 
     @loop
     async def _mainloop_cb(self):
-        while self._thing_queue.qsize() > 0:
-            enqueued_thing: Thing = await self._thing_queue.get()
-            self._thing_queue.task_done()
-
-            await self.broker_connection.publish(
-                subject=enqueued_thing.default_subject,
-                msg=enqueued_thing
-            )
-            self._data_received_event_for_max_allowed_data_delay.set()
-
-        async with self._mainloop_wait_condition:
-            await self._mainloop_wait_condition.wait()
-
+        """
+        Publishes the changes in batches of at most :envvar:`FASTIOT_OPCUA_PUBLISH_BATCH_SIZE`. A batch is published
+        once it is full or :envvar:`FASTIOT_OPCUA_PUBLISH_LATENCY` after the first change.
+        """
+        if not self._changes:
+            return self._changes_pending_event.wait()
+
+        batch_size = self._publish_batch_size
+        if len(self._changes) < batch_size and env_opcua.publish_latency > 0.0:
+            try:
+                await asyncio.wait_for(self._batch_full_event.wait(), env_opcua.publish_latency)
+            except asyncio.TimeoutError:
+                pass
+
+        batch = self._changes[:batch_size]
+        del self._changes[:batch_size]
+        if len(self._changes) < batch_size:
+            self._batch_full_event.clear()
+        if not self._changes:
+            self._changes_pending_event.clear()
+
+        await self._publish_changes(batch)
+        self._data_received_event_for_max_allowed_data_delay.set()
         return asyncio.sleep(0)
 
+    async def _publish_changes(self, changes: List[_ThingChange]):
+        await self.broker_connection.publish_many(
+            (self._subjects[change.nodeid],
+             self._things[change.nodeid].copy(update={'value': change.value, 'timestamp': change.timestamp}))
+            for change in changes
+        )
+
     @loop
     async def _check_max_allowed_data_delay_cb(self):
         if not env_opcua.max_allowed_data_delay:
@@ -138,28 +259,27 @@ class OPCUAReader(FastIoTService):
                 f.write(f"{get_time_now()} Receiving no data.\n")
         return asyncio.sleep(0.0)
 
-    def _apply_changes_to_thing(self, thing: Thing, new_val):
-        if env_opcua.retrieval_mode == OPCUARetrievalMode.polling and thing.value == new_val:
-            return
-
-        thing.value = new_val
-        thing.timestamp = get_time_now()
-        self._enqueue_thing(thing=thing)
-
-    def _enqueue_thing(self, thing: Thing):
-        asyncio.run_coroutine_threadsafe(
-            self._put_into_queue(queue=self._thing_queue, msg=thing.copy(deep=True)),
-            self._loop
-        )
-
-    async def _put_into_queue(self, queue: asyncio.Queue, msg: Any):
-        await queue.put(msg)
-        async with self._mainloop_wait_condition:
-            self._mainloop_wait_condition.notify_all()
+    def _apply_change(self, nodeid: str, new_val):
+        if self._publish_changes_only and nodeid in self._last_values:
+            last_val = self._last_values[nodeid]
+            if last_val == new_val:
+                return
+            deadband = self._polling_deadbands.get(nodeid)
+            if deadband is not None and _is_within_deadband(last_val, new_val, deadband):
+                return
+
+        self._last_values[nodeid] = new_val
+        self._changes.append(_ThingChange(nodeid=nodeid, value=new_val, timestamp=get_time_now()))
+        self._changes_pending_event.set()
+        if len(self._changes) >= self._publish_batch_size:
+            self._batch_full_event.set()
 
     async def _stop(self):
         self._data_received_event_for_max_allowed_data_delay.set()
-        self._opcua_client.disconnect()
-
-        async with self._mainloop_wait_condition:
-            self._mainloop_wait_condition.notify_all()
+        self._batch_full_event.set()  # do not let a running main loop wait for the publish latency
+        await self._opcua_client.disconnect()
+        # Changes still queued for a batch would get lost otherwise
+        while self._changes:
+            batch = self._changes[:self._publish_batch_size]
+            del self._changes[:self._publish_batch_size]
+            await self._publish_changes(batch)
@@ -0,0 +1,33 @@
+"""
+Module for continuous rollups of things
+=======================================
+
+This service subscribes to :class:`fastiot.msg.thing.Thing` and maintains rollups with count, sum, min, max, mean and
+last value per machine and sensor for buckets of one minute, one hour and one day, see
+:envvar:`FASTIOT_ROLLUP_RESOLUTIONS`. Long-range trends can be requested from the rollups instead of scanning the raw
+data stored by :mod:`fastiot_core_services.time_series` or :mod:`fastiot_core_services.object_storage`.
+
+Received values are added to the rollups in memory in constant time. Every :envvar:`FASTIOT_ROLLUP_FLUSH_INTERVAL` the
+rollups are merged into the stored ones in the MongoDB collection :envvar:`FASTIOT_ROLLUP_COLLECTION`. Only numeric
+values are rolled up, booleans are counted as 0 and 1.
+
+If you aren't using a docker-compose file generated with your project, you must also set variables defined in
+:class:`fastiot.env.env_mongodb.MongoDBEnv` to connect to the MongoDB.
+
+You can request the rollups with an :class:`fastiot.msg.hist.HistObjectReq` with topic ``rollups``, see
+:envvar:`FASTIOT_ROLLUP_REQUEST_SUBJECT`. The resolution of the request is used as hint to select the coarsest rollup
+not coarser than requested. If it is coarser than all rollups, e.g. one week, the rollups are merged into buckets of the
+requested resolution. The aggregate of the request, ``mean`` by default, is returned as ``value``:
+
+.. code:: python
+
+  request = HistObjectReq(dt_start=dt_start, machine='my_machine', resolution=3600, aggregate='max')
+  response: HistObjectResp = await self.broker_connection.request(
+      subject=HistObjectReq.get_reply_subject(name='rollups'), msg=request)
+  # [{'machine': 'my_machine', 'sensor': 'my_sensor', 'timestamp': ..., 'unit': '', 'value': 42.0, 'count': 3600,
+  #   'sum': ..., 'min': ..., 'max': 42.0, 'mean': ..., 'last': ...}, ...]
+
+Results are sorted by time, sensor and machine and paged with continuation tokens like for the time series service. If
+no data is found, the error code is 1, an invalid continuation token results in 2 and an aggregate not rolled up, e.g.
+``first``, in 3.
+"""
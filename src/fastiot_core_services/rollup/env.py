@@ -0,0 +1,63 @@
+import os
+from typing import List
+
+FASTIOT_ROLLUP_SUBSCRIBE_SUBJECT = "FASTIOT_ROLLUP_SUBSCRIBE_SUBJECT"
+FASTIOT_ROLLUP_REQUEST_SUBJECT = "FASTIOT_ROLLUP_REQUEST_SUBJECT"
+FASTIOT_ROLLUP_RESOLUTIONS = "FASTIOT_ROLLUP_RESOLUTIONS"
+FASTIOT_ROLLUP_FLUSH_INTERVAL = "FASTIOT_ROLLUP_FLUSH_INTERVAL"
+FASTIOT_ROLLUP_COLLECTION = "FASTIOT_ROLLUP_COLLECTION"
+
+
+class RollupConstants:
+
+    @property
+    def subscribe_subject(self) -> str:
+        """
+        .. envvar:: FASTIOT_ROLLUP_SUBSCRIBE_SUBJECT
+
+        Subject below ``Thing`` to roll up, defaults to ``>`` meaning all things. See
+        :envvar:`FASTIOT_TIME_SERIES_SUBSCRIBE_SUBJECT` for details.
+        """
+        return os.environ.get(FASTIOT_ROLLUP_SUBSCRIBE_SUBJECT, ">")
+
+    @property
+    def request_subject(self) -> str:
+        """
+        .. envvar:: FASTIOT_ROLLUP_REQUEST_SUBJECT
+
+        Sets the subject the service will listen on for requests with :class:`fastiot.msg.hist.HistObjectReq`. It
+        defaults to ``rollups``.
+        """
+        return os.environ.get(FASTIOT_ROLLUP_REQUEST_SUBJECT, "rollups")
+
+    @property
+    def resolutions(self) -> List[int]:
+        """
+        .. envvar:: FASTIOT_ROLLUP_RESOLUTIONS
+
+        Comma separated list of resolutions in seconds to roll up, defaults to ``60,3600,86400`` for one minute, one
+        hour and one day.
+        """
+        return sorted(int(resolution) for resolution in
+                      os.environ.get(FASTIOT_ROLLUP_RESOLUTIONS, "60,3600,86400").split(',') if resolution.strip())
+
+    @property
+    def flush_interval(self) -> float:
+        """
+        .. envvar:: FASTIOT_ROLLUP_FLUSH_INTERVAL
+
+        Interval in seconds to merge the rollups kept in memory into the stored ones, defaults to 10.
+        """
+        return float(os.environ.get(FASTIOT_ROLLUP_FLUSH_INTERVAL, 10))
+
+    @property
+    def collection(self) -> str:
+        """
+        .. envvar:: FASTIOT_ROLLUP_COLLECTION
+
+        MongoDB collection to store the rollups in, defaults to ``rollups``.
+        """
+        return os.environ.get(FASTIOT_ROLLUP_COLLECTION, "rollups")
+
+
+rollup_env = RollupConstants()
@@ -0,0 +1,212 @@
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pymongo
+from pymongo import UpdateOne
+
+from fastiot.core.time import ensure_tzinfo
+from fastiot.msg.hist import HistObjectReq
+from fastiot.msg.thing import Thing
+from fastiot.util.continuation_token import decode_continuation_token, encode_continuation_token
+
+ROLLUP_AGGREGATES = ('mean', 'min', 'max', 'sum', 'count', 'last')
+""" Aggregates available for requests, all others of :data:`fastiot.msg.hist.HIST_AGGREGATES` are not rolled up """
+ROLLUP_FIELDS = ('machine', 'sensor', 'timestamp', 'unit', 'count', 'sum', 'min', 'max', 'mean', 'last')
+ROLLUP_INDEX = [('resolution', pymongo.ASCENDING), ('sensor', pymongo.ASCENDING), ('machine', pymongo.ASCENDING),
+                ('timestamp', pymongo.ASCENDING)]
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+RollupKey = Tuple[int, str, str, datetime]
+""" Resolution in seconds, machine, sensor and start of the bucket """
+
+
+class RollupBucket:
+    """ Statistics of the values received for one sensor within one bucket """
+    __slots__ = ('unit', 'count', 'sum', 'min', 'max', 'last', 'last_timestamp')
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last = None
+        self.last_timestamp: Optional[datetime] = None
+
+    def add(self, value: float, timestamp: datetime):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if self.last_timestamp is None or timestamp >= self.last_timestamp:
+            self.last = value
+            self.last_timestamp = timestamp
+
+    def merge(self, other: 'RollupBucket'):
+        """ Merges the statistics of another bucket for the same key """
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.last_timestamp is not None and \
+                (self.last_timestamp is None or other.last_timestamp > self.last_timestamp):
+            self.last = other.last
+            self.last_timestamp = other.last_timestamp
+
+
+class RollupAggregator:
+    """
+    Maintains the rollups of all things received since the last call of :meth:`pop_buckets` in memory. Each value is
+    added to one bucket per resolution in constant time, so the memory used only depends on the number of sensors and
+    the flush interval.
+    """
+
+    def __init__(self, resolutions: Sequence[int]):
+        self._resolutions = sorted(resolutions)
+        self._buckets: Dict[RollupKey, RollupBucket] = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def add(self, thing: Thing) -> bool:
+        """
+        Adds the value of the thing to the rollups. Only numeric values are rolled up, booleans as 0 and 1.
+
+        :returns: False if the value has been skipped
+        """
+        value = thing.value
+        if not isinstance(value, (int, float)) or (isinstance(value, float) and not math.isfinite(value)):
+            return False
+        timestamp = ensure_tzinfo(thing.timestamp)
+        for resolution in self._resolutions:
+            key = (resolution, thing.machine, thing.name, bucket_start(timestamp, resolution))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = RollupBucket(unit=thing.unit)
+            bucket.add(float(value), timestamp)
+        return True
+
+    def pop_buckets(self) -> Dict[RollupKey, RollupBucket]:
+        """ Returns all buckets updated since the last call and starts with empty ones """
+        buckets = self._buckets
+        self._buckets = {}
+        return buckets
+
+    def restore_buckets(self, buckets: Dict[RollupKey, RollupBucket]):
+        """ Merges buckets taken with :meth:`pop_buckets` back, e.g. if writing them failed """
+        for key, bucket in buckets.items():
+            current = self._buckets.get(key)
+            if current is not None:
+                bucket.merge(current)
+            self._buckets[key] = bucket
+
+
+def bucket_start(timestamp: datetime, resolution: int) -> datetime:
+    """ Start of the bucket containing the timestamp, buckets are aligned to the epoch like by InfluxDB and MongoDB """
+    return timestamp - (timestamp - _EPOCH) % timedelta(seconds=resolution)
+
+
+def build_rollup_update(key: RollupKey, bucket: RollupBucket) -> UpdateOne:
+    """
+    Builds the upsert merging the bucket into the stored rollup. The update is an aggregation pipeline, so the mean can
+    be derived from the merged count and sum within the same update.
+    """
+    resolution, machine, sensor, timestamp = key
+    return UpdateOne({'resolution': resolution, 'machine': machine, 'sensor': sensor, 'timestamp': timestamp},
+                     [{'$set': {'unit': {'$literal': bucket.unit},
+                                'count': {'$add': [{'$ifNull': ['$count', 0]}, bucket.count]},
+                                'sum': {'$add': [{'$ifNull': ['$sum', 0]}, bucket.sum]},
+                                'min': {'$min': ['$min', bucket.min]},
+                                'max': {'$max': ['$max', bucket.max]},
+                                'last': {'$cond': [{'$gte': [bucket.last_timestamp,
+                                                             {'$ifNull': ['$last_timestamp', None]}]},
+                                                   bucket.last, '$last']},
+                                'last_timestamp': {'$max': ['$last_timestamp', bucket.last_timestamp]}}},
+                      {'$set': {'mean': {'$divide': ['$sum', '$count']}}}],
+                     upsert=True)
+
+
+def select_resolution(requested: Optional[float], resolutions: Sequence[int]) -> int:
+    """ Selects the coarsest rollup not coarser than the requested resolution, or the finest one if none fits """
+    resolutions = sorted(resolutions)
+    if requested is None:
+        return resolutions[0]
+    fitting = [resolution for resolution in resolutions if resolution <= requested]
+    return fitting[-1] if fitting else resolutions[0]
+
+
+def validate_rollup_aggregate(hist_object_req: HistObjectReq) -> str:
+    """ :raises ValueError: If the aggregate of the request is not rolled up """
+    aggregate = hist_object_req.aggregate or 'mean'
+    if aggregate not in ROLLUP_AGGREGATES:
+        raise ValueError(f"Invalid aggregate `{aggregate}`, must be one of {', '.join(ROLLUP_AGGREGATES)}")
+    return aggregate
+
+
+def build_rollup_query_pipeline(hist_object_req: HistObjectReq, resolution: int) -> List[Dict]:
+    """
+    Builds the aggregation pipeline returning the rollups for the request with the given resolution. If the request
+    asks for a coarser resolution, the rollups are merged into buckets of the requested resolution. Each result contains
+    the statistics of its bucket and the requested aggregate as ``value``, sorted by timestamp, sensor and machine.
+
+    :raises ValueError: If the aggregate or the continuation token is invalid
+    """
+    aggregate = validate_rollup_aggregate(hist_object_req)
+    query_dict: Dict = {'resolution': resolution}
+    if hist_object_req.machine is not None:
+        query_dict['machine'] = hist_object_req.machine
+    if hist_object_req.sensor is not None:
+        query_dict['sensor'] = hist_object_req.sensor
+    timestamp_filter = {}
+    if hist_object_req.dt_start is not None:
+        timestamp_filter['$gte'] = hist_object_req.dt_start
+    if hist_object_req.dt_end is not None:
+        timestamp_filter['$lt'] = hist_object_req.dt_end
+
+    continuation_filter = None
+    if hist_object_req.continuation_token is not None:
+        position = decode_continuation_token(hist_object_req.continuation_token)
+        if not isinstance(position.get('timestamp'), datetime):
+            raise ValueError(f"Invalid continuation token `{hist_object_req.continuation_token}`")
+        timestamp, sensor, machine = position['timestamp'], position.get('sensor'), position.get('machine')
+        timestamp_filter['$gte'] = max(timestamp, ensure_tzinfo(timestamp_filter.get('$gte', timestamp)))
+        continuation_filter = {'$or': [{'timestamp': {'$gt': timestamp}},
+                                       {'timestamp': timestamp, 'sensor': {'$gt': sensor}},
+                                       {'timestamp': timestamp, 'sensor': sensor, 'machine': {'$gt': machine}}]}
+    if timestamp_filter:
+        query_dict['timestamp'] = timestamp_filter
+
+    pipeline = [{'$match': query_dict}]
+    if hist_object_req.resolution is not None and hist_object_req.resolution > resolution:
+        timestamp_ms = {'$toLong': '$timestamp'}
+        resolution_ms = int(hist_object_req.resolution * 1000)
+        bucket = {'$toDate': {'$subtract': [timestamp_ms, {'$mod': [timestamp_ms, resolution_ms]}]}}
+        pipeline += [{'$sort': {'timestamp': pymongo.ASCENDING}},
+                     {'$group': {'_id': {'timestamp': bucket, 'sensor': '$sensor', 'machine': '$machine'},
+                                 'unit': {'$last': '$unit'},
+                                 'count': {'$sum': '$count'},
+                                 'sum': {'$sum': '$sum'},
+                                 'min': {'$min': '$min'},
+                                 'max': {'$max': '$max'},
+                                 'last': {'$last': '$last'}}},
+                     {'$project': {'_id': 0, 'timestamp': '$_id.timestamp', 'sensor': '$_id.sensor',
+                                   'machine': '$_id.machine', 'unit': 1, 'count': 1, 'sum': 1, 'min': 1, 'max': 1,
+                                   'last': 1, 'mean': {'$divide': ['$sum', '$count']}}}]
+    if continuation_filter is not None:
+        pipeline.append({'$match': continuation_filter})
+    pipeline.append({'$sort': {'timestamp': pymongo.ASCENDING, 'sensor': pymongo.ASCENDING,
+                               'machine': pymongo.ASCENDING}})
+    if hist_object_req.limit:
+        pipeline.append({'$limit': hist_object_req.limit})
+    projection = {'_id': 0, 'value': '$' + aggregate}
+    projection.update({field: 1 for field in ROLLUP_FIELDS})
+    pipeline.append({'$project': projection})
+    return pipeline
+
+
+def build_rollup_continuation_token(rollup: Dict) -> str:
+    """ Creates a continuation token pointing behind the given rollup, which must be the last one returned """
+    return encode_continuation_token({'timestamp': rollup['timestamp'], 'sensor': rollup['sensor'],
+                                      'machine': rollup['machine']})
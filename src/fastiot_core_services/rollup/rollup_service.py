@@ -0,0 +1,91 @@
+import asyncio
+
+from pymongo.errors import ConnectionFailure
+
+from fastiot.core import FastIoTService, loop, reply, subscribe
+from fastiot.env import env_mongodb
+from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.msg.thing import Thing
+from fastiot.util.object_helper import columns_from_dict_list
+from fastiot_core_services.object_storage.mongodb_handler import MongoDBHandler
+from fastiot_core_services.rollup.env import rollup_env as env
+from fastiot_core_services.rollup.rollup_helper_fn import RollupAggregator, build_rollup_update, \
+    build_rollup_query_pipeline, build_rollup_continuation_token, select_resolution, validate_rollup_aggregate, \
+    ROLLUP_INDEX
+
+
+class RollupService(FastIoTService):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._resolutions = env.resolutions
+        self._aggregator = RollupAggregator(self._resolutions)
+        self._mongodb_handler = MongoDBHandler()
+        self._collection = self._mongodb_handler.get_database(env_mongodb.name)[env.collection]
+        self._flush_lock = asyncio.Lock()
+        MongoDBHandler.create_index(self._collection, ROLLUP_INDEX, index_name='fastiot_rollup', unique=True)
+
+    async def _stop(self):
+        await self._flush()
+        self._mongodb_handler.close()
+
+    @subscribe(subject=Thing.get_subject(env.subscribe_subject))
+    async def consume(self, msg: Thing):
+        self._aggregator.add(msg)
+
+    @loop
+    async def _flush_loop(self):
+        try:
+            await self._flush()
+        except ConnectionFailure as exception:
+            self._logger.warning("Writing rollups failed, MongoDB is not available: %s", exception)
+        return asyncio.sleep(env.flush_interval)
+
+    async def _flush(self):
+        """ Merges the rollups in memory into the stored ones, they are kept for the next flush if writing fails """
+        async with self._flush_lock:
+            buckets = self._aggregator.pop_buckets()
+            if not buckets:
+                return
+            try:
+                await self._mongodb_handler.bulk_write(self._collection, [build_rollup_update(key, bucket)
+                                                                          for key, bucket in buckets.items()])
+            except BaseException:
+                self._aggregator.restore_buckets(buckets)
+                raise
+            self._logger.debug("%d rollups written", len(buckets))
+
+    @reply(HistObjectReq.get_reply_subject(name=env.request_subject))
+    async def reply(self, request: HistObjectReq):
+        try:
+            validate_rollup_aggregate(request)
+        except ValueError as exception:
+            return HistObjectResp(values=[], error_msg=str(exception), error_code=3)
+        resolution = select_resolution(request.resolution, self._resolutions)
+        try:
+            pipeline = build_rollup_query_pipeline(request, resolution)
+        except ValueError as exception:
+            return HistObjectResp(values=[], error_msg=str(exception), error_code=2)
+
+        try:
+            # Rollups received recently are answered as well
+            await self._flush()
+        except ConnectionFailure as exception:
+            self._logger.warning("Writing rollups failed, MongoDB is not available: %s", exception)
+        values = await self._mongodb_handler.aggregate(self._collection, pipeline)
+        if not values:
+            return HistObjectResp(values=[], error_msg="no data found", error_code=1)
+
+        continuation_token = None
+        if request.limit and len(values) >= request.limit:
+            continuation_token = build_rollup_continuation_token(values[-1])
+        if request.fields:
+            values = [{field: value[field] for field in request.fields if field in value} for value in values]
+        if request.columnar:
+            return HistObjectResp(values=[], columns=columns_from_dict_list(values),
+                                  continuation_token=continuation_token)
+        return HistObjectResp(values=values, continuation_token=continuation_token)
+
+
+if __name__ == '__main__':
+    RollupService.main()
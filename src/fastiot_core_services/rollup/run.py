@@ -0,0 +1,4 @@
+from fastiot_core_services.rollup.rollup_service import RollupService
+
+if __name__ == '__main__':
+    RollupService.main()
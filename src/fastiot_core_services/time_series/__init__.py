@@ -37,4 +37,23 @@ A short example:
   result = parse_object_list(result_dict.values, Thing)  # Parse returned dictionary to List[Thing]
 
 If no data is found, the error code (:attr:`fastiot.msg.hist.HistObjectResp.error_code`) is 1.
+
+Results are sorted by time. If the number of results reaches the limit of the request, the response contains a
+continuation token to request the following results, see :attr:`fastiot.msg.hist.HistObjectReq.continuation_token`.
+With :attr:`fastiot.msg.hist.HistObjectReq.resolution` the values are downsampled by InfluxDB using
+``aggregateWindow``, :attr:`fastiot.msg.hist.HistObjectReq.fields` limits the returned fields. For large results set
+:attr:`fastiot.msg.hist.HistObjectReq.columnar` to receive parallel lists per field in
+:attr:`fastiot.msg.hist.HistObjectResp.columns` instead of one dictionary per value.
+
+Received data is written in batches, see :envvar:`FASTIOT_TIME_SERIES_BATCH_SIZE` and
+:envvar:`FASTIOT_TIME_SERIES_FLUSH_INTERVAL`. Failed writes are retried with an exponential backoff.
+If InfluxDB is not available, received data is spooled on disk in :envvar:`FASTIOT_VOLUME_DIR` using
+:class:`fastiot.db.spool.DiskSpool` and written in batches once InfluxDB is back, see :envvar:`FASTIOT_SPOOL_MAX_SIZE`.
+
+Instead of InfluxDB the data may be stored in TimescaleDB by setting :envvar:`FASTIOT_TIME_SERIES_BACKEND` to
+``timescaledb``, which requires ``fastiot[postgredb]``. On start, the hypertable
+:envvar:`FASTIOT_TIME_SERIES_TIMESCALEDB_TABLE` is created with the columns ``time``, ``machine``, ``name``, ``unit``,
+``value`` for numeric values and ``value_text`` for all other values. Batches are written with ``COPY`` using a pool of
+connections, see :envvar:`FASTIOT_TIME_SCALE_DB_MAX_POOL_SIZE`. Requests are answered the same way, with a resolution
+the values are aggregated with ``time_bucket``. A raw query has to be SQL selecting columns of the hypertable.
 """
@@ -3,6 +3,15 @@ import os
 
 FASTIOT_TIME_SERIES_SUBSCRIBE_SUBJECT = "FASTIOT_TIME_SERIES_SUBSCRIBE_SUBJECT"
 FASTIOT_TIME_SERIES_REQUEST_SUBJECT = "FASTIOT_TIME_SERIES_REQUEST_SUBJECT"
+FASTIOT_TIME_SERIES_BATCH_SIZE = "FASTIOT_TIME_SERIES_BATCH_SIZE"
+FASTIOT_TIME_SERIES_FLUSH_INTERVAL = "FASTIOT_TIME_SERIES_FLUSH_INTERVAL"
+FASTIOT_TIME_SERIES_MAX_IN_FLIGHT_WRITES = "FASTIOT_TIME_SERIES_MAX_IN_FLIGHT_WRITES"
+FASTIOT_TIME_SERIES_WRITE_RETRIES = "FASTIOT_TIME_SERIES_WRITE_RETRIES"
+FASTIOT_TIME_SERIES_BACKEND = "FASTIOT_TIME_SERIES_BACKEND"
+FASTIOT_TIME_SERIES_TIMESCALEDB_TABLE = "FASTIOT_TIME_SERIES_TIMESCALEDB_TABLE"
+
+BACKEND_INFLUXDB = "influxdb"
+BACKEND_TIMESCALEDB = "timescaledb"
 
 
 class TimeSeriesConstants:
@@ -36,5 +45,67 @@ class TimeSeriesConstants:
         """
         return os.environ.get(FASTIOT_TIME_SERIES_REQUEST_SUBJECT, "things")
 
+    @property
+    def batch_size(self) -> int:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_BATCH_SIZE
+
+        Maximum number of points written to InfluxDB at once, defaults to 1000. A batch is written as soon as it is full
+        or :envvar:`FASTIOT_TIME_SERIES_FLUSH_INTERVAL` passed.
+        """
+        return int(os.environ.get(FASTIOT_TIME_SERIES_BATCH_SIZE, 1000))
+
+    @property
+    def flush_interval(self) -> float:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_FLUSH_INTERVAL
+
+        Maximum time in seconds a received point waits to be written to InfluxDB, defaults to 0.1.
+        """
+        return float(os.environ.get(FASTIOT_TIME_SERIES_FLUSH_INTERVAL, 0.1))
+
+    @property
+    def max_in_flight_writes(self) -> int:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_MAX_IN_FLIGHT_WRITES
+
+        Maximum number of batches written to InfluxDB concurrently, defaults to 4. If reached, receiving further points
+        waits for a write to finish.
+        """
+        return int(os.environ.get(FASTIOT_TIME_SERIES_MAX_IN_FLIGHT_WRITES, 4))
+
+    @property
+    def write_retries(self) -> int:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_WRITE_RETRIES
+
+        Number of retries with exponential backoff if writing a batch to InfluxDB fails, defaults to 3. Afterwards, the
+        batch is spooled on disk, see :class:`fastiot.db.spool.DiskSpool`.
+        """
+        return int(os.environ.get(FASTIOT_TIME_SERIES_WRITE_RETRIES, 3))
+
+    @property
+    def backend(self) -> str:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_BACKEND
+
+        Database to store the time series in, ``influxdb`` (default) or ``timescaledb``. For TimescaleDB the variables
+        defined in :class:`fastiot.env.env_timescaledb.TimeScaleDBEnv` are used to connect.
+        """
+        backend = os.environ.get(FASTIOT_TIME_SERIES_BACKEND, BACKEND_INFLUXDB).lower()
+        if backend not in (BACKEND_INFLUXDB, BACKEND_TIMESCALEDB):
+            raise ValueError(f"Invalid time series backend `{backend}`, must be {BACKEND_INFLUXDB} or "
+                             f"{BACKEND_TIMESCALEDB}")
+        return backend
+
+    @property
+    def timescaledb_table(self) -> str:
+        """
+        .. envvar:: FASTIOT_TIME_SERIES_TIMESCALEDB_TABLE
+
+        Name of the hypertable to store things in if using TimescaleDB, defaults to ``things``.
+        """
+        return os.environ.get(FASTIOT_TIME_SERIES_TIMESCALEDB_TABLE, "things")
+
 
 time_series_env = TimeSeriesConstants()
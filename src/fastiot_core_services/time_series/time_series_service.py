@@ -1,73 +1,239 @@
+import asyncio
 import datetime
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from aiohttp import ClientError
 
 from fastiot import logging
 from fastiot.core import FastIoTService, subscribe, reply
+from fastiot.core.time import ensure_tzinfo
+from fastiot.db.influxdb_annotated_csv import columns_from_annotated_csv
 from fastiot.db.influxdb_helper_fn import get_async_influxdb_client_from_env
-from fastiot.env.env import env_influxdb
+from fastiot.db.influxdb_line_protocol import thing_to_line
+from fastiot.db.spool import DiskSpool
+from fastiot.env.env import env_influxdb, env_basic
 
-from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.msg.hist import HistObjectReq, HistObjectResp, HIST_AGGREGATES
 from fastiot.msg.thing import Thing
-from fastiot_core_services.time_series.env import time_series_env as env
+from fastiot.util.continuation_token import encode_continuation_token, decode_continuation_token
+from fastiot.util.object_helper import dict_list_from_columns
+from fastiot_core_services.time_series.env import time_series_env as env, BACKEND_TIMESCALEDB
+from fastiot_core_services.time_series.timescaledb_backend import TimescaleDBBackend, encode_copy_row
+
+SPOOL_RETRY_INTERVAL = 5.0
+""" Seconds to wait before replaying spooled data again if the database is still not available """
+SPOOL_REPLAY_BATCH_SIZE = 5000
+""" Number of spooled points written to the database at once """
+WRITE_PRECISION = 'ms'
+INFLUXDB_UNAVAILABLE_ERRORS = (ClientError, asyncio.TimeoutError, OSError)
+WRITE_RETRY_DELAY = 0.5
+""" Seconds to wait before the first retry of a failed write, doubled with each further retry """
+INFLUXDB_COLUMNS = {"machine": "machine", "sensor": "_measurement", "value": "_value", "unit": "unit",
+                    "timestamp": "_time"}
+""" Columns of the reply by the columns of an InfluxDB result """
 
 
 class TimeSeriesService(FastIoTService):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.msg_counter_ = 0
         self.client = None
+        self._write_api = None
+        self._timescaledb: Optional[TimescaleDBBackend] = None
+        # Points are collected and written in batches, see :envvar:`FASTIOT_TIME_SERIES_BATCH_SIZE`
+        self._batch: List[str] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._write_slots = asyncio.Semaphore(env.max_in_flight_writes)
+        self._write_tasks: Set[asyncio.Task] = set()
+        # Points are spooled on disk while the database is not available and replayed in order afterwards
+        spool_name = f'time_series_{self.service_id}' if self.service_id else 'time_series'
+        if env.backend == BACKEND_TIMESCALEDB:
+            spool_name += '_timescaledb'
+        self._spool = DiskSpool(os.path.join(env_basic.spool_dir, spool_name))
+        self._spool_replay_task: Optional[asyncio.Task] = None
 
     async def _start(self):
-        self.client = await get_async_influxdb_client_from_env()
+        if env.backend == BACKEND_TIMESCALEDB:
+            self._timescaledb = TimescaleDBBackend(table=env.timescaledb_table)
+            await self._timescaledb.start()
+        else:
+            self.client = await get_async_influxdb_client_from_env()
+            self._write_api = self.client.write_api()
+        if not self._spool.empty:
+            self._start_spool_replay()
 
     async def _stop(self):
-        await self.client.close()
+        await self._flush()
+        # Flushes started by the timer add further write tasks while being awaited
+        while self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
+        if self._spool_replay_task is not None:
+            self._spool_replay_task.cancel()
+            await asyncio.gather(self._spool_replay_task, return_exceptions=True)
+        self._spool.close()
+        if self._timescaledb is not None:
+            await self._timescaledb.close()
+        else:
+            await self.client.close()
 
     @subscribe(subject=Thing.get_subject(env.subscribe_subject))
     async def consume(self, msg: Thing):
 
-        data = [{"measurement": str(msg.name),
-                 "tags": {"machine": str(msg.machine),
-                          "unit": str(msg.unit)},
-                 "fields": {"value": msg.value},
-                 "time": msg.timestamp
-                 }]
-        await self.client.write_api().write(bucket=env_influxdb.bucket, org=env_influxdb.organisation,
-                                            record=data, precision='ms')
-        self.msg_counter_ = self.msg_counter_ + 1
-        if self.msg_counter_ >= 10:
-            self.msg_counter_ = 0
-            logging.info("10 datasets written")
+        if self._timescaledb is not None:
+            line = encode_copy_row(msg)
+        else:
+            line = thing_to_line(msg, precision=WRITE_PRECISION)
+        if line is None:
+            return
+        self._batch.append(line)
+        if len(self._batch) >= env.batch_size:
+            await self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(env.flush_interval, self._start_timer_flush)
+
+    def _start_timer_flush(self):
+        # The task is kept until done, so it is not garbage collected and awaited on stop
+        task = asyncio.create_task(self._flush())
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    async def _flush(self):
+        """ Starts writing the collected points, waits if the maximum number of writes is in flight already """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._batch:
+            return
+        batch = self._batch
+        self._batch = []
+        await self._write_slots.acquire()
+        task = asyncio.create_task(self._write_batch(batch))
+        self._write_tasks.add(task)
+        task.add_done_callback(self._write_tasks.discard)
+
+    async def _write_batch(self, batch: List[str]):
+        try:
+            await self._write(batch)
+            logging.debug("%d datasets written", len(batch))
+        except Exception as exception:  # pylint: disable=broad-exception-caught
+            await self.request_shutdown("Writing to the database failed", exception=exception)
+        finally:
+            self._write_slots.release()
+
+    async def _write(self, records: List[str]):
+        """
+        Writes the points or spools them while the database is not available or older points are not yet replayed
+        """
+        if self._spool.empty:
+            for retry in range(env.write_retries + 1):
+                try:
+                    await self._write_records(records)
+                    return
+                except self._unavailable_errors as exception:
+                    if retry == env.write_retries:
+                        logging.warning("Writing to the database failed, spooling data on disk: %s", exception)
+                        break
+                    await asyncio.sleep(WRITE_RETRY_DELAY * 2 ** retry)
+        for record in records:
+            self._spool.append(record)
+        self._start_spool_replay()
+
+    @property
+    def _unavailable_errors(self) -> Tuple:
+        if self._timescaledb is not None:
+            return self._timescaledb.unavailable_errors
+        return INFLUXDB_UNAVAILABLE_ERRORS
+
+    async def _write_records(self, records: List[str]):
+        if self._timescaledb is not None:
+            await self._timescaledb.write(records)
+            return
+        await self._write_api.write(bucket=env_influxdb.bucket, org=env_influxdb.organisation,
+                                    record=records, precision=WRITE_PRECISION)
+
+    def _start_spool_replay(self):
+        if self._spool_replay_task is None or self._spool_replay_task.done():
+            self._spool_replay_task = asyncio.create_task(self._replay_spool_task())
+
+    async def _replay_spool_task(self):
+        while True:
+            try:
+                replayed = await self._spool.replay(self._write_records, batch_size=SPOOL_REPLAY_BATCH_SIZE)
+                logging.info("Replayed %d spooled points to the database", replayed)
+                return
+            except self._unavailable_errors as exception:
+                logging.warning("Replaying spooled data failed, the database is not available: %s", exception)
+            except Exception as exception:  # pylint: disable=broad-exception-caught
+                await self.request_shutdown("Replaying spooled data to the database failed", exception=exception)
+                return
+            if await self.wait_for_shutdown(SPOOL_RETRY_INTERVAL):
+                return
 
     @reply(HistObjectReq.get_reply_subject(name=env.request_subject))
     async def reply(self, request: HistObjectReq):
-        query = await self.generate_query(request)
+        if request.resolution is not None:
+            try:
+                _flux_aggregate(request)
+            except ValueError as exception:
+                return HistObjectResp(values=[], error_msg=str(exception), error_code=3)
+        try:
+            if self._timescaledb is not None:
+                columns = await self._timescaledb.query(request)
+            else:
+                columns = await self._query_influxdb(request)
+        except ValueError as exception:
+            return HistObjectResp(values=[], error_msg=str(exception), error_code=2)
 
-        results: list = []
-        tables = await self.client.query_api().query(query, org=env_influxdb.organisation)
-
-        for table in tables:
-            for row in table:
-                results.append({"machine": row.values.get("machine"),
-                                "sensor": row.get_measurement(),
-                                "value": row.get_value(),
-                                "unit": row.values.get("unit"),
-                                "timestamp": row.get_time(),
-                                })
-        if len(results) > 0:
-            return HistObjectResp(values=results)
+        num_results = len(columns["timestamp"])
+        if num_results > 0:
+            continuation_token = None
+            if request.limit and num_results >= request.limit and not isinstance(request.raw_query, str):
+                continuation_token = encode_continuation_token({'timestamp': columns["timestamp"][-1],
+                                                                'sensor': columns["sensor"][-1],
+                                                                'machine': columns["machine"][-1]})
+            if request.fields:
+                columns = {field: columns[field] for field in request.fields if field in columns}
+            if request.columnar:
+                return HistObjectResp(values=[], columns=columns, continuation_token=continuation_token)
+            return HistObjectResp(values=dict_list_from_columns(columns), continuation_token=continuation_token)
 
         logging.debug("No data found. Returning error code 1.")
-        return HistObjectResp(values=results, error_msg="no data found", error_code=1)
+        return HistObjectResp(values=[], error_msg="no data found", error_code=1)
+
+    async def _query_influxdb(self, request: HistObjectReq) -> Dict[str, List[Any]]:
+        query = await self.generate_query(request)
+        # The raw result is converted column by column, rows are only built if requested
+        csv_text = await self.client.query_api().query_raw(query, org=env_influxdb.organisation)
+        return columns_from_annotated_csv(csv_text, INFLUXDB_COLUMNS)
 
     @staticmethod
     async def generate_query(request: HistObjectReq) -> str:
+        """
+        Creates the flux query for the request. Results are sorted by time, sensor and machine, which allows to continue
+        behind the last result with a continuation token. If a resolution is requested, the values of each sensor are
+        aggregated into windows, whose start is used as timestamp.
+
+        :raises ValueError: If the continuation token, the resolution or the aggregate of the request is invalid
+        """
 
         if request.raw_query and isinstance(request.raw_query, str):
             return request.raw_query
 
+        position = None
+        if request.continuation_token is not None:
+            position = decode_continuation_token(request.continuation_token)
+            if not isinstance(position.get('timestamp'), datetime.datetime):
+                raise ValueError(f"Invalid continuation token `{request.continuation_token}`")
+
         query: str = f'from(bucket: "{env_influxdb.bucket}")'
-        if request.dt_start is not None:
+        if position is not None:
+            # The range starts with the last result, everything before can be skipped
+            query = query + f'|> range(start: {_flux_time(position["timestamp"])}'
+            if request.dt_end is not None:
+                query = query + f', stop: {str(request.dt_end.timestamp()).split(".", maxsplit=1)[0]}'
+            query = query + ')'
+        elif request.dt_start is not None:
             query = query + f'|> range(start: {str(request.dt_start.timestamp()).split(".", maxsplit=1)[0]}'
             if request.dt_end is not None:
                 query = query + f', stop: {str(request.dt_end.timestamp()).split(".", maxsplit=1)[0]}'
@@ -79,12 +245,40 @@ class TimeSeriesService(FastIoTService):
             query = query + f'|> filter(fn: (r) => r["_measurement"] == "{request.sensor}")'
         if request.machine is not None:
             query = query + f'|>filter(fn: (r) => r["machine"] =="{request.machine}")'
-        query = query + f'|> limit(n: {request.limit})' \
-                        '|> group(columns:["time"])' \
-                        '|> sort(columns: ["_time"])'
+        if request.resolution is not None:
+            query = query + f'|> aggregateWindow(every: {int(request.resolution * 1000)}ms, ' \
+                            f'fn: {_flux_aggregate(request)}, timeSrc: "_start", createEmpty: false)'
+        if position is not None:
+            time_str = _flux_time(position["timestamp"])
+            sensor = _flux_string(position.get("sensor"))
+            machine = _flux_string(position.get("machine"))
+            query = query + f'|> filter(fn: (r) => r["_time"] > {time_str} or (r["_time"] == {time_str} and ' \
+                            f'(r["_measurement"] > "{sensor}" or ' \
+                            f'(r["_measurement"] == "{sensor}" and r["machine"] > "{machine}"))))'
+        query = query + '|> group(columns:["time"])' \
+                        '|> sort(columns: ["_time", "_measurement", "machine"])'
+        if request.limit:
+            query = query + f'|> limit(n: {request.limit})'
 
         return query
 
 
+def _flux_time(timestamp: datetime.datetime) -> str:
+    return ensure_tzinfo(timestamp).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _flux_string(value) -> str:
+    return str(value or '').replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _flux_aggregate(request: HistObjectReq) -> str:
+    if request.resolution is None or request.resolution * 1000 < 1:
+        raise ValueError(f"Invalid resolution `{request.resolution}`, must be at least one millisecond")
+    aggregate = request.aggregate or 'mean'
+    if aggregate not in HIST_AGGREGATES:
+        raise ValueError(f"Invalid aggregate `{aggregate}`, must be one of {', '.join(HIST_AGGREGATES)}")
+    return aggregate
+
+
 if __name__ == '__main__':
     TimeSeriesService.main()
@@ -0,0 +1,194 @@
+import asyncio
+import datetime
+import io
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastiot.core.time import ensure_tzinfo
+from fastiot.db.time_scale_helper_fn import AsyncTimescaleDBPool, get_async_timescaledb_pool_from_env
+from fastiot.msg.hist import HistObjectReq
+from fastiot.msg.thing import Thing
+from fastiot.util.continuation_token import decode_continuation_token
+
+TIMESCALEDB_COLUMNS = ('time', 'machine', 'name', 'unit', 'value', 'value_text')
+SQL_AGGREGATES = {'mean': 'avg(value)', 'min': 'min(value)', 'max': 'max(value)', 'sum': 'sum(value)',
+                  'count': 'count(value)', 'first': 'first(value, time)', 'last': 'last(value, time)'}
+""" SQL expressions for :data:`fastiot.msg.hist.HIST_AGGREGATES` """
+
+_ESCAPE_COPY = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+_COPY_NULL = '\\N'
+
+
+class TimescaleDBBackend:
+    """
+    Stores things in a TimescaleDB hypertable with one row per value. Numeric values, including booleans as 0 and 1,
+    are stored in ``value``, all other values as text in ``value_text``.
+
+    Rows are encoded to the text format of ``COPY`` on receiving, so a batch is written with a single ``COPY`` and
+    spooled batches can be stored as plain strings. All statements run on a pool of connections in separate threads,
+    see :class:`fastiot.db.time_scale_helper_fn.AsyncTimescaleDBPool`.
+    """
+
+    def __init__(self, table: str):
+        self._table = table
+        self._pool: Optional[AsyncTimescaleDBPool] = None
+
+    @property
+    def unavailable_errors(self) -> Tuple:
+        """ Exceptions raised while the database is not available """
+        return self._pool.unavailable_errors + (OSError,)
+
+    async def start(self):
+        """ Connects to the database and creates the hypertable if it does not exist yet """
+        self._pool = await asyncio.get_running_loop().run_in_executor(None, get_async_timescaledb_pool_from_env)
+        await self._pool.run(self._execute, build_create_table_statements(self._table))
+
+    async def close(self):
+        if self._pool is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._pool.close)
+
+    async def write(self, rows: List[str]):
+        """ Writes rows created with :func:`encode_copy_row` using ``COPY`` """
+        await self._pool.run(self._copy, rows)
+
+    async def query(self, request: HistObjectReq) -> Dict[str, List[Any]]:
+        """
+        Returns the results for the request as columns ``machine``, ``sensor``, ``value``, ``unit`` and ``timestamp``.
+
+        :raises ValueError: If the continuation token of the request is invalid
+        """
+        if request.raw_query and isinstance(request.raw_query, str):
+            statement, parameters = request.raw_query, []
+        else:
+            statement, parameters = build_query(self._table, request)
+        names, rows = await self._pool.run(self._fetch, statement, parameters)
+        return rows_to_columns(names, rows)
+
+    @staticmethod
+    def _execute(connection, statements: List[str]):
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def _copy(self, connection, rows: List[str]):
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {quote_identifier(self._table)} ({', '.join(TIMESCALEDB_COLUMNS)}) FROM STDIN",
+                               io.StringIO('\n'.join(rows) + '\n'))
+
+    @staticmethod
+    def _fetch(connection, statement: str, parameters: Sequence) -> Tuple[List[str], List[Tuple]]:
+        with connection.cursor() as cursor:
+            cursor.execute(statement, parameters)
+            return [column.name for column in cursor.description], cursor.fetchall()
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def build_create_table_statements(table: str) -> List[str]:
+    """ Statements to create the hypertable and an index to query single sensors, all are skipped if existing """
+    quoted_table = quote_identifier(table)
+    index_name = quote_identifier(f"{table}_name_machine_time_idx")
+    table_literal = "'" + quoted_table.replace("'", "''") + "'"
+    return ["CREATE EXTENSION IF NOT EXISTS timescaledb",
+            f"CREATE TABLE IF NOT EXISTS {quoted_table} (time TIMESTAMPTZ NOT NULL, machine TEXT NOT NULL, "
+            f"name TEXT NOT NULL, unit TEXT, value DOUBLE PRECISION, value_text TEXT)",
+            f"SELECT create_hypertable({table_literal}, 'time', if_not_exists => TRUE)",
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {quoted_table} (name, machine, time DESC)"]
+
+
+def _encode_copy_text(value: Any) -> str:
+    return str(value).translate(_ESCAPE_COPY)
+
+
+def encode_copy_row(thing: Thing) -> Optional[str]:
+    """
+    Encodes the thing as row in the text format of ``COPY`` with the columns :data:`TIMESCALEDB_COLUMNS`. Things
+    without value or with a non-finite float are skipped by returning None like for InfluxDB.
+    """
+    value = thing.value
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        return None
+    if isinstance(value, (int, float)):
+        numeric_value, text_value = repr(float(value)), _COPY_NULL
+    else:
+        numeric_value, text_value = _COPY_NULL, _encode_copy_text(value)
+    return '\t'.join((ensure_tzinfo(thing.timestamp).isoformat(), _encode_copy_text(thing.machine),
+                      _encode_copy_text(thing.name), _encode_copy_text(thing.unit), numeric_value, text_value))
+
+
+def build_query(table: str, request: HistObjectReq) -> Tuple[str, List[Any]]:
+    """
+    Creates the SQL statement and its parameters for the request. Results are sorted by time, sensor and machine, which
+    allows to continue behind the last result with a continuation token. If a resolution is requested, the values of
+    each sensor are aggregated into buckets using ``time_bucket``, whose start is used as timestamp.
+
+    The aggregate has to be validated before.
+
+    :raises ValueError: If the continuation token of the request is invalid
+    """
+    position = None
+    if request.continuation_token is not None:
+        position = decode_continuation_token(request.continuation_token)
+        if not isinstance(position.get('timestamp'), datetime.datetime):
+            raise ValueError(f"Invalid continuation token `{request.continuation_token}`")
+
+    conditions, parameters = [], []
+    if position is not None:
+        # Everything before the last result can be skipped
+        conditions.append("time >= %s")
+        parameters.append(position['timestamp'])
+    elif request.dt_start is not None:
+        conditions.append("time >= %s")
+        parameters.append(request.dt_start)
+    else:
+        conditions.append("time >= %s")
+        parameters.append(datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=30))
+    if request.dt_end is not None:
+        conditions.append("time < %s")
+        parameters.append(request.dt_end)
+    if request.sensor is not None:
+        conditions.append("name = %s")
+        parameters.append(request.sensor)
+    if request.machine is not None:
+        conditions.append("machine = %s")
+        parameters.append(request.machine)
+
+    quoted_table = quote_identifier(table)
+    if request.resolution is None:
+        statement = f"SELECT time, machine, name, unit, value, value_text FROM {quoted_table} " \
+                    f"WHERE {' AND '.join(conditions)}"
+    else:
+        aggregate = SQL_AGGREGATES[request.aggregate or 'mean']
+        statement = f"SELECT time_bucket(make_interval(secs => %s), time) AS time, machine, name, unit, " \
+                    f"{aggregate} AS value, NULL AS value_text FROM {quoted_table} " \
+                    f"WHERE {' AND '.join(conditions)} AND value IS NOT NULL GROUP BY 1, machine, name, unit"
+        parameters.insert(0, request.resolution)
+        statement = f"SELECT * FROM ({statement}) AS buckets"
+
+    if position is not None:
+        keyset = "(time, name, machine) > (%s, %s, %s)"
+        statement += (" AND " if request.resolution is None else " WHERE ") + keyset
+        parameters.extend([position['timestamp'], position.get('sensor') or '', position.get('machine') or ''])
+    statement += " ORDER BY time, name, machine"
+    if request.limit:
+        statement += " LIMIT %s"
+        parameters.append(request.limit)
+    return statement, parameters
+
+
+def rows_to_columns(names: List[str], rows: List[Tuple]) -> Dict[str, List[Any]]:
+    """ Converts rows with the columns :data:`TIMESCALEDB_COLUMNS` to the columns returned by the service """
+    indices = {name: names.index(name) for name in TIMESCALEDB_COLUMNS if name in names}
+    columns = {"machine": [], "sensor": [], "value": [], "unit": [], "timestamp": []}
+    for column, name in (("machine", "machine"), ("sensor", "name"), ("unit", "unit"), ("timestamp", "time")):
+        index = indices.get(name)
+        columns[column] = [row[index] for row in rows] if index is not None else [None] * len(rows)
+    value_index, text_index = indices.get('value'), indices.get('value_text')
+    for row in rows:
+        value = row[value_index] if value_index is not None else None
+        if value is None and text_index is not None:
+            value = row[text_index]
+        columns["value"].append(value)
+    return columns
@@ -47,6 +47,16 @@ class TestPublishSubscribe(unittest.IsolatedAsyncioTestCase):
         await self.broker_connection.publish(subject, THING)
         await subscription.unsubscribe()
 
+    async def test_publish_many(self):
+        msg_queue = asyncio.Queue()
+        subscription = await self.broker_connection.subscribe_msg_queue(subject=Thing.get_subject(name='test_many'),
+                                                                         msg_queue=msg_queue)
+        things = [THING.copy(update={'name': 'test_many', 'value': i}) for i in range(10)]
+        await self.broker_connection.publish_many((thing.default_subject, thing) for thing in things)
+        for thing in things:
+            self.assertEqual(thing, await asyncio.wait_for(msg_queue.get(), timeout=1))
+        await subscription.unsubscribe()
+
     async def test_request(self):
         request = THING
         subject = ReplySubject(name="ping", msg_cls=Thing, reply_cls=Thing)
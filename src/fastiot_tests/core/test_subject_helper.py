@@ -1,6 +1,6 @@
 import unittest
 
-from fastiot.core.subject_helper import sanitize_pub_subject_name
+from fastiot.core.subject_helper import sanitize_pub_subject_name, SubjectMatcher
 
 
 class TestSubjectHelper(unittest.TestCase):
@@ -70,6 +70,32 @@ class TestSubjectHelper(unittest.TestCase):
         subject_name = sanitize_pub_subject_name(test_subject_name)
         self.assertEqual('v1.>', subject_name)
 
+    def test_subject_matcher(self):
+        matcher = SubjectMatcher()
+        matcher.add('v1.thing.one.*', 'one')
+        matcher.add('v1.thing.two', 'two')
+        matcher.add('v1.thing.three.>', 'three')
+        matcher.add('v1.thing.*', 'all_things')
+
+        self.assertListEqual(['one'], matcher.match('v1.thing.one.sensor'))
+        self.assertListEqual(['two', 'all_things'], matcher.match('v1.thing.two'))
+        self.assertListEqual(['three'], matcher.match('v1.thing.three.a.little.deeper'))
+        self.assertListEqual(['all_things'], matcher.match('v1.thing.three'))
+        self.assertListEqual([], matcher.match('v1.other_thing.two'))
+        self.assertListEqual(['all_things'], matcher.match('v1.thing.one'))
+        self.assertListEqual([], matcher.match('v1.thing'))
+
+        self.assertEqual('two', matcher.match_first('v1.thing.two'))
+        self.assertIsNone(matcher.match_first('v1.other_thing'))
+
+        # Adding a pattern has to invalidate cached results
+        matcher.add('v1.>', 'everything')
+        self.assertListEqual(['all_things', 'everything'], matcher.match('v1.thing.three'))
+
+    def test_subject_matcher_invalid_pattern(self):
+        with self.assertRaises(ValueError):
+            SubjectMatcher().add('v1.>.thing', 'invalid')
+
 
 if __name__ == '__main__':
     unittest.main()
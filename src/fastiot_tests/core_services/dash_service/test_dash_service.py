@@ -1,9 +1,14 @@
 import asyncio
+import logging
 import os
 import unittest
 from datetime import datetime, timedelta, timezone
+from functools import partial
+from types import SimpleNamespace
 from typing import List
 
+import dash
+
 from fastiot.core.broker_connection import NatsBrokerConnection
 from fastiot.core.time import get_time_now
 from fastiot.db.influxdb_helper_fn import get_new_async_influx_client_from_env
@@ -13,8 +18,12 @@ from fastiot.env.env import env_influxdb
 from fastiot.msg import Thing
 from fastiot.msg.custom_db_data_type_conversion import to_mongo_data
 from fastiot.testlib import populate_test_env
+from fastiot_core_services.dash.dash_module import DashModule, GraphCallbacks
+from fastiot_core_services.dash.historic_cache import HistoricDataCache
 from fastiot_core_services.dash.model.historic_sensor import ThingSeries, HistoricSensor
-from fastiot_core_services.dash.utils import thing_series_from_mongodb_data_set, thing_series_to_mongodb_data_set
+from fastiot_core_services.dash.model.live_sensor import LiveSensor
+from fastiot_core_services.dash.utils import thing_series_from_mongodb_data_set, thing_series_to_mongodb_data_set, \
+    thing_series_from_mongodb_cursor
 
 
 class TestThingSeries(unittest.IsolatedAsyncioTestCase):
@@ -133,5 +142,88 @@ class TestThingSeries(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(len(tables[0].records), 5)
 
 
+class TestColumnarThingSeries(unittest.TestCase):
+
+    def test_from_cursor(self):
+        documents = [{'timestamp': datetime(year=2022, month=10, day=1, second=i), 'value': i} for i in range(10)]
+        thing_series = thing_series_from_mongodb_cursor(iter(documents), machine="test_machine", name="my_sensor")
+        self.assertEqual(10, len(thing_series))
+        self.assertEqual(datetime(year=2022, month=10, day=1, second=9, tzinfo=timezone.utc), thing_series.dt_end)
+
+        thing_series.remove_until(datetime(year=2022, month=10, day=1, second=2))
+        thing_series.remove_from(datetime(year=2022, month=10, day=1, second=8))
+        self.assertListEqual([3, 4, 5, 6, 7], thing_series.values.tolist())
+        self.assertEqual(Thing(machine="test_machine", name="my_sensor", value=3, measurement_id="1",
+                               timestamp=datetime(year=2022, month=10, day=1, second=3, tzinfo=timezone.utc)),
+                         thing_series.thing_list[0].copy(update={'measurement_id': "1"}))
+
+        historic_sensor = HistoricSensor("my_sensor", "test_machine", "producer", "producer")
+        historic_sensor.historic_sensor_data = thing_series
+        self.assertListEqual([3, 4, 5, 6, 7], HistoricSensor.to_df([historic_sensor])["my_sensor"].tolist())
+
+
+class TestLiveSensor(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        live_sensor = LiveSensor("my_sensor", "test_machine", "customer", "producer", capacity=4)
+        dt_start = datetime(year=2022, month=10, day=1, tzinfo=timezone.utc)
+        for i in range(6):
+            live_sensor.append(dt_start + timedelta(seconds=i), i)
+        self.assertEqual(4, len(live_sensor))
+        self.assertListEqual([2.0, 3.0, 4.0, 5.0], live_sensor.values.tolist())
+        self.assertEqual(live_sensor.timestamps[0], datetime(year=2022, month=10, day=1, second=2))
+
+        live_sensor.clean_until(dt_start + timedelta(seconds=5), max_delta=1.5)
+        self.assertListEqual([4.0, 5.0], live_sensor.values.tolist())
+        live_sensor.append(dt_start + timedelta(seconds=6), 'invalid')
+        timestamps, values = live_sensor.window(1)
+        self.assertEqual(2, len(timestamps))
+        self.assertEqual(5.0, values[0])
+
+    def test_since(self):
+        live_sensor = LiveSensor("my_sensor", "test_machine", "customer", "producer", capacity=4)
+        dt_start = datetime(year=2022, month=10, day=1, tzinfo=timezone.utc)
+        live_sensor.append(dt_start, 0)
+        self.assertListEqual([0.0], live_sensor.since(None, max_delta=10)[1].tolist())
+        cursor = live_sensor.appended
+        self.assertEqual(0, len(live_sensor.since(cursor, max_delta=10)[1]))
+        for i in range(1, 7):
+            live_sensor.append(dt_start + timedelta(seconds=i), i)
+        # Values overwritten in between are skipped
+        self.assertListEqual([3.0, 4.0, 5.0, 6.0], live_sensor.since(cursor, max_delta=10)[1].tolist())
+        self.assertListEqual([6.0], live_sensor.since(live_sensor.appended - 1, max_delta=10)[1].tolist())
+
+    def test_live_graph_window(self):
+        live_sensor = LiveSensor("my_sensor", "test_machine", "customer", "producer", capacity=100)
+        module = SimpleNamespace(live_sensors={("test_machine", "my_sensor"): live_sensor})
+        module.update_graph = partial(DashModule.update_graph, module)
+        callbacks = GraphCallbacks(module=module, dashboard={
+            "time_shown": 10, "sensors": [{"machine": "test_machine", "name": "my_sensor"}]})
+        dt_start = datetime(year=2022, month=10, day=1, tzinfo=timezone.utc)
+        for i in range(5):
+            live_sensor.append(dt_start + timedelta(seconds=i), i)
+        (extend_data, _, max_points), cursors = callbacks.update_graph('start', 0, None)
+        self.assertEqual(5, len(extend_data['y'][0]))
+        self.assertListEqual([5], max_points['y'])
+
+        # A slow sensor: points older than time_shown are dropped by the client although the buffer is not full
+        live_sensor.append(dt_start + timedelta(seconds=30), 30)
+        (extend_data, _, max_points), cursors = callbacks.update_graph('start', 1, cursors)
+        self.assertListEqual([30.0], extend_data['y'][0].tolist())
+        self.assertListEqual([1], max_points['y'])
+        self.assertEqual(dash.no_update, callbacks.update_graph('start', 2, cursors)[0])
+
+
+class TestExcelDownload(unittest.TestCase):
+
+    def test_count_without_mongodb(self):
+        # MongoDB was not available at setup, so the collection is None
+        module = SimpleNamespace(_historic_sensor_keys=lambda: [('mongodb', 'test_machine', 'my_sensor')],
+                                 _historic_cache=HistoricDataCache(max_entries=1, open_range_ttl=0.0),
+                                 _mongo_collection=None, _logger=logging.getLogger())
+        dt_start = datetime(year=2022, month=10, day=1, tzinfo=timezone.utc)
+        self.assertEqual(0, DashModule._count_historic_values(module, dt_start, dt_start + timedelta(days=1)))
+
+
 if __name__ == '__main__':
     unittest.main()
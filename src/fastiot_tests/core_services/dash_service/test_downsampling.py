@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from fastiot_core_services.dash.downsampling import lttb, min_max, downsample
+
+
+class TestDownsampling(unittest.TestCase):
+
+    def setUp(self):
+        self.timestamps = np.datetime64('2022-10-01T00:00:00', 'us') + np.arange(10000) * np.timedelta64(1, 's')
+        self.values = np.sin(np.arange(10000) / 100)
+        self.values[4321] = 5.0
+
+    def test_lttb(self):
+        x = np.arange(10000, dtype=np.float64)
+        indices = lttb(x, self.values, 100)
+        self.assertEqual(100, len(indices))
+        self.assertEqual(0, indices[0])
+        self.assertEqual(9999, indices[-1])
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertIn(4321, indices)
+        self.assertEqual(10, len(lttb(x[:10], self.values[:10], 100)))
+
+    def test_min_max(self):
+        indices = min_max(self.values, 100)
+        self.assertLessEqual(len(indices), 100)
+        self.assertIn(4321, indices)
+        self.assertIn(int(np.argmin(self.values)), indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_downsample(self):
+        values = self.values.copy()
+        values[10] = np.nan
+        timestamps, values = downsample(self.timestamps, values, max_points=500)
+        self.assertEqual(500, len(timestamps))
+        self.assertFalse(np.isnan(values).any())
+
+        timestamps, values = downsample(self.timestamps, self.values, max_points=500, method='none')
+        self.assertEqual(10000, len(timestamps))
+
+        timestamps, values = downsample(self.timestamps[:3], ['a', 'b', 'c'], max_points=2)
+        self.assertListEqual(['a', 'b', 'c'], values)
+
+        with self.assertRaises(ValueError):
+            downsample(self.timestamps, self.values, max_points=500, method='unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
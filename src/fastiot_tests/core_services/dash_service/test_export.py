@@ -0,0 +1,43 @@
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from fastiot_core_services.dash.export import ExportChunk, export_chunks, EXPORT_CSV, EXPORT_PARQUET
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        timestamps = np.datetime64('2022-10-01T00:00:00', 'us') + np.arange(10) * np.timedelta64(1, 's')
+        self.chunks = [ExportChunk('machine', 'sensor_1', timestamps[:5], np.arange(5.0)),
+                       ExportChunk('machine', 'sensor_1', timestamps[5:], np.arange(5.0, 10.0)),
+                       ExportChunk('machine', 'sensor_2', timestamps[:0], np.arange(0.0)),
+                       ExportChunk('machine', 'sensor_3', timestamps[:2], np.array(['on', 3], dtype=object))]
+
+    def test_csv(self):
+        parts = list(export_chunks(iter(self.chunks), EXPORT_CSV))
+        self.assertEqual(4, len(parts))
+        df = pd.read_csv(io.BytesIO(b''.join(parts)))
+        self.assertListEqual(['machine', 'name', 'timestamp', 'value'], list(df.columns))
+        self.assertEqual(12, len(df))
+        self.assertEqual('2022-10-01T00:00:01.000000Z', df['timestamp'][1])
+        self.assertEqual('on', df['value'][10])
+
+    def test_parquet(self):
+        parts = list(export_chunks(iter(self.chunks), EXPORT_PARQUET))
+        df = pd.read_parquet(io.BytesIO(b''.join(parts)))
+        self.assertEqual(12, len(df))
+        self.assertEqual(9.0, df['value'][9])
+        self.assertTrue(np.isnan(df['value'][10]))
+        self.assertEqual(3.0, df['value'][11])
+        self.assertEqual(pd.Timestamp('2022-10-01T00:00:01', tz='UTC'), df['timestamp'][1])
+
+    def test_invalid_format(self):
+        with self.assertRaises(ValueError):
+            export_chunks(iter(self.chunks), 'xls')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from fastiot_core_services.dash.historic_cache import HistoricDataCache
+from fastiot_core_services.dash.model.historic_sensor import ThingSeries
+
+START = datetime(year=2022, month=10, day=1, tzinfo=timezone.utc)
+
+
+def _series(start: datetime, seconds: int) -> ThingSeries:
+    timestamps = np.datetime64(start.replace(tzinfo=None), 'us') + np.arange(seconds) * np.timedelta64(1, 's')
+    return ThingSeries(dt_start=start, dt_end=start + timedelta(seconds=seconds), timestamps=timestamps,
+                       values=np.arange(seconds, dtype=np.float64), machine='machine', name='sensor')
+
+
+class TestHistoricDataCache(unittest.TestCase):
+
+    def test_covering_range(self):
+        cache = HistoricDataCache(max_entries=2, open_range_ttl=60)
+        end = START + timedelta(seconds=100)
+        cache.put('sensor', START, end, _series(START, 100))
+
+        series = cache.get('sensor', START + timedelta(seconds=10), START + timedelta(seconds=19))
+        self.assertEqual(10, len(series))
+        self.assertEqual(10.0, series.values[0])
+        self.assertIsNone(cache.get('sensor', START, end + timedelta(seconds=1)))
+        self.assertIsNone(cache.get('other', START, end))
+
+    def test_eviction(self):
+        cache = HistoricDataCache(max_entries=2, open_range_ttl=60)
+        for i in range(3):
+            cache.put(f'sensor_{i}', START, START + timedelta(seconds=10), _series(START, 10))
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('sensor_0', START, START))
+
+    def test_open_range(self):
+        cache = HistoricDataCache(max_entries=2, open_range_ttl=0)
+        now = datetime.now(tz=timezone.utc)
+        cache.put('sensor', now - timedelta(seconds=10), now + timedelta(seconds=10), _series(now, 10))
+        self.assertIsNone(cache.get('sensor', now, now))
+        self.assertEqual(0, len(cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
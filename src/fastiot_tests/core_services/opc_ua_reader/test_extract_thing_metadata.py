@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from fastiot.exceptions import CSVError
+from fastiot_core_services.opc_ua_reader.extract_thing_metadata import extract_thing_metadata_from_csv, \
+    extract_node_settings_from_csv, DeadbandType, NodeMonitoringSettings
+
+THINGS_FILENAME = os.path.join(os.path.dirname(__file__), 'config_node_settings', 'opc_ua_reader_things.csv')
+
+
+class TestExtractThingMetadata(unittest.TestCase):
+
+    def test_things(self):
+        things = extract_thing_metadata_from_csv(THINGS_FILENAME)
+        self.assertListEqual(['ns=2;i=5', 'ns=2;i=6', 'ns=2;i=7'], list(things.keys()))
+        self.assertEqual('a_sensor', things['ns=2;i=5'].name)
+        self.assertEqual('mm', things['ns=2;i=5'].unit)
+
+    def test_node_settings(self):
+        settings = extract_node_settings_from_csv(THINGS_FILENAME)
+        self.assertEqual(NodeMonitoringSettings(sampling_interval=100.0, deadband_type=DeadbandType.absolute,
+                                                deadband_value=0.5, queue_size=10), settings['ns=2;i=5'])
+        self.assertEqual(NodeMonitoringSettings(deadband_type=DeadbandType.percent, deadband_value=2.0),
+                         settings['ns=2;i=6'])
+        self.assertEqual(NodeMonitoringSettings(), settings['ns=2;i=7'])
+
+    def test_invalid_settings(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, 'opc_ua_reader_things.csv')
+            with open(filename, 'w') as f:
+                f.write('nodeid,thing_name,machine,deadband_type\nns=2;i=5,a_sensor,sim_machine,relative\n')
+            with self.assertRaises(CSVError):
+                extract_node_settings_from_csv(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
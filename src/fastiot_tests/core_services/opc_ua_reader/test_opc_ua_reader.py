@@ -3,9 +3,10 @@ import os
 import tempfile
 import threading
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 
-from opcua import Client, Server
+from asyncua import Client
+from opcua import Server
 
 from fastiot.core.broker_connection import NatsBrokerConnection
 from fastiot.core.core_uuid import get_uuid
@@ -165,7 +166,7 @@ class TestMachineMonitoring(unittest.IsolatedAsyncioTestCase):
             "/path/to/certificate/test_certificate.der," \
             "/path/to/key/test_key.pem"
         os.environ[FASTIOT_OPCUA_SECURITY_STRING] = a_security_string
-        with patch.object(Client, 'set_security_string', new_callable=Mock) as mock:
+        with patch.object(Client, 'set_security_string', new_callable=AsyncMock) as mock:
             async with OPCUAReader(broker_connection=self.broker_connection):
                 pass
 
@@ -176,7 +177,7 @@ class TestMachineMonitoring(unittest.IsolatedAsyncioTestCase):
         del os.environ[FASTIOT_OPCUA_SECURITY_STRING]
 
     async def test_no_security_string(self):
-        with patch.object(Client, 'set_security_string', new_callable=Mock) as mock:
+        with patch.object(Client, 'set_security_string', new_callable=AsyncMock) as mock:
             async with OPCUAReader(broker_connection=self.broker_connection):
                 pass
             self.assertEqual(0, mock.call_count)
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+
+from fastiot.core.broker_connection import NatsBrokerConnection
+from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.msg.thing import Thing
+from fastiot.testlib import populate_test_env
+from fastiot.util.object_helper import parse_object_list
+from fastiot_core_services.last_value.env import last_value_env
+from fastiot_core_services.last_value.last_value_cache import LastValueCache
+from fastiot_core_services.last_value.last_value_service import LastValueService
+
+TIMESTAMP = datetime(year=2019, month=7, day=25, hour=21, tzinfo=timezone.utc)
+
+
+class TestLastValue(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        populate_test_env()
+        self.broker_connection = await NatsBrokerConnection.connect()
+        service = LastValueService(broker_connection=self.broker_connection)
+        self.service_task = asyncio.create_task(service.run())
+        await asyncio.sleep(0.005)
+
+    async def asyncTearDown(self):
+        self.service_task.cancel()
+
+    async def _request(self, request: HistObjectReq) -> HistObjectResp:
+        return await self.broker_connection.request(
+            subject=HistObjectReq.get_reply_subject(name=last_value_env.request_subject), msg=request, timeout=10)
+
+    async def test_snapshot(self):
+        for i in range(10):
+            thing = Thing(machine=f'test_machine_{i % 2}', name=f'sensor_{i % 3}', value=i,
+                          timestamp=TIMESTAMP.replace(second=i))
+            await self.broker_connection.publish(Thing.get_subject(thing.name), thing)
+        await asyncio.sleep(0.1)
+
+        response = await self._request(HistObjectReq(machine='test_machine_0', limit=None))
+        things = parse_object_list(response.values, Thing)
+        self.assertListEqual(['sensor_0', 'sensor_1', 'sensor_2'], [thing.name for thing in things])
+        self.assertListEqual([6, 4, 8], [thing.value for thing in things])
+
+        response = await self._request(HistObjectReq(machine='test_machine_*', sensor='sensor_1', limit=1))
+        self.assertEqual('test_machine_0', response.values[0]['machine'])
+        response = await self._request(HistObjectReq(machine='test_machine_*', sensor='sensor_1', limit=1,
+                                                     continuation_token=response.continuation_token))
+        self.assertEqual('test_machine_1', response.values[0]['machine'])
+        self.assertEqual(7, response.values[0]['value'])
+
+        response = await self._request(HistObjectReq(machine='unknown_machine'))
+        self.assertEqual(1, response.error_code)
+
+
+class TestLastValueCache(unittest.TestCase):
+
+    def test_update(self):
+        cache = LastValueCache()
+        self.assertTrue(cache.update(Thing(machine='machine', name='sensor', value=1, timestamp=TIMESTAMP)))
+        self.assertFalse(cache.update(Thing(machine='machine', name='sensor', value=0,
+                                            timestamp=TIMESTAMP.replace(hour=20))))
+        self.assertEqual(1, cache.get('machine', 'sensor').value)
+        self.assertIsNone(cache.get('machine', 'unknown'))
+        self.assertEqual(1, len(cache))
+
+    def test_snapshot(self):
+        cache = LastValueCache()
+        for machine in ('machine_b', 'machine_a', 'other'):
+            for name in ('sensor_2', 'sensor_1'):
+                cache.update(Thing(machine=machine, name=name, value=0, timestamp=TIMESTAMP))
+
+        self.assertListEqual([('machine_a', 'sensor_1'), ('machine_a', 'sensor_2'), ('machine_b', 'sensor_1'),
+                              ('machine_b', 'sensor_2')],
+                             [(value['machine'], value['name']) for value in cache.snapshot(machine='machine_*')])
+        self.assertListEqual([('machine_b', 'sensor_2'), ('other', 'sensor_2')],
+                             [(value['machine'], value['name'])
+                              for value in cache.snapshot(name='sensor_2', after=('machine_a', 'sensor_2'))])
+        self.assertEqual(2, len(list(cache.snapshot(machine='other'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,9 @@ import unittest
 from datetime import datetime, timedelta, timezone
 from typing import List, Type, Union
 
+from bson import ObjectId
 from pydantic import BaseModel
+from pymongo.errors import BulkWriteError
 
 from fastiot.core.broker_connection import NatsBrokerConnection
 from fastiot.core.data_models import FastIoTData, FastIoTPublish
@@ -18,6 +20,10 @@ from fastiot.msg.thing import Thing
 from fastiot.testlib import populate_test_env
 from fastiot.util.object_helper import parse_object, parse_object_list
 from fastiot_core_services.object_storage.mongodb_handler import MongoDBHandler
+from fastiot_core_services.object_storage.object_storage_helper_fn import build_query_dict, build_projection, \
+    build_aggregation_pipeline, build_bucket_update, build_bucket_query_pipeline, build_downsample_pipeline, \
+    retention_cutoff, build_continuation_token, build_bucket_continuation_token
+from fastiot_core_services.object_storage.config_model import RetentionConfig
 from fastiot_core_services.object_storage.object_storage_service import ObjectStorageService
 
 THING = Thing(machine='SomeMachine', name="RequestSensor", value=42, timestamp=datetime.now(), measurement_id="1")
@@ -149,6 +155,91 @@ class TestObjectStorage(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(expected_thing_list[0], values[0])
         self.assertEqual(len(expected_thing_list), len(values))
 
+    async def test_request_response_pagination(self):
+        self.get_mongo_col(service_id='1', collection_name='things')
+        await self._start_service()
+        self._db_col.delete_many({})
+
+        expected_thing_list = []
+        for i in range(5):
+            thing_msg = Thing(machine='test_machine', name='sensor_0', measurement_id='123456',
+                              value=i, timestamp=datetime(year=2022, month=10, day=9, second=i // 2))
+            expected_thing_list.append(thing_msg)
+            self._db_col.insert_one(convert_message_to_mongo_data(msg=thing_msg.dict(),
+                                                                  subject=Thing.get_subject('sensor_0').name,
+                                                                  timestamp=thing_msg.timestamp))
+        hist_req_msg = HistObjectReq(dt_start=datetime(year=2022, month=10, day=9, second=0),
+                                     dt_end=datetime(year=2022, month=10, day=9, second=10),
+                                     limit=2, subject_name='v1.thing.*')
+        subject = hist_req_msg.get_reply_subject(name=filter_specific_sign('thing.*'))
+
+        values = []
+        for _ in range(3):
+            reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=hist_req_msg,
+                                                                         timeout=10)
+            values.extend(parse_object_list(reply.values, Thing))
+            hist_req_msg.continuation_token = reply.continuation_token
+        self.assertIsNone(hist_req_msg.continuation_token)
+        self.assertListEqual(expected_thing_list, values)
+
+    async def test_request_response_invalid_continuation_token(self):
+        self.get_mongo_col(service_id='1', collection_name='things')
+        await self._start_service()
+        hist_req_msg = HistObjectReq(subject_name='v1.thing.*', continuation_token='invalid')
+        subject = hist_req_msg.get_reply_subject(name=filter_specific_sign('thing.*'))
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertEqual(2, reply.error_code)
+
+    async def test_request_response_columnar(self):
+        self.get_mongo_col(service_id='1', collection_name='things')
+        await self._start_service()
+        self._db_col.delete_many({})
+
+        for i in range(3):
+            thing_msg = Thing(machine='test_machine', name=f'sensor_{i}', value=i,
+                              timestamp=datetime(year=2022, month=10, day=9, second=i, tzinfo=timezone.utc))
+            self._db_col.insert_one(convert_message_to_mongo_data(msg=thing_msg.dict(),
+                                                                  subject=Thing.get_subject(thing_msg.name).name,
+                                                                  timestamp=thing_msg.timestamp))
+        hist_req_msg = HistObjectReq(subject_name='v1.thing.*', columnar=True)
+        subject = hist_req_msg.get_reply_subject(name=filter_specific_sign('thing.*'))
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertListEqual([], reply.values)
+        self.assertListEqual([0, 1, 2], reply.columns['value'])
+        self.assertListEqual(['sensor_0', 'sensor_1', 'sensor_2'], reply.columns['name'])
+
+    async def test_request_response_aggregated(self):
+        self.get_mongo_col(service_id='1', collection_name='things')
+        await self._start_service()
+        self._db_col.delete_many({})
+
+        for i in range(6):
+            thing_msg = Thing(machine='test_machine', name='sensor_0', measurement_id='123456',
+                              value=i, timestamp=datetime(year=2022, month=10, day=9, second=i, tzinfo=timezone.utc))
+            self._db_col.insert_one(convert_message_to_mongo_data(msg=thing_msg.dict(),
+                                                                  subject=Thing.get_subject('sensor_0').name,
+                                                                  timestamp=thing_msg.timestamp))
+        hist_req_msg = HistObjectReq(dt_start=datetime(year=2022, month=10, day=9, second=0),
+                                     dt_end=datetime(year=2022, month=10, day=9, second=10),
+                                     limit=2, subject_name='v1.thing.*', resolution=3, aggregate='max',
+                                     fields=['value', 'timestamp'])
+        subject = hist_req_msg.get_reply_subject(name=filter_specific_sign('thing.*'))
+
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertListEqual([{'value': 2, 'timestamp': datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)},
+                              {'value': 5, 'timestamp': datetime(year=2022, month=10, day=9, second=3,
+                                                                 tzinfo=timezone.utc)}],
+                             reply.values)
+        self.assertIsNotNone(reply.continuation_token)
+
+        hist_req_msg.continuation_token = reply.continuation_token
+        reply = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertEqual(1, reply.error_code)
+
+        hist_req_msg = HistObjectReq(subject_name='v1.thing.*', resolution=3, aggregate='median')
+        reply = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertEqual(3, reply.error_code)
+
     async def test_request_response_object(self):
         self.get_mongo_col(service_id='2', collection_name='custom_test_msg_list')
         await self._start_service()
@@ -343,6 +434,26 @@ class TestObjectStorage(unittest.IsolatedAsyncioTestCase):
         self.assertEqual('v1.thing.sensor_2', results[3]['_subject'])
         self.assertEqual(False, results[3]['value'])
 
+    async def test_overwriting_thing_bulk(self):
+        self.get_mongo_col(service_id='u1', collection_name='thing')
+        await self._start_service()
+        self._db_col.delete_many({})
+        # send many updates for the same things without waiting, so they are merged into few bulk writes
+        for value in range(50):
+            for msg in MESSAGES[:2]:
+                thing = msg.copy()
+                thing.value = value
+                await self.broker_connection.publish(Thing.get_subject(thing.name), thing)
+        # the bulk writes finish in the background, so poll till the last values arrived instead of a fixed sleep
+        for _ in range(200):
+            results = list(self._db_col.find({}))
+            if len(results) == 2 and all(result['value'] == 49 for result in results):
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(2, len(results))
+        self.assertEqual(49, results[0]['value'])
+        self.assertEqual(49, results[1]['value'])
+
     async def test_overwriting_object_no_change(self):
         self.get_mongo_col(service_id='u2', collection_name='custom_test_msg_list')
         await self._start_service()
@@ -401,6 +512,159 @@ class TestObjectStorage(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(1, len(result), f"Length of result {i+1} does not match!")
             self.assertEqual(MESSAGES[0], parse_object(result[0], Thing))
 
+    async def test_bucket_storage(self):
+        self.get_mongo_col(service_id='bucket', collection_name='thing_buckets')
+        self._db_col.delete_many({})
+        await self._start_service()
+
+        expected_thing_list = []
+        for i in range(5):
+            thing_msg = Thing(machine='test_machine', name=f'sensor_{i}', measurement_id='123456',
+                              value=i, timestamp=datetime(year=2022, month=10, day=10, second=i, tzinfo=timezone.utc))
+            expected_thing_list.append(thing_msg)
+            await self.broker_connection.publish(Thing.get_subject('bucket'), thing_msg)
+        await asyncio.sleep(0.02)
+        self.assertEqual(3, self._db_col.count_documents({}))
+
+        hist_req_msg = HistObjectReq(dt_start=datetime(year=2022, month=10, day=10, second=1),
+                                     machine='test_machine', subject_name='v1.thing.bucket')
+        subject = hist_req_msg.get_reply_subject(name='thing_buckets')
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=hist_req_msg, timeout=10)
+        self.assertListEqual(expected_thing_list[1:], parse_object_list(reply.values, Thing))
+
+    async def test_time_series_collection(self):
+        self.get_mongo_col(service_id='time_series', collection_name='thing_time_series')
+        self._database.drop_collection('thing_time_series')
+        ObjectStorageService(broker_connection=self.broker_connection)
+
+        collection_info = self._database.command('listCollections', filter={'name': 'thing_time_series'})
+        self.assertEqual('timeseries', collection_info['cursor']['firstBatch'][0]['type'])
+        self.assertIn('index_0', self._db_col.index_information())
+
+    async def test_write_duplicate_records(self):
+        self.get_mongo_col(service_id='u1', collection_name='thing')
+        self._db_col.delete_many({})
+        service = ObjectStorageService(broker_connection=self.broker_connection)
+        records = [{'collection': 'thing', 'document': {'_id': i, 'value': i}} for i in range(3)]
+        await service._write_records(records[:2])
+
+        # live writes must not drop documents violating a unique index
+        with self.assertRaises(BulkWriteError):
+            await service._write_records(records)
+        self._db_col.delete_one({'_id': 2})
+
+        # replayed inserts may have been written already before the connection was lost
+        with self.assertLogs(service._logger, level='WARNING'):
+            await service._write_records(records, replay=True)
+        self.assertEqual(3, self._db_col.count_documents({}))
+
+    async def test_retention(self):
+        self.get_mongo_col(service_id='retention', collection_name='thing_retention')
+        self._db_col.delete_many({})
+        downsampled_col = self._database['thing_retention_downsampled']
+        downsampled_col.delete_many({})
+
+        now = datetime.now(tz=timezone.utc)
+        for timestamp in [now - timedelta(days=2), now - timedelta(days=2, seconds=1), now]:
+            thing_msg = Thing(machine='test_machine', name='sensor_0', value=1, timestamp=timestamp)
+            self._db_col.insert_one(convert_message_to_mongo_data(msg=thing_msg.dict(),
+                                                                  subject=Thing.get_subject('sensor_0').name,
+                                                                  timestamp=timestamp))
+        await self._start_service()
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(1, self._db_col.count_documents({}))
+        self.assertGreaterEqual(downsampled_col.count_documents({}), 1)
+
+
+class TestObjectStorageQuery(unittest.TestCase):
+
+    def test_build_query_dict_exact_subject(self):
+        query_dict = build_query_dict(HistObjectReq(subject_name='v1.custom_test_msg_list'))
+        self.assertDictEqual({'_subject': 'v1.custom_test_msg_list'}, query_dict)
+
+    def test_build_query_dict_wildcard_subject(self):
+        query_dict = build_query_dict(HistObjectReq(subject_name='v1.thing.*'))
+        self.assertDictEqual({'_subject': {'$regex': r'^v1\.thing\.[^.]+$'}}, query_dict)
+        query_dict = build_query_dict(HistObjectReq(subject_name='v1.thing.>'))
+        self.assertDictEqual({'_subject': {'$regex': r'^v1\.thing\..+$'}}, query_dict)
+
+    def test_build_query_dict_machine_sensor(self):
+        dt_start = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        query_dict = build_query_dict(HistObjectReq(dt_start=dt_start, machine='test_machine', sensor='sensor_1'))
+        self.assertDictEqual({'machine': 'test_machine', 'name': 'sensor_1', '_timestamp': {'$gte': dt_start}},
+                             query_dict)
+
+    def test_build_projection(self):
+        self.assertIsNone(build_projection(None))
+        self.assertDictEqual({'value': 1, '_subject': 1, '_timestamp': 1}, build_projection(['value']))
+
+    def test_build_aggregation_pipeline(self):
+        pipeline = build_aggregation_pipeline(HistObjectReq(resolution=60, aggregate='mean', limit=10), {})
+        self.assertDictEqual({'$avg': '$value'}, pipeline[2]['$group']['value'])
+        self.assertIn({'$limit': 10}, pipeline)
+
+        pipeline = build_aggregation_pipeline(HistObjectReq(resolution=60, aggregate='count'), {})
+        self.assertDictEqual({'$sum': 1}, pipeline[2]['$group']['value'])
+
+        with self.assertRaises(ValueError):
+            build_aggregation_pipeline(HistObjectReq(resolution=60, aggregate='median'), {})
+        with self.assertRaises(ValueError):
+            build_aggregation_pipeline(HistObjectReq(resolution=0), {})
+
+    def test_build_bucket_update(self):
+        timestamp = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        mongo_data = {'_subject': 'v1.thing.sensor', '_timestamp': timestamp, 'machine': 'test_machine', 'value': 1}
+        query, update = build_bucket_update(mongo_data, meta_field='machine', bucket_size=100)
+        self.assertDictEqual({'_subject': 'v1.thing.sensor', '_count': {'$lt': 100}, 'machine': 'test_machine'}, query)
+        self.assertIn('_id', update['$push']['samples'])
+        self.assertDictEqual({'_timestamp_min': timestamp}, update['$min'])
+
+    def test_build_bucket_query_pipeline(self):
+        dt_start = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        hist_object_req = HistObjectReq(dt_start=dt_start, machine='test_machine', limit=10)
+        pipeline = build_bucket_query_pipeline(hist_object_req, build_query_dict(hist_object_req), meta_field='machine')
+        self.assertDictEqual({'$match': {'machine': 'test_machine', '_timestamp_max': {'$gte': dt_start}}},
+                             pipeline[0])
+        self.assertEqual({'$limit': 10}, pipeline[-1])
+
+    def test_build_bucket_query_pipeline_continuation(self):
+        dt_start = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        position = datetime(year=2022, month=10, day=10, tzinfo=timezone.utc)
+        # later pages must not unwind the buckets before the position again
+        token = build_continuation_token({'_timestamp': position, '_id': ObjectId()})
+        hist_object_req = HistObjectReq(dt_start=dt_start, machine='test_machine', limit=10, continuation_token=token)
+        pipeline = build_bucket_query_pipeline(hist_object_req, build_query_dict(hist_object_req), meta_field='machine')
+        self.assertDictEqual({'$match': {'machine': 'test_machine', '_timestamp_max': {'$gte': position}}},
+                             pipeline[0])
+
+        token = build_bucket_continuation_token({'_timestamp': position, '_subject': 'v1.thing.sensor_0'})
+        hist_object_req = HistObjectReq(machine='test_machine', resolution=1.0, continuation_token=token)
+        pipeline = build_bucket_query_pipeline(hist_object_req, build_query_dict(hist_object_req), meta_field='machine')
+        self.assertDictEqual({'$match': {'machine': 'test_machine', '_timestamp_max': {'$gte': position}}},
+                             pipeline[0])
+
+        hist_object_req = HistObjectReq(continuation_token='invalid')
+        with self.assertRaises(ValueError):
+            build_bucket_query_pipeline(hist_object_req, {}, meta_field='machine')
+
+    def test_retention_cutoff(self):
+        now = datetime(year=2022, month=10, day=9, hour=12, minute=30, second=15, tzinfo=timezone.utc)
+        retention_config = RetentionConfig(max_age=timedelta(days=1))
+        self.assertEqual(now - timedelta(days=1), retention_cutoff(now, retention_config))
+        retention_config = RetentionConfig(max_age=timedelta(days=1), downsample_resolution=timedelta(hours=1))
+        self.assertEqual(datetime(year=2022, month=10, day=8, hour=12, tzinfo=timezone.utc),
+                         retention_cutoff(now, retention_config))
+
+    def test_build_downsample_pipeline(self):
+        cutoff = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        retention_config = RetentionConfig(max_age=timedelta(days=1), downsample_resolution=timedelta(hours=1),
+                                           downsample_aggregate='max')
+        pipeline = build_downsample_pipeline(retention_config, cutoff, target_collection='downsampled')
+        self.assertDictEqual({'$match': {'_timestamp': {'$lt': cutoff}}}, pipeline[0])
+        self.assertDictEqual({'$max': '$value'}, pipeline[2]['$group']['value'])
+        self.assertEqual('downsampled', pipeline[-1]['$merge']['into'])
+        self.assertFalse(any('$limit' in stage for stage in pipeline))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+
+from fastiot.core.broker_connection import NatsBrokerConnection
+from fastiot.env import env_mongodb
+from fastiot.msg.hist import HistObjectReq, HistObjectResp
+from fastiot.msg.thing import Thing
+from fastiot.testlib import populate_test_env
+from fastiot.util.continuation_token import encode_continuation_token
+from fastiot_core_services.object_storage.mongodb_handler import MongoDBHandler
+from fastiot_core_services.rollup.env import rollup_env
+from fastiot_core_services.rollup.rollup_helper_fn import RollupAggregator, bucket_start, build_rollup_query_pipeline, \
+    select_resolution, validate_rollup_aggregate
+from fastiot_core_services.rollup.rollup_service import RollupService
+
+DT_START = datetime(year=2019, month=7, day=25, hour=21, tzinfo=timezone.utc)
+
+
+class TestRollup(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        populate_test_env()
+        self._mongodb_handler = MongoDBHandler()
+        self._collection = self._mongodb_handler.get_database(env_mongodb.name)[rollup_env.collection]
+        self._collection.delete_many({'machine': 'test_machine'})
+        self.broker_connection = await NatsBrokerConnection.connect()
+        service = RollupService(broker_connection=self.broker_connection)
+        self.service_task = asyncio.create_task(service.run())
+        await asyncio.sleep(0.005)
+
+    async def asyncTearDown(self):
+        self.service_task.cancel()
+        self._collection.delete_many({'machine': 'test_machine'})
+        self._mongodb_handler.close()
+
+    async def test_reply(self):
+        for i in range(120):
+            thing = Thing(machine='test_machine', name='sensor', value=i, unit='s',
+                          timestamp=DT_START.replace(minute=i // 60, second=i % 60))
+            await self.broker_connection.publish(Thing.get_subject(thing.name), thing)
+        await asyncio.sleep(0.2)
+
+        request = HistObjectReq(dt_start=DT_START, machine='test_machine', sensor='sensor', resolution=60,
+                                aggregate='max')
+        response: HistObjectResp = await self.broker_connection.request(
+            subject=HistObjectReq.get_reply_subject(name=rollup_env.request_subject), msg=request, timeout=10)
+        self.assertEqual(0, response.error_code)
+        self.assertListEqual([59.0, 119.0], [value['value'] for value in response.values])
+        self.assertListEqual([60, 60], [value['count'] for value in response.values])
+        self.assertListEqual([29.5, 89.5], [value['mean'] for value in response.values])
+
+        request = HistObjectReq(dt_start=DT_START, machine='test_machine', sensor='sensor', resolution=3600,
+                                aggregate='last')
+        response = await self.broker_connection.request(
+            subject=HistObjectReq.get_reply_subject(name=rollup_env.request_subject), msg=request, timeout=10)
+        self.assertEqual(1, len(response.values))
+        self.assertEqual(119.0, response.values[0]['value'])
+        self.assertEqual(120, response.values[0]['count'])
+
+
+class TestRollupAggregation(unittest.TestCase):
+
+    def test_aggregator(self):
+        aggregator = RollupAggregator([60, 3600])
+        for i, value in enumerate([3, 1.5, 2, 'text']):
+            aggregator.add(Thing(machine='machine', name='sensor', value=value, timestamp=DT_START.replace(second=i)))
+        buckets = aggregator.pop_buckets()
+        self.assertEqual(0, len(aggregator))
+        self.assertEqual(2, len(buckets))
+        bucket = buckets[(60, 'machine', 'sensor', DT_START)]
+        self.assertEqual((3, 6.5, 1.5, 3.0, 2.0), (bucket.count, bucket.sum, bucket.min, bucket.max, bucket.last))
+
+        aggregator.add(Thing(machine='machine', name='sensor', value=5, timestamp=DT_START.replace(second=5)))
+        aggregator.restore_buckets(buckets)
+        bucket = aggregator.pop_buckets()[(3600, 'machine', 'sensor', DT_START)]
+        self.assertEqual((4, 5.0), (bucket.count, bucket.last))
+
+    def test_bucket_start(self):
+        timestamp = datetime(year=2019, month=7, day=25, hour=21, minute=48, second=3, tzinfo=timezone.utc)
+        self.assertEqual(timestamp.replace(second=0), bucket_start(timestamp, 60))
+        self.assertEqual(timestamp.replace(hour=0, minute=0, second=0), bucket_start(timestamp, 86400))
+
+    def test_select_resolution(self):
+        self.assertEqual(60, select_resolution(None, [60, 3600, 86400]))
+        self.assertEqual(60, select_resolution(1, [60, 3600, 86400]))
+        self.assertEqual(3600, select_resolution(7200, [60, 3600, 86400]))
+        self.assertEqual(86400, select_resolution(86400 * 7, [60, 3600, 86400]))
+
+    def test_build_rollup_query_pipeline(self):
+        pipeline = build_rollup_query_pipeline(HistObjectReq(resolution=60, aggregate='max', limit=10), 60)
+        self.assertDictEqual({'resolution': 60}, pipeline[0]['$match'])
+        self.assertEqual('$max', pipeline[-1]['$project']['value'])
+        self.assertIn({'$limit': 10}, pipeline)
+
+        pipeline = build_rollup_query_pipeline(HistObjectReq(resolution=7200, limit=10), 3600)
+        self.assertIn('$group', pipeline[2])
+
+        token = encode_continuation_token({'timestamp': DT_START, 'sensor': 'sensor', 'machine': 'machine'})
+        pipeline = build_rollup_query_pipeline(HistObjectReq(dt_start=DT_START.replace(hour=0),
+                                                             continuation_token=token), 60)
+        self.assertEqual(DT_START, pipeline[0]['$match']['timestamp']['$gte'])
+
+        with self.assertRaises(ValueError):
+            validate_rollup_aggregate(HistObjectReq(aggregate='first'))
+        with self.assertRaises(ValueError):
+            build_rollup_query_pipeline(HistObjectReq(continuation_token='invalid'), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -66,6 +66,22 @@ class TestTimeSeries(unittest.IsolatedAsyncioTestCase):
         await self.delete_data()
         await self.client.close()
 
+    async def test_storage_batches(self):
+        for i in range(50):
+            thing_msg = Thing(machine='test_machine', name='sensor_batch', value=i,
+                              timestamp=datetime(2019, 7, 25, 21, 48, i, tzinfo=timezone.utc))
+            await self.broker_connection.publish(Thing.get_subject(thing_msg.name), thing_msg)
+        await asyncio.sleep(0.5)  # Making sure the last batch is flushed and stored in the db
+        query = \
+            f'from(bucket: "{env_influxdb.bucket}") ' \
+            '|> range(start: 2019-07-25T21:47:00Z)' \
+            '|> filter(fn: (r) => r["machine"] == "test_machine")' \
+            '|> count()'
+        tables = await self.client.query_api().query(query, org=env_influxdb.organisation)
+        self.assertEqual(50, tables[0].records[0].get_value())
+        await self.delete_data()
+        await self.client.close()
+
     async def test_reply_standard(self):
         for i in range(5):
             data = [{"measurement":
@@ -126,6 +142,73 @@ class TestTimeSeries(unittest.IsolatedAsyncioTestCase):
         await self.delete_data()
         await self.client.close()
 
+    async def test_reply_continuation(self):
+        for i in range(5):
+            data = [{"measurement": f'sensor_{i}',
+                     "tags": {"machine": 'test_machine',
+                              "unit": "m"},
+                     "fields": {"value": 1},
+                     "time": f"2019-07-25T21:48:0{i // 2}Z"
+                     }]
+            await self.client.write_api().write(bucket=env_influxdb.bucket, org=env_influxdb.organisation, record=data,
+                                                precision='ms')
+
+        await asyncio.sleep(0.05)  # Making sure the data is stored in the db
+        subject = HistObjectReq.get_reply_subject(name="things")
+        request = HistObjectReq(machine="test_machine", dt_start='2019-07-25T21:47:00Z',
+                                dt_end='2019-07-25T21:49:00Z', limit=2)
+        sensors = []
+        for _ in range(3):
+            reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=request, timeout=10)
+            sensors.extend(value.get("sensor") for value in reply.values)
+            request.continuation_token = reply.continuation_token
+        self.assertIsNone(request.continuation_token)
+        self.assertListEqual([f'sensor_{i}' for i in range(5)], sensors)
+        await self.delete_data()
+        await self.client.close()
+
+    async def test_reply_aggregated(self):
+        for i in range(6):
+            data = [{"measurement": 'sensor_0',
+                     "tags": {"machine": 'test_machine',
+                              "unit": "m"},
+                     "fields": {"value": i},
+                     "time": f"2019-07-25T21:48:0{i}Z"
+                     }]
+            await self.client.write_api().write(bucket=env_influxdb.bucket, org=env_influxdb.organisation, record=data,
+                                                precision='ms')
+
+        await asyncio.sleep(0.05)  # Making sure the data is stored in the db
+        subject = HistObjectReq.get_reply_subject(name="things")
+        request = HistObjectReq(machine="test_machine", dt_start='2019-07-25T21:48:00Z',
+                                dt_end='2019-07-25T21:49:00Z', resolution=3, aggregate='max',
+                                fields=['value', 'timestamp'])
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=request, timeout=10)
+        self.assertListEqual([{"value": 2, "timestamp": datetime(2019, 7, 25, 21, 48, 0, tzinfo=timezone.utc)},
+                              {"value": 5, "timestamp": datetime(2019, 7, 25, 21, 48, 3, tzinfo=timezone.utc)}],
+                             reply.values)
+
+        request.aggregate = 'median'
+        reply = await self.broker_connection.request(subject=subject, msg=request, timeout=10)
+        self.assertEqual(3, reply.error_code)
+        await self.delete_data()
+        await self.client.close()
+
+    async def test_reply_columnar(self):
+        await self.insert_data()
+        await asyncio.sleep(0.5)  # Making sure the data is stored in the db
+        subject = HistObjectReq.get_reply_subject(name="things")
+        request = HistObjectReq(machine="test_machine", dt_start='2019-07-25T21:47:00Z',
+                                dt_end='2019-07-25T21:49:00Z', columnar=True, fields=['sensor', 'timestamp'])
+        reply: HistObjectResp = await self.broker_connection.request(subject=subject, msg=request, timeout=10)
+        self.assertListEqual([], reply.values)
+        self.assertListEqual([f'sensor_{i}' for i in range(5)], reply.columns['sensor'])
+        self.assertListEqual([datetime(2019, 7, 25, 21, 48, i, tzinfo=timezone.utc) for i in range(5)],
+                             reply.columns['timestamp'])
+        self.assertNotIn('value', reply.columns)
+        await self.delete_data()
+        await self.client.close()
+
     async def test_error_code_1(self):
         subject = HistObjectReq.get_reply_subject(name=time_series_env.request_subject)
         reply: HistObjectResp = await self.broker_connection.request(subject=subject,
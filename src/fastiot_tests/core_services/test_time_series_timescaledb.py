@@ -0,0 +1,63 @@
+import unittest
+from datetime import datetime, timezone
+
+from fastiot.msg.hist import HistObjectReq
+from fastiot.msg.thing import Thing
+from fastiot.util.continuation_token import encode_continuation_token
+from fastiot_core_services.time_series.timescaledb_backend import build_query, encode_copy_row, rows_to_columns, \
+    build_create_table_statements
+
+
+class TestTimescaleDBBackend(unittest.TestCase):
+
+    def test_encode_copy_row(self):
+        timestamp = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        thing = Thing(machine='machine', name='sensor', value=42, timestamp=timestamp, unit='s')
+        self.assertEqual('2022-10-09T00:00:00+00:00\tmachine\tsensor\ts\t42.0\t\\N', encode_copy_row(thing))
+
+        thing = Thing(machine='machine', name='sensor', value='a\tb\\c', timestamp=timestamp)
+        self.assertEqual('2022-10-09T00:00:00+00:00\tmachine\tsensor\t\t\\N\ta\\tb\\\\c', encode_copy_row(thing))
+
+        thing = Thing(machine='machine', name='sensor', value=float('nan'), timestamp=timestamp)
+        self.assertIsNone(encode_copy_row(thing))
+
+    def test_create_table(self):
+        statements = build_create_table_statements('my "things"')
+        self.assertIn('CREATE TABLE IF NOT EXISTS "my ""things""" (', statements[1])
+        self.assertIn("create_hypertable('\"my \"\"things\"\"\"', 'time', if_not_exists => TRUE)", statements[2])
+
+    def test_build_query(self):
+        dt_start = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        dt_end = datetime(year=2022, month=10, day=10, tzinfo=timezone.utc)
+        statement, parameters = build_query('things', HistObjectReq(dt_start=dt_start, dt_end=dt_end, sensor='sensor',
+                                                                    limit=10))
+        self.assertEqual('SELECT time, machine, name, unit, value, value_text FROM "things" '
+                         'WHERE time >= %s AND time < %s AND name = %s ORDER BY time, name, machine LIMIT %s',
+                         statement)
+        self.assertListEqual([dt_start, dt_end, 'sensor', 10], parameters)
+
+    def test_build_query_aggregated_continuation(self):
+        timestamp = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        token = encode_continuation_token({'timestamp': timestamp, 'sensor': 'sensor', 'machine': 'machine'})
+        statement, parameters = build_query('things', HistObjectReq(resolution=60, aggregate='max', limit=10,
+                                                                    continuation_token=token))
+        self.assertIn('time_bucket(make_interval(secs => %s), time)', statement)
+        self.assertIn('max(value) AS value', statement)
+        self.assertIn(') AS buckets WHERE (time, name, machine) > (%s, %s, %s) ORDER BY', statement)
+        self.assertListEqual([60, timestamp, timestamp, 'sensor', 'machine', 10], parameters)
+
+        with self.assertRaises(ValueError):
+            build_query('things', HistObjectReq(continuation_token='invalid'))
+
+    def test_rows_to_columns(self):
+        timestamp = datetime(year=2022, month=10, day=9, tzinfo=timezone.utc)
+        columns = rows_to_columns(['time', 'machine', 'name', 'unit', 'value', 'value_text'],
+                                  [(timestamp, 'machine', 'sensor', 's', 1.0, None),
+                                   (timestamp, 'machine', 'sensor', '', None, 'text')])
+        self.assertListEqual([1.0, 'text'], columns['value'])
+        self.assertListEqual(['sensor', 'sensor'], columns['sensor'])
+        self.assertListEqual([timestamp, timestamp], columns['timestamp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
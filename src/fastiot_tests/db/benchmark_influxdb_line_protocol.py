@@ -0,0 +1,41 @@
+"""
+Compares encoding a batch of things with :mod:`fastiot.db.influxdb_line_protocol` to building dictionaries serialized
+by the InfluxDB client, as done for each point when passing dictionaries to ``write_api().write()``.
+
+Run with ``python -m fastiot_tests.db.benchmark_influxdb_line_protocol``.
+"""
+import timeit
+
+from influxdb_client import Point
+
+from fastiot.core.time import get_time_now
+from fastiot.db.influxdb_line_protocol import things_to_lines
+from fastiot.msg.thing import Thing
+
+BATCH_SIZE = 1000
+REPEAT = 20
+
+
+def encode_dicts(things):
+    records = [{"measurement": str(thing.name),
+                "tags": {"machine": str(thing.machine), "unit": str(thing.unit)},
+                "fields": {"value": thing.value},
+                "time": thing.timestamp} for thing in things]
+    return [Point.from_dict(record, write_precision='ms').to_line_protocol() for record in records]
+
+
+def main():
+    now = get_time_now()
+    things = [Thing(machine='machine', name=f'sensor_{i % 10}', value=i * 0.5, unit='m', timestamp=now)
+              for i in range(BATCH_SIZE)]
+    assert encode_dicts(things) == things_to_lines(things)
+
+    dict_time = min(timeit.repeat(lambda: encode_dicts(things), number=1, repeat=REPEAT))
+    line_time = min(timeit.repeat(lambda: things_to_lines(things), number=1, repeat=REPEAT))
+    print(f"Encoding {BATCH_SIZE} things:")
+    print(f"  dictionaries and points: {dict_time * 1000:.2f} ms")
+    print(f"  line protocol encoder:   {line_time * 1000:.2f} ms ({dict_time / line_time:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
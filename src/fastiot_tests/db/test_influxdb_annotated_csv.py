@@ -0,0 +1,70 @@
+import io
+import unittest
+from datetime import datetime, timezone
+
+from influxdb_client.client.flux_csv_parser import FluxCsvParser, FluxSerializationMode
+
+from fastiot.db.influxdb_annotated_csv import columns_from_annotated_csv, parse_rfc3339
+from fastiot_core_services.time_series.time_series_service import INFLUXDB_COLUMNS
+
+# Two tables with different schemas as returned by InfluxDB, the second one without unit and with a default machine
+RESULT = (
+    '#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,double,string,string,string,string\r\n'
+    '#group,false,false,true,true,false,false,true,true,true,true\r\n'
+    '#default,_result,,,,,,,,,\r\n'
+    ',result,table,_start,_stop,_time,_value,_field,_measurement,machine,unit\r\n'
+    ',,0,2019-07-25T21:47:00Z,2019-07-25T21:49:00Z,2019-07-25T21:48:00Z,1.5,value,sensor_0,machine,m\r\n'
+    ',,0,2019-07-25T21:47:00Z,2019-07-25T21:49:00Z,2019-07-25T21:48:01.123456789Z,,value,sensor_0,machine,m\r\n'
+    ',,1,2019-07-25T21:47:00Z,2019-07-25T21:49:00Z,2019-07-25T21:48:02.5Z,NaN,value,sensor_1,machine,\r\n'
+    '\r\n'
+    '#datatype,string,long,dateTime:RFC3339,dateTime:RFC3339,dateTime:RFC3339,long,string,string,string\r\n'
+    '#group,false,false,true,true,false,false,true,true,true\r\n'
+    '#default,_result,,,,,,,,other\r\n'
+    ',result,table,_start,_stop,_time,_value,_field,_measurement,machine\r\n'
+    ',,2,2019-07-25T21:47:00Z,2019-07-25T21:49:00Z,2019-07-25T21:48:03Z,42,value,"sensor,2",\r\n'
+    '\r\n'
+)
+
+
+def parse_records(csv_text: str):
+    parser = FluxCsvParser(response=io.BytesIO(csv_text.encode()), serialization_mode=FluxSerializationMode.tables)
+    list(parser.generator())
+    return [record for table in parser.tables for record in table]
+
+
+class TestInfluxDBAnnotatedCSV(unittest.TestCase):
+
+    def test_columns_equal_records(self):
+        columns = columns_from_annotated_csv(RESULT, INFLUXDB_COLUMNS)
+        records = parse_records(RESULT)
+        for name, csv_name in INFLUXDB_COLUMNS.items():
+            expected = [record.values.get(csv_name) for record in records]
+            if name == 'value':
+                # NaN never equals itself
+                self.assertEqual(str(expected), str(columns[name]))
+            else:
+                self.assertListEqual(expected, columns[name])
+        self.assertListEqual(['machine', 'machine', 'machine', 'other'], columns['machine'])
+        self.assertListEqual(['m', 'm', None, None], columns['unit'])
+        self.assertEqual(datetime(2019, 7, 25, 21, 48, 1, 123456, tzinfo=timezone.utc), columns['timestamp'][1])
+
+    def test_empty_result(self):
+        self.assertDictEqual({'value': []}, columns_from_annotated_csv('\r\n', {'value': '_value'}))
+
+    def test_error(self):
+        error = ('#datatype,string,string\r\n#group,true,true\r\n#default,,\r\n,error,reference\r\n'
+                 ',failed to parse query,897\r\n\r\n')
+        with self.assertRaises(ValueError):
+            columns_from_annotated_csv(error, INFLUXDB_COLUMNS)
+
+    def test_parse_rfc3339(self):
+        self.assertEqual(datetime(2019, 7, 25, 21, 48, 0, 500000, tzinfo=timezone.utc),
+                         parse_rfc3339('2019-07-25T21:48:00.5Z'))
+        self.assertEqual(datetime(2019, 7, 25, 23, 48, tzinfo=timezone.utc),
+                         parse_rfc3339('2019-07-26T01:48:00+02:00'))
+        with self.assertRaises(ValueError):
+            parse_rfc3339('2019-07-25')
+
+
+if __name__ == '__main__':
+    unittest.main()
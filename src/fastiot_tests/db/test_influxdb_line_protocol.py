@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime, timezone
+
+from influxdb_client import Point
+
+from fastiot.db.influxdb_line_protocol import encode_line, encode_timestamp, thing_to_line, things_to_lines
+from fastiot.msg.thing import Thing
+
+TIMESTAMP = datetime(year=2022, month=10, day=9, second=1, microsecond=2003, tzinfo=timezone.utc)
+
+
+class TestInfluxDBLineProtocol(unittest.TestCase):
+
+    def assert_line_equals_point(self, thing: Thing, precision: str = 'ms'):
+        point = Point.from_dict({"measurement": str(thing.name),
+                                 "tags": {"machine": str(thing.machine), "unit": str(thing.unit)},
+                                 "fields": {"value": thing.value},
+                                 "time": thing.timestamp}, write_precision=precision)
+        self.assertEqual(point.to_line_protocol(), thing_to_line(thing, precision=precision))
+
+    def test_values(self):
+        for value in [42, 4.2, 42.0, -1.5e-10, True, False, 'text', 'with "quotes" and \\ backslash']:
+            self.assert_line_equals_point(Thing(machine='machine', name='sensor', value=value, timestamp=TIMESTAMP,
+                                                unit='m'))
+
+    def test_escaping(self):
+        self.assert_line_equals_point(Thing(machine='my machine,1', name='sensor 1,a=b', value=1,
+                                            timestamp=TIMESTAMP, unit='m=s\\'))
+        self.assertEqual('sensor\\ 1,machine=a\\=b value=1i 1665273601002',
+                         thing_to_line(Thing(machine='a=b', name='sensor 1', value=1, timestamp=TIMESTAMP)))
+
+    def test_precision(self):
+        for precision in ['s', 'ms', 'us', 'ns']:
+            self.assert_line_equals_point(Thing(machine='machine', name='sensor', value=1, timestamp=TIMESTAMP),
+                                          precision=precision)
+        self.assertEqual(1665273601002003000, encode_timestamp(TIMESTAMP, precision='ns'))
+        self.assertEqual(1665273601002, encode_timestamp(TIMESTAMP.replace(tzinfo=None)))
+        with self.assertRaises(ValueError):
+            encode_timestamp(TIMESTAMP, precision='min')
+
+    def test_skipped_values(self):
+        self.assertIsNone(encode_line('sensor', {}, {'value': None}, TIMESTAMP))
+        self.assertIsNone(encode_line('sensor', {}, {'value': float('nan')}, TIMESTAMP))
+        things = [Thing(machine='machine', name='sensor', value=value, timestamp=TIMESTAMP) for value in [1, None]]
+        self.assertEqual(1, len(things_to_lines(things)))
+        with self.assertRaises(ValueError):
+            encode_line('sensor', {}, {'value': [1, 2]}, TIMESTAMP)
+
+
+if __name__ == '__main__':
+    unittest.main()
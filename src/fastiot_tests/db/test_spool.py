@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from fastiot.db.spool import DiskSpool
+
+
+class TestDiskSpool(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.directory = self._temp_dir.name
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    async def test_replay(self):
+        spool = DiskSpool(self.directory, max_size=1024 * 1024, segment_size=100, fsync='never')
+        self.assertTrue(spool.empty)
+        records = [{'value': i, 'timestamp': datetime(year=2022, month=10, day=9, second=i, tzinfo=timezone.utc)}
+                   for i in range(10)]
+        for record in records:
+            spool.append(record)
+        self.assertFalse(spool.empty)
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+
+        batches = []
+
+        async def write(batch):
+            batches.append(batch)
+
+        self.assertEqual(10, await spool.replay(write, batch_size=3))
+        self.assertListEqual(records, [record for batch in batches for record in batch])
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+        self.assertTrue(spool.empty)
+        self.assertListEqual([], os.listdir(self.directory))
+
+    async def test_replay_failure(self):
+        spool = DiskSpool(self.directory, max_size=1024 * 1024, fsync='never')
+        for i in range(4):
+            spool.append(i)
+
+        written = []
+
+        async def write_failing(batch):
+            if len(written) >= 2:
+                raise ConnectionError()
+            written.extend(batch)
+
+        with self.assertRaises(ConnectionError):
+            await spool.replay(write_failing, batch_size=1)
+        self.assertFalse(spool.empty)
+
+        async def write(batch):
+            written.extend(batch)
+
+        await spool.replay(write)
+        self.assertListEqual([0, 1, 2, 3], written)
+
+    async def test_reopen(self):
+        spool = DiskSpool(self.directory, max_size=1024 * 1024, fsync='segment')
+        spool.append('first')
+        spool.close()
+        with open(os.path.join(self.directory, os.listdir(self.directory)[0]), 'ab') as file:
+            file.write(b'\x00\x00\x00\x10incomplete')
+
+        spool = DiskSpool(self.directory, max_size=1024 * 1024, fsync='segment')
+        spool.append('second')
+        written = []
+
+        async def write(batch):
+            written.extend(batch)
+
+        await spool.replay(write)
+        self.assertListEqual(['first', 'second'], written)
+
+    async def test_max_size(self):
+        spool = DiskSpool(self.directory, max_size=200, segment_size=50, fsync='never')
+        for i in range(100):
+            spool.append(i)
+        self.assertLessEqual(spool.size, 200 + 50)
+
+        written = []
+
+        async def write(batch):
+            written.extend(batch)
+
+        await spool.replay(write)
+        self.assertEqual(99, written[-1])
+        self.assertLess(len(written), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from datetime import datetime, timezone
+
+from fastiot.util.continuation_token import encode_continuation_token, decode_continuation_token
+
+
+class TestContinuationToken(unittest.TestCase):
+
+    def test_encode_decode(self):
+        position = {'timestamp': datetime(year=2022, month=10, day=9, microsecond=1000, tzinfo=timezone.utc),
+                    'id': '6346b2d2a0a1c2f4c9e3a1b2'}
+        token = encode_continuation_token(position)
+        self.assertIsInstance(token, str)
+        self.assertDictEqual(position, decode_continuation_token(token))
+
+    def test_invalid_token(self):
+        for token in ['', 'not a token', encode_continuation_token([1, 2])]:
+            with self.assertRaises(ValueError):
+                decode_continuation_token(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ from datetime import datetime
 from typing import List
 
 from fastiot.core import FastIoTPublish
-from fastiot.util.object_helper import parse_object, parse_object_list
+from fastiot.util.object_helper import parse_object, parse_object_list, columns_from_dict_list, \
+    dict_list_from_columns
 from fastiot.msg.thing import Thing
 from fastiot.testlib import populate_test_env
 
@@ -70,6 +71,14 @@ class TestObjectHelper(unittest.TestCase):
         converted_msg = parse_object({'a': 1}, TestClass)
         self.assertIsNone(converted_msg)
 
+    def test_columns(self):
+        dict_list = [{'name': 'test_dict_1', 'value': 123}, {'name': 'test_dict_2'}]
+        columns = columns_from_dict_list(dict_list)
+        self.assertDictEqual({'name': ['test_dict_1', 'test_dict_2'], 'value': [123, None]}, columns)
+        self.assertListEqual([{'name': 'test_dict_1', 'value': 123}, {'name': 'test_dict_2', 'value': None}],
+                             dict_list_from_columns(columns))
+        self.assertListEqual([], dict_list_from_columns(columns_from_dict_list([])))
+
 
 if __name__ == '__main__':
     unittest.main()